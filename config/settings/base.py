@@ -5,6 +5,7 @@ Base settings to build other settings files upon.
 from pathlib import Path
 
 import environ
+from celery.schedules import crontab
 
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
 # scarletbanner/
@@ -69,6 +70,7 @@ DJANGO_APPS = [
     "django.contrib.staticfiles",
     # "django.contrib.humanize", # Handy template tags
     "django.contrib.admin",
+    "django.contrib.postgres",
     "django.forms",
 ]
 THIRD_PARTY_APPS = [
@@ -145,6 +147,7 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
     "simple_history.middleware.HistoryRequestMiddleware",
+    "scarletbanner.wiki.middleware.PermissionCacheMiddleware",
 ]
 
 # STATIC
@@ -292,6 +295,13 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-scheduler
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-entries
+CELERY_BEAT_SCHEDULE = {
+    "prune-page-history": {
+        "task": "scarletbanner.wiki.tasks.prune_history",
+        "schedule": crontab(hour=3, minute=30),
+    },
+}
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-send-task-events
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
@@ -342,3 +352,33 @@ SPECTACULAR_SETTINGS = {
 }
 # Your stuff...
 # ------------------------------------------------------------------------------
+# Number of compiled <secret show="..."> expressions kept in memory per process
+WIKI_SECRET_EXPRESSION_CACHE_SIZE = env.int("WIKI_SECRET_EXPRESSION_CACHE_SIZE", default=1024)
+# Seconds a rendered page is kept in the cache; entries are also invalidated when a dependency changes
+WIKI_RENDER_CACHE_TIMEOUT = env.int("WIKI_RENDER_CACHE_TIMEOUT", default=60 * 60 * 24)
+# Resolved link targets kept in memory per process
+WIKI_LINK_CACHE_SIZE = env.int("WIKI_LINK_CACHE_SIZE", default=10_000)
+# Number of compiled template bodies kept in memory per process
+WIKI_TEMPLATE_CACHE_SIZE = env.int("WIKI_TEMPLATE_CACHE_SIZE", default=256)
+# Deepest chain of nested <template> tags that will be expanded
+WIKI_TEMPLATE_MAX_DEPTH = env.int("WIKI_TEMPLATE_MAX_DEPTH", default=20)
+# Total characters that template expansion may produce for a single render
+WIKI_TEMPLATE_MAX_OUTPUT = env.int("WIKI_TEMPLATE_MAX_OUTPUT", default=1_000_000)
+# Descendants rewritten per batch when a page is destroyed
+WIKI_DESTROY_BATCH_SIZE = env.int("WIKI_DESTROY_BATCH_SIZE", default=1000)
+# Most matches returned by the page title autocomplete endpoint
+WIKI_AUTOCOMPLETE_LIMIT = env.int("WIKI_AUTOCOMPLETE_LIMIT", default=10)
+# Pages fetched per server-side cursor round trip when streaming a wiki export
+WIKI_EXPORT_CHUNK_SIZE = env.int("WIKI_EXPORT_CHUNK_SIZE", default=2000)
+# Revisions stored per full body snapshot; the rest are kept as line deltas (1 disables deltas)
+WIKI_HISTORY_SNAPSHOT_INTERVAL = env.int("WIKI_HISTORY_SNAPSHOT_INTERVAL", default=20)
+# Revisions never change, so diffs between them can be cached for a long time
+WIKI_DIFF_CACHE_TIMEOUT = env.int("WIKI_DIFF_CACHE_TIMEOUT", default=60 * 60 * 24 * 30)
+# Every revision younger than this many days is kept by the history pruning task
+WIKI_HISTORY_KEEP_ALL_DAYS = env.int("WIKI_HISTORY_KEEP_ALL_DAYS", default=30)
+# Older revisions are thinned to the last one per page in each "day", "week" or "month"
+WIKI_HISTORY_KEEP_ONE_PER = env.str("WIKI_HISTORY_KEEP_ONE_PER", default="day")
+# Pages whose history is pruned in each transaction
+WIKI_HISTORY_PRUNE_BATCH_SIZE = env.int("WIKI_HISTORY_PRUNE_BATCH_SIZE", default=100)
+# Seconds a character's known secret ids are cached; entries are also refreshed whenever known_to changes
+WIKI_KNOWLEDGE_CACHE_TIMEOUT = env.int("WIKI_KNOWLEDGE_CACHE_TIMEOUT", default=60 * 60 * 24 * 7)
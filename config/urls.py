@@ -54,7 +54,17 @@ urlpatterns += [
     path("api/v1/token/", DocumentedObtainAuthToken.as_view(), name="obtain-auth-token"),
     path("api/v1/schema/", DocumentedAPIView.as_view(permission_classes=(permissions.AllowAny,)), name="api-schema"),
     path("api/v1/wiki/", PageViewSet.as_view({"get": "list"}), name="api-wiki"),
-    path("api/v1/wiki/<slug:slug>/", PageViewSet.as_view({"get": "retrieve"}), name="api-wiki-detail"),
+    path("api/v1/wiki/autocomplete/", PageViewSet.as_view({"get": "autocomplete"}), name="api-wiki-autocomplete"),
+    path("api/v1/wiki/export/", PageViewSet.as_view({"get": "export"}), name="api-wiki-export"),
+    # Nested page slugs contain slashes, so the page actions must come before the catch-all detail route
+    path("api/v1/wiki/<path:slug>/subtree/", PageViewSet.as_view({"get": "subtree"}), name="api-wiki-subtree"),
+    path("api/v1/wiki/<path:slug>/history/", PageViewSet.as_view({"get": "history"}), name="api-wiki-history"),
+    path("api/v1/wiki/<path:slug>/diff/", PageViewSet.as_view({"get": "diff"}), name="api-wiki-diff"),
+    path(
+        "api/v1/wiki/<path:slug>/",
+        PageViewSet.as_view({"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"}),
+        name="api-wiki-detail",
+    ),
     path(
         "api/v1/docs/",
         SpectacularSwaggerView.as_view(url_name="api-schema", permission_classes=(permissions.AllowAny,)),
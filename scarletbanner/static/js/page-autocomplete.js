@@ -0,0 +1,26 @@
+/* Replace the options of page pickers with matches from the autocomplete endpoint as the user types. */
+document.querySelectorAll('select[data-autocomplete-url]').forEach((select) => {
+  const search = document.createElement('input');
+  search.type = 'search';
+  search.placeholder = 'Search pages';
+  search.setAttribute('aria-label', 'Search pages');
+  select.before(search);
+
+  let timer = null;
+  search.addEventListener('input', () => {
+    clearTimeout(timer);
+    timer = setTimeout(async () => {
+      const url = `${select.dataset.autocompleteUrl}?q=${encodeURIComponent(search.value)}`;
+      const response = await fetch(url, { headers: { Accept: 'application/json' }, credentials: 'same-origin' });
+      if (!response.ok) return;
+      const { pages } = await response.json();
+      const current = select.value;
+      Array.from(select.options)
+        .filter((option) => option.value !== '' && option.value !== current)
+        .forEach((option) => option.remove());
+      pages
+        .filter((page) => String(page.id) !== current)
+        .forEach((page) => select.add(new Option(`${page.title} (${page.slug})`, page.id)));
+    }, 200);
+  });
+});
@@ -7,6 +7,8 @@ from scarletbanner.wiki.models import Character, File, Image, OwnedPage, Page, S
 
 @admin.register(Page)
 class PageAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["parent"]
+    search_fields = ["title"]
     fieldsets = (
         (None, {"fields": ("title", "body")}),
         (
@@ -23,9 +25,15 @@ class PageAdmin(admin.ModelAdmin):
         ),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.autocomplete(search_term), False
+
 
 @admin.register(OwnedPage)
 class OwnedPageAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["parent"]
     fieldsets = (
         (None, {"fields": ("title", "body")}),
         (
@@ -51,6 +59,7 @@ class OwnedPageAdmin(admin.ModelAdmin):
 
 @admin.register(Character)
 class CharacterAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["parent"]
     fieldsets = (
         (None, {"fields": ("title", "body")}),
         (
@@ -76,6 +85,7 @@ class CharacterAdmin(admin.ModelAdmin):
 
 @admin.register(Template)
 class TemplateAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["parent"]
     fieldsets = (
         (None, {"fields": ("title", "body")}),
         (
@@ -95,6 +105,7 @@ class TemplateAdmin(admin.ModelAdmin):
 
 @admin.register(File)
 class FileAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["parent"]
     fieldsets = (
         (None, {"fields": ("title", "attachment", "body")}),
         (
@@ -114,6 +125,7 @@ class FileAdmin(admin.ModelAdmin):
 
 @admin.register(Image)
 class ImageAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["parent"]
     fieldsets = (
         (None, {"fields": ("title", "attachment", "body")}),
         (
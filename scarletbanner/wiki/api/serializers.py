@@ -2,6 +2,7 @@ from rest_framework import serializers
 
 from scarletbanner.wiki.enums import PermissionLevel
 from scarletbanner.wiki.models import Page
+from scarletbanner.wiki.search import highlight
 
 
 class PageSerializer(serializers.ModelSerializer):
@@ -16,3 +17,41 @@ class PageSerializer(serializers.ModelSerializer):
         if representation["parent"] is None:
             representation.pop("parent")
         return representation
+
+
+class PageTreeSerializer(PageSerializer):
+    depth = serializers.IntegerField(source="tree_depth", read_only=True)
+
+    class Meta(PageSerializer.Meta):
+        fields = PageSerializer.Meta.fields + ["depth"]
+
+
+class PageSearchSerializer(PageSerializer):
+    headline = serializers.SerializerMethodField()
+
+    class Meta(PageSerializer.Meta):
+        fields = PageSerializer.Meta.fields + ["headline"]
+
+    def get_headline(self, instance) -> str:
+        return highlight(instance.headline)
+
+
+class PageAutocompleteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Page
+        fields = ["id", "title", "slug"]
+
+
+class PageRevisionSerializer(serializers.Serializer):
+    HISTORY_TYPES = {"+": "created", "~": "changed", "-": "deleted"}
+
+    id = serializers.IntegerField(source="history_id")
+    date = serializers.DateTimeField(source="history_date")
+    type = serializers.SerializerMethodField()
+    editor = serializers.CharField(source="history_user.username", default=None)
+    message = serializers.CharField(source="history_change_reason", default=None)
+    title = serializers.CharField()
+    slug = serializers.CharField()
+
+    def get_type(self, instance) -> str:
+        return self.HISTORY_TYPES[instance.history_type]
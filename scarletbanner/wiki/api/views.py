@@ -1,17 +1,87 @@
-from django.db.models import Q
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema, extend_schema_view
 from rest_framework import pagination, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from tree_queries.compiler import TreeQuery
 
-from scarletbanner.wiki.api.serializers import PageSerializer
+from scarletbanner.wiki.api.serializers import (
+    PageAutocompleteSerializer,
+    PageRevisionSerializer,
+    PageSearchSerializer,
+    PageSerializer,
+    PageTreeSerializer,
+)
+from scarletbanner.wiki.caches import DiffCache
+from scarletbanner.wiki.diff import diff_text
+from scarletbanner.wiki.enums import PermissionLevel
+from scarletbanner.wiki.export import export_pages, to_ndjson
 from scarletbanner.wiki.models import Page
 
 
 class WikiPagination(pagination.LimitOffsetPagination):
     default_limit = 50
     max_limit = 100
+    cursor_query_param = "cursor"
+    estimate_query_param = "estimate"
+    invalid_cursor_message = "Invalid cursor"
+    results_key = "pages"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        tree_ordered = isinstance(queryset.query, TreeQuery) or queryset.query.extra_order_by
+        if tree_ordered or queryset.ordered and tuple(queryset.query.order_by) not in {("-id",), ("-pk",)}:
+            raise ParseError("Cursor pagination is only available for pages listed newest first.")
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.estimate = None
+        if request.query_params.get(self.estimate_query_param, "").lower() in {"1", "true"}:
+            self.estimate = self.get_estimated_count(queryset)
+
+        queryset = queryset.order_by("-pk")
+        after = self.decode_cursor(request.query_params[self.cursor_query_param])
+        if after is not None:
+            queryset = queryset.filter(pk__lt=after)
+        results = list(queryset[: self.limit + 1])
+        self.next_cursor = self.encode_cursor(results[self.limit - 1].pk) if len(results) > self.limit else None
+        return results[: self.limit]
+
+    def decode_cursor(self, encoded: str) -> int | None:
+        if not encoded:
+            return None
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            return int(urlsafe_b64decode(padded.encode("ascii")).decode("ascii"))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def encode_cursor(pk: int) -> str:
+        return urlsafe_b64encode(str(pk).encode("ascii")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def get_estimated_count(queryset) -> int:
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
 
     def get_paginated_response(self, data):
+        if self.cursor_mode:
+            return self.get_cursor_paginated_response(data)
+
         request_url = self.request.build_absolute_uri().split("?")[0]
         limit = self.limit if hasattr(self, "limit") else self.default_limit
 
@@ -34,11 +104,50 @@ class WikiPagination(pagination.LimitOffsetPagination):
                 "offset": self.offset,
                 "limit": self.limit,
                 "total": self.count,
-                "pages": data,
+                self.results_key: data,
             },
             headers={"Link": ", ".join(links)} if len(links) > 2 else None,
         )
 
+    def get_cursor_paginated_response(self, data):
+        url = remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        links = [f'<{replace_query_param(url, self.cursor_query_param, "")}>; rel="first"']
+        if self.next_cursor is not None:
+            links.insert(0, f'<{replace_query_param(url, self.cursor_query_param, self.next_cursor)}>; rel="next"')
+
+        body = {
+            "query": self.request.query_params.get("query", ""),
+            "limit": self.limit,
+            "next": self.next_cursor,
+            self.results_key: data,
+        }
+        if self.estimate is not None:
+            body["estimated_total"] = self.estimate
+        return Response(body, headers={"Link": ", ".join(links)})
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Opaque cursor from a previous response. Pass an empty value to start keyset paging.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.estimate_query_param,
+                "required": False,
+                "in": "query",
+                "description": "When paging by cursor, include the planner's estimate of the total.",
+                "schema": {"type": "boolean"},
+            },
+        ]
+
+
+class RevisionPagination(WikiPagination):
+    results_key = "revisions"
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -46,7 +155,10 @@ class WikiPagination(pagination.LimitOffsetPagination):
         description="This endpoint returns a list of all wiki pages.",
         auth=[],
         parameters=[
-            OpenApiParameter(name="query", description="Filter pages by title or slug", required=False, type=str),
+            OpenApiParameter(
+                name="query", description="Search page titles, paths and bodies", required=False, type=str
+            ),
+            OpenApiParameter(name="under", description="Only list pages beneath this path", required=False, type=str),
         ],
         examples=[
             OpenApiExample(
@@ -106,6 +218,134 @@ class WikiPagination(pagination.LimitOffsetPagination):
             ),
         ],
     ),
+    autocomplete=extend_schema(
+        summary="Suggest pages by title",
+        description="This endpoint returns the readable pages whose titles best match a partial or misspelled title.",
+        auth=[],
+        parameters=[OpenApiParameter(name="q", description="Partial page title", required=True, type=str)],
+        responses=PageAutocompleteSerializer(many=True),
+        examples=[
+            OpenApiExample(
+                "Example Response",
+                value={"query": "drag", "pages": [{"id": 42, "title": "Dragons", "slug": "dragons"}]},
+                response_only=True,
+                status_codes=["200"],
+            )
+        ],
+    ),
+    export=extend_schema(
+        summary="Export every readable page",
+        description="This endpoint streams every page the requester can read as newline-delimited JSON, "
+        "optionally with each page's revision history.",
+        auth=[],
+        parameters=[
+            OpenApiParameter(name="history", description="Include each page's revisions", required=False, type=bool)
+        ],
+        responses={(200, "application/x-ndjson"): OpenApiTypes.STR},
+    ),
+    history=extend_schema(
+        summary="List a page's revisions",
+        description="This endpoint returns a page's revisions, newest first, with each editor and change message.",
+        auth=[],
+        responses=PageRevisionSerializer(many=True),
+        examples=[
+            OpenApiExample(
+                "Example Response",
+                value={
+                    "query": "",
+                    "offset": 0,
+                    "limit": 50,
+                    "total": 1,
+                    "revisions": [
+                        {
+                            "id": 7,
+                            "date": "2024-05-01T12:00:00Z",
+                            "type": "created",
+                            "editor": "jdoe",
+                            "message": "Initial text",
+                            "title": "Page Title",
+                            "slug": "page-title",
+                        }
+                    ],
+                },
+                response_only=True,
+                status_codes=["200"],
+            )
+        ],
+    ),
+    diff=extend_schema(
+        summary="Compare two revisions of a page",
+        description="This endpoint returns a line diff between two revisions of a page. Without `to` it compares "
+        "the latest revision; without `from` it compares against the revision before `to`.",
+        auth=[],
+        parameters=[
+            OpenApiParameter(name="from", description="Older revision id", required=False, type=int),
+            OpenApiParameter(name="to", description="Newer revision id", required=False, type=int),
+        ],
+        examples=[
+            OpenApiExample(
+                "Example Response",
+                value={
+                    "from": {"id": 7, "date": "2024-05-01T12:00:00Z", "type": "created", "editor": "jdoe"},
+                    "to": {"id": 9, "date": "2024-05-02T12:00:00Z", "type": "changed", "editor": "jdoe"},
+                    "added": 1,
+                    "removed": 1,
+                    "hunks": [
+                        {
+                            "from_start": 1,
+                            "from_count": 2,
+                            "to_start": 1,
+                            "to_count": 2,
+                            "lines": [" Lorem ipsum.", "-Old line.", "+New line."],
+                        }
+                    ],
+                },
+                response_only=True,
+                status_codes=["200"],
+            )
+        ],
+    ),
+    subtree=extend_schema(
+        summary="List a page and its descendants",
+        description="This endpoint returns a page followed by every page beneath it that the requester can read, "
+        "in depth-first order.",
+        auth=[],
+        responses=PageTreeSerializer(many=True),
+        examples=[
+            OpenApiExample(
+                "Example Response",
+                value={
+                    "query": "",
+                    "offset": 0,
+                    "limit": 50,
+                    "total": 2,
+                    "pages": [
+                        {
+                            "id": 41,
+                            "title": "Parent Page",
+                            "slug": "parent-page",
+                            "body": "Lorem ipsum dolor sit amet.",
+                            "read": "Public",
+                            "write": "Public",
+                            "depth": 0,
+                        },
+                        {
+                            "id": 42,
+                            "title": "Page Title",
+                            "slug": "parent-page/page-title",
+                            "body": "Lorem ipsum dolor sit amet.",
+                            "parent": 41,
+                            "read": "Public",
+                            "write": "Public",
+                            "depth": 1,
+                        },
+                    ],
+                },
+                response_only=True,
+                status_codes=["200"],
+            )
+        ],
+    ),
 )
 class PageViewSet(viewsets.ModelViewSet):
     serializer_class = PageSerializer
@@ -113,44 +353,165 @@ class PageViewSet(viewsets.ModelViewSet):
     queryset = Page.objects.all()
     lookup_field = "slug"
 
+    def get_serializer_class(self):
+        if self.action == "list" and self.request.query_params.get("query", None):
+            return PageSearchSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
         queryset = Page.objects.all().order_by("-id")
         query = self.request.query_params.get("query", None)
         if query:
-            queryset = queryset.filter(Q(title__icontains=query) | Q(slug__icontains=query))
+            queryset = queryset.search(query)
+        under = self.request.query_params.get("under", None)
+        if under:
+            queryset = queryset.under(under)
         return queryset
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        permitted_queryset = [page for page in queryset if page.can_read(request.user)]
-        page = self.paginate_queryset(permitted_queryset)
+        queryset = self.filter_queryset(self.get_queryset()).readable_by(request.user)
+        page = self.paginate_queryset(queryset)
 
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(permitted_queryset, many=True)
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
-        slug = kwargs.get("slug")
+        instance, error = self.get_readable_page(request, kwargs.get("slug"))
+        if error is not None:
+            return error
+
+        headers = {}
+        validators = self.get_validators(instance, request.user)
+        if validators is not None:
+            etag, last_modified = validators
+            headers = {"ETag": etag, "Last-Modified": http_date(last_modified)}
+            if instance.read != PermissionLevel.PUBLIC.value:
+                headers["Cache-Control"] = "private"
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                for header, value in headers.items():
+                    not_modified[header] = value
+                return not_modified
+
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, headers=headers)
+
+    @staticmethod
+    def get_validators(instance: Page, user) -> tuple[str, int] | None:
+        revision = instance.history.order_by("-history_id").values_list("history_id", "history_date").first()
+        if revision is None:
+            return None
+
+        history_id, history_date = revision
+        etag = f"{instance.pk}.{history_id}"
+        if instance.read != PermissionLevel.PUBLIC.value:
+            fingerprint = repr((getattr(user, "pk", None), instance.read, instance.permission_state))
+            etag = f"{etag}.{hashlib.sha256(fingerprint.encode()).hexdigest()[:16]}"
+        return f'"{etag}"', int(history_date.timestamp())
+
+    @action(detail=True, methods=["get"])
+    def subtree(self, request, slug=None):
+        root, error = self.get_readable_page(request, slug)
+        if error is not None:
+            return error
+
+        queryset = root.descendants(include_self=True).readable_by(request.user)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = PageTreeSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = PageTreeSerializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=["get"])
+    def history(self, request, slug=None):
+        instance, error = self.get_readable_page(request, slug)
+        if error is not None:
+            return error
+
+        queryset = instance.history.select_related("history_user").defer("body", "body_delta").order_by("-pk")
+        paginator = RevisionPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(PageRevisionSerializer(page, many=True).data)
+
+    @action(detail=True, methods=["get"])
+    def diff(self, request, slug=None):
+        instance, error = self.get_readable_page(request, slug)
+        if error is not None:
+            return error
+
+        try:
+            from_id, to_id = (
+                int(request.query_params[key]) if request.query_params.get(key) else None for key in ["from", "to"]
+            )
+        except ValueError:
+            raise ParseError("Revisions are identified by integer ids.")
+        history = instance.history.order_by("-pk")
+        if to_id is None:
+            to_id = history.values_list("pk", flat=True).first()
+        if from_id is None and to_id is not None:
+            from_id = history.filter(pk__lt=to_id).values_list("pk", flat=True).first()
+
+        ids = [pk for pk in [from_id, to_id] if pk is not None]
+        revisions = {
+            revision.pk: revision
+            for revision in history.select_related("history_user").defer("body", "body_delta").filter(pk__in=ids)
+        }
+        if to_id not in revisions or (from_id is not None and from_id not in revisions):
+            return Response({"detail": f"No such revision of the page '{slug}'"}, status=404)
+
+        cache = DiffCache()
+        key = cache.key(history.model, from_id, to_id)
+        diff = cache.get(key)
+        if diff is None:
+            bodies = {revision.pk: revision.body for revision in history.filter(pk__in=ids)}
+            diff = cache.set(key, diff_text(bodies.get(from_id, ""), bodies[to_id]))
+
+        before = PageRevisionSerializer(revisions[from_id]).data if from_id is not None else None
+        return Response({"from": before, "to": PageRevisionSerializer(revisions[to_id]).data, **diff})
+
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        text = request.query_params.get("q", "")
+        pages = (
+            Page.objects.non_polymorphic()
+            .readable_by(request.user)
+            .autocomplete(text)
+            .only("id", "title", "slug")[: settings.WIKI_AUTOCOMPLETE_LIMIT]
+        )
+        serializer = PageAutocompleteSerializer(pages, many=True)
+        return Response({"query": text, "pages": serializer.data})
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        history = request.query_params.get("history", "").lower() in {"1", "true"}
+        pages = export_pages(Page.objects.readable_by(request.user), history)
+        response = StreamingHttpResponse(to_ndjson(pages), content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="wiki.ndjson"'
+        return response
+
+    def get_readable_page(self, request, slug: str) -> tuple[Page | None, Response | None]:
         instance = self.get_queryset().filter(slug=slug).first()
 
         if instance is None:
-            return Response({"detail": f"No page found with the path '{slug}'"}, status=404)
+            return None, Response({"detail": f"No page found with the path '{slug}'"}, status=404)
 
         if not instance.can_read(request.user):
             if request.user is None or request.user.is_anonymous:
-                return Response(
+                return None, Response(
                     {"detail": "You must be authenticated to access this resource."},
                     status=401,
                     headers={"WWW-Authenticate": "Token"},
                 )
             else:
-                return Response(
+                return None, Response(
                     {"detail": "You do not have permission to access this resource."},
                     status=403,
                 )
 
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        return instance, None
@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class WikiConfig(AppConfig):
@@ -7,4 +9,8 @@ class WikiConfig(AppConfig):
     verbose_name = "Wiki"
 
     def ready(self):
+        if settings.WIKI_HISTORY_KEEP_ONE_PER not in ("day", "week", "month"):
+            raise ImproperlyConfigured(
+                f"WIKI_HISTORY_KEEP_ONE_PER must be day, week or month, not {settings.WIKI_HISTORY_KEEP_ONE_PER!r}"
+            )
         import scarletbanner.wiki.signals  # noqa: F401
@@ -0,0 +1,267 @@
+import hashlib
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable
+from uuid import uuid4
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.db import transaction
+
+
+class PermissionCache:
+    def __init__(self):
+        self.decisions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> bool | None:
+        pk, *rest = key
+        decision = self.decisions.get(pk, {}).get(tuple(rest))
+        if decision is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return decision
+
+    def set(self, key: tuple, decision: bool) -> bool:
+        pk, *rest = key
+        self.decisions.setdefault(pk, {})[tuple(rest)] = decision
+        return decision
+
+    def invalidate(self, pk: int) -> None:
+        self.decisions.pop(pk, None)
+
+    def invalidate_many(self, pks: Iterable[int]) -> None:
+        for pk in pks:
+            self.decisions.pop(pk, None)
+
+    @property
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": sum(map(len, self.decisions.values()))}
+
+
+_permission_cache: ContextVar[PermissionCache | None] = ContextVar("permission_cache", default=None)
+
+
+def get_permission_cache() -> PermissionCache | None:
+    return _permission_cache.get()
+
+
+@contextmanager
+def permission_cache():
+    cache = PermissionCache()
+    token = _permission_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _permission_cache.reset(token)
+
+
+class RenderCache:
+    prefix = "wiki:render"
+
+    def __init__(self, cache=None):
+        self.cache = default_cache if cache is None else cache
+
+    def key(self, page, fingerprint: str) -> str:
+        content = f"{page.pk}:{type(page).__name__}:{page.body}"
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        return f"{self.prefix}:{digest}:{fingerprint}"
+
+    def fingerprint(self, known_secret_ids: Iterable[int] | None) -> str:
+        secrets = self.versions([RenderCache.dependency("secrets", "all")])
+        known = "anonymous" if known_secret_ids is None else ",".join(str(pk) for pk in sorted(known_secret_ids))
+        content = f"{known}:{','.join(secrets.values())}"
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        current = self.cache.get_many(list(entry["dependencies"]))
+        if current != entry["dependencies"]:
+            return None
+        return entry["html"]
+
+    def set(self, key: str, html: str, versions: dict[str, str]) -> str:
+        entry = {"html": html, "dependencies": versions}
+        self.cache.set(key, entry, settings.WIKI_RENDER_CACHE_TIMEOUT)
+        return html
+
+    def versions(self, dependencies: Iterable[str]) -> dict[str, str]:
+        dependencies = list(dependencies)
+        versions = self.cache.get_many(dependencies)
+        for dependency in dependencies:
+            if dependency not in versions:
+                self.cache.add(dependency, uuid4().hex, None)
+                versions[dependency] = self.cache.get(dependency)
+        return versions
+
+    def invalidate(self, dependencies: Iterable[str]) -> None:
+        self.cache.set_many({dependency: uuid4().hex for dependency in dependencies}, None)
+
+    def invalidate_paths(self, paths: Iterable[tuple[str, str]]) -> None:
+        dependencies = set()
+        for title, slug in paths:
+            dependencies |= {RenderCache.dependency("title", title), RenderCache.dependency("slug", slug)}
+        self.invalidate(dependencies)
+
+    @staticmethod
+    def dependency(kind: str, value: str) -> str:
+        digest = hashlib.sha256(value.encode()).hexdigest()
+        return f"wiki:dependency:{kind}:{digest}"
+
+
+class LinkCache:
+    generation_key = "wiki:links:generation"
+
+    def __init__(self, cache=None, size: int | None = None):
+        self.cache = default_cache if cache is None else cache
+        self.size = settings.WIKI_LINK_CACHE_SIZE if size is None else size
+        self.urls = OrderedDict()
+        self.generation = None
+
+    def sync(self) -> str:
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            self.cache.add(self.generation_key, uuid4().hex, None)
+            generation = self.cache.get(self.generation_key)
+        if generation != self.generation:
+            self.urls = OrderedDict()
+            self.generation = generation
+        return generation
+
+    def get_many(self, targets: Iterable[tuple[str, str]]) -> dict[tuple[str, str], str | None]:
+        urls = {}
+        for target in targets:
+            if target in self.urls:
+                self.urls.move_to_end(target)
+                urls[target] = self.urls[target]
+        return urls
+
+    def set_many(self, urls: dict[tuple[str, str], str | None], generation: str | None = None) -> None:
+        if generation is not None and generation != self.generation:
+            return
+        for target, url in urls.items():
+            self.urls[target] = url
+            self.urls.move_to_end(target)
+        while len(self.urls) > self.size:
+            self.urls.popitem(last=False)
+
+    def invalidate_paths(self, paths: Iterable[tuple[str, str]]) -> None:
+        for title, slug in paths:
+            self.urls.pop(("title", title), None)
+            self.urls.pop(("slug", slug), None)
+        self.generation = uuid4().hex
+        self.cache.set(self.generation_key, self.generation, None)
+
+    def clear(self) -> None:
+        self.urls = OrderedDict()
+        self.generation = None
+
+
+class DiffCache:
+    prefix = "wiki:diff"
+
+    def __init__(self, cache=None):
+        self.cache = default_cache if cache is None else cache
+
+    def key(self, model, from_id: int, to_id: int) -> str:
+        return f"{self.prefix}:{model._meta.label_lower}:{from_id}:{to_id}"
+
+    def get(self, key: str) -> dict | None:
+        return self.cache.get(key)
+
+    def set(self, key: str, diff: dict) -> dict:
+        self.cache.set(key, diff, settings.WIKI_DIFF_CACHE_TIMEOUT)
+        return diff
+
+
+class KnowledgeCache:
+    prefix = "wiki:knowledge"
+
+    def __init__(self, cache=None):
+        self.cache = default_cache if cache is None else cache
+
+    def key(self, character_id: int) -> str:
+        return f"{self.prefix}:{character_id}"
+
+    def version_key(self, character_id: int) -> str:
+        return f"{self.prefix}:version:{character_id}"
+
+    def get(self, character_id: int) -> frozenset[int]:
+        return self.get_many([character_id])[character_id]
+
+    def get_many(self, character_ids: Iterable[int]) -> dict[int, frozenset[int]]:
+        character_ids = list(dict.fromkeys(character_ids))
+        cached = self.cache.get_many([key for pk in character_ids for key in (self.key(pk), self.version_key(pk))])
+        versions = {}
+        for pk in character_ids:
+            version = cached.get(self.version_key(pk))
+            if version is None:
+                self.cache.add(self.version_key(pk), uuid4().hex, None)
+                version = self.cache.get(self.version_key(pk))
+            versions[pk] = version
+
+        known = {}
+        for pk in character_ids:
+            entry = cached.get(self.key(pk))
+            if entry is not None and entry[0] == versions[pk]:
+                known[pk] = KnowledgeCache.decode(entry[1])
+        missing = {pk: versions[pk] for pk in character_ids if pk not in known}
+        if missing:
+            known.update(self.load(missing))
+        return known
+
+    def shared(self, character_ids: Iterable[int]) -> set[int]:
+        known = sorted(self.get_many(character_ids).values(), key=len)
+        return set(known[0].intersection(*known[1:])) if known else set()
+
+    def load(self, versions: dict[int, str]) -> dict[int, frozenset[int]]:
+        # Entries carry the version read before the query, so a row loaded before a concurrent change is never served
+        secret_ids = {pk: [] for pk in versions}
+        through = apps.get_model("wiki", "Secret").known_to.through
+        for character_id, secret_id in through.objects.filter(character_id__in=secret_ids).values_list(
+            "character_id", "secret_id"
+        ):
+            secret_ids[character_id].append(secret_id)
+        self.cache.set_many(
+            {self.key(pk): (versions[pk], KnowledgeCache.encode(ids)) for pk, ids in secret_ids.items()},
+            settings.WIKI_KNOWLEDGE_CACHE_TIMEOUT,
+        )
+        return {pk: frozenset(ids) for pk, ids in secret_ids.items()}
+
+    def refresh(self, character_ids: Iterable[int]) -> dict[int, frozenset[int]]:
+        versions = {pk: uuid4().hex for pk in character_ids}
+        self.cache.set_many({self.version_key(pk): version for pk, version in versions.items()}, None)
+        return self.load(versions) if versions else {}
+
+    def invalidate(self, character_ids: Iterable[int]) -> None:
+        character_ids = list(character_ids)
+        self.cache.set_many({self.version_key(pk): uuid4().hex for pk in character_ids}, None)
+        self.cache.delete_many([self.key(pk) for pk in character_ids])
+
+    @staticmethod
+    def encode(secret_ids: Iterable[int]) -> bytes:
+        return array("Q", sorted(secret_ids)).tobytes()
+
+    @staticmethod
+    def decode(data: bytes) -> frozenset[int]:
+        return frozenset(array("Q", data))
+
+
+link_cache = LinkCache()
+
+
+def invalidate_page_paths(paths: Iterable[tuple[str, str]]) -> None:
+    paths = set(paths)
+
+    def invalidate():
+        RenderCache().invalidate_paths(paths)
+        link_cache.invalidate_paths(paths)
+
+    transaction.on_commit(invalidate)
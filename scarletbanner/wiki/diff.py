@@ -0,0 +1,176 @@
+from typing import Iterator, Sequence
+
+DIFF_CONTEXT = 3
+# Diagonals bisect may explore for one diff before it falls back to a coarse result
+DIFF_MAX_COST = 250_000
+
+
+class DiffTooCostly(Exception):
+    pass
+
+
+def matching_blocks(
+    a: Sequence, b: Sequence, max_cost: int = DIFF_MAX_COST, strict: bool = False
+) -> list[tuple[int, int, int]]:
+    ids = {}
+    a = [ids.setdefault(item, len(ids)) for item in a]
+    b = [ids.setdefault(item, len(ids)) for item in b]
+    shared = set(a) & set(b)
+    a_index = [i for i, item in enumerate(a) if item in shared]
+    b_index = [j for j, item in enumerate(b) if item in shared]
+    a, b = [a[i] for i in a_index], [b[j] for j in b_index]
+
+    blocks, stack, budget = [], [(0, len(a), 0, len(b))], max_cost
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        start, end = (alo, blo), (ahi, bhi)
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo, blo = alo + 1, blo + 1
+        while ahi > alo and bhi > blo and a[ahi - 1] == b[bhi - 1]:
+            ahi, bhi = ahi - 1, bhi - 1
+        if alo > start[0]:
+            blocks.append((start[0], start[1], alo - start[0]))
+        if end[0] > ahi:
+            blocks.append((ahi, bhi, end[0] - ahi))
+        if alo == ahi or blo == bhi:
+            continue
+        try:
+            split = bisect(a, alo, ahi, b, blo, bhi, budget)
+        except DiffTooCostly:
+            if strict:
+                raise
+            budget = 0
+            continue
+        if split is not None:
+            x, y, cost = split
+            budget -= cost
+            stack += [(x, ahi, y, bhi), (alo, x, blo, y)]
+
+    merged = []
+    for i, j, size in sorted(blocks):
+        for offset in range(size):
+            x, y = a_index[i + offset], b_index[j + offset]
+            if merged and merged[-1][0] + merged[-1][2] == x and merged[-1][1] + merged[-1][2] == y:
+                merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + 1)
+            else:
+                merged.append((x, y, 1))
+    return merged
+
+
+def bisect(
+    a: list[int], alo: int, ahi: int, b: list[int], blo: int, bhi: int, limit: int
+) -> tuple[int, int, int] | None:
+    n, m = ahi - alo, bhi - blo
+    max_d = (n + m + 1) // 2
+    offset, length = max_d, 2 * max_d + 2
+    forward, backward = [-1] * length, [-1] * length
+    forward[offset + 1] = backward[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    cost = 0
+    for d in range(max_d):
+        cost += 2 * d + 2
+        if cost > limit:
+            raise DiffTooCostly("Diff exceeded its cost budget")
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            if k1 == -d or (k1 != d and forward[offset + k1 - 1] < forward[offset + k1 + 1]):
+                x1 = forward[offset + k1 + 1]
+            else:
+                x1 = forward[offset + k1 - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1, y1 = x1 + 1, y1 + 1
+            forward[offset + k1] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2 = offset + delta - k1
+                if 0 <= k2 < length and backward[k2] != -1 and x1 >= n - backward[k2]:
+                    return alo + x1, blo + y1, cost
+
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            if k2 == -d or (k2 != d and backward[offset + k2 - 1] < backward[offset + k2 + 1]):
+                x2 = backward[offset + k2 + 1]
+            else:
+                x2 = backward[offset + k2 - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ahi - x2 - 1] == b[bhi - y2 - 1]:
+                x2, y2 = x2 + 1, y2 + 1
+            backward[offset + k2] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1 = offset + delta - k2
+                if 0 <= k1 < length and forward[k1] != -1:
+                    x1 = forward[k1]
+                    if x1 >= n - x2:
+                        return alo + x1, blo + x1 - (k1 - offset), cost
+    return None
+
+
+def opcodes(
+    a: Sequence, b: Sequence, max_cost: int = DIFF_MAX_COST, strict: bool = False
+) -> list[tuple[str, int, int, int, int]]:
+    codes, i, j = [], 0, 0
+    for ai, bj, size in matching_blocks(a, b, max_cost, strict) + [(len(a), len(b), 0)]:
+        if i < ai and j < bj:
+            codes.append(("replace", i, ai, j, bj))
+        elif i < ai:
+            codes.append(("delete", i, ai, j, bj))
+        elif j < bj:
+            codes.append(("insert", i, ai, j, bj))
+        if size:
+            codes.append(("equal", ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return codes
+
+
+def grouped_opcodes(codes: list[tuple], context: int = DIFF_CONTEXT) -> Iterator[list[tuple]]:
+    codes = list(codes)
+    if codes and codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes and codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def diff_text(before: str, after: str, context: int = DIFF_CONTEXT) -> dict:
+    a, b = before.splitlines(), after.splitlines()
+    hunks, added, removed = [], 0, 0
+    for group in grouped_opcodes(opcodes(a, b), context):
+        lines = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines += [f" {line}" for line in a[i1:i2]]
+                continue
+            lines += [f"-{line}" for line in a[i1:i2]]
+            lines += [f"+{line}" for line in b[j1:j2]]
+            removed, added = removed + i2 - i1, added + j2 - j1
+        hunks.append(
+            {
+                "from_start": group[0][1] + 1,
+                "from_count": group[-1][2] - group[0][1],
+                "to_start": group[0][3] + 1,
+                "to_count": group[-1][4] - group[0][3],
+                "lines": lines,
+            }
+        )
+    return {"added": added, "removed": removed, "hunks": hunks}
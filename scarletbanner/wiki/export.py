@@ -0,0 +1,87 @@
+import json
+from collections import defaultdict
+from itertools import islice
+from typing import Iterator
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+
+from scarletbanner.wiki.enums import PermissionLevel
+from scarletbanner.wiki.revisions import expand_values
+
+PAGE_FIELDS = ["id", "title", "slug", "body", "read", "write"]
+
+
+def export_pages(queryset, history: bool = False, chunk_size: int | None = None) -> Iterator[dict]:
+    chunk_size = chunk_size or settings.WIKI_EXPORT_CHUNK_SIZE
+    rows = (
+        queryset.non_polymorphic()
+        .order_by("pk")
+        .values(*PAGE_FIELDS, "polymorphic_ctype_id", "parent__slug")
+        .iterator(chunk_size=chunk_size)
+    )
+    while chunk := list(islice(rows, chunk_size)):
+        revisions = get_revisions(chunk) if history else {}
+        for row in chunk:
+            record = {
+                "id": row["id"],
+                "type": ContentType.objects.get_for_id(row["polymorphic_ctype_id"]).model,
+                "title": row["title"],
+                "slug": row["slug"],
+                "body": row["body"],
+                "read": permission_name(row["read"]),
+                "write": permission_name(row["write"]),
+            }
+            if row["parent__slug"] is not None:
+                record["parent"] = row["parent__slug"]
+            if history:
+                record["history"] = revisions.get(row["id"], [])
+            yield record
+
+
+def get_revisions(rows: list[dict]) -> dict[int, list[dict]]:
+    by_model = defaultdict(list)
+    for row in rows:
+        by_model[ContentType.objects.get_for_id(row["polymorphic_ctype_id"]).model_class()].append(row["id"])
+
+    revisions = defaultdict(list)
+    for model, pks in by_model.items():
+        entries = list(
+            model.history.filter(id__in=pks)
+            .order_by("id", "history_date", "history_id")
+            .values(
+                *PAGE_FIELDS,
+                "history_id",
+                "history_date",
+                "history_type",
+                "history_change_reason",
+                "history_user__username",
+                "body_delta",
+                "delta_base",
+            )
+        )
+        expand_values(model.history.model, entries)
+        for entry in entries:
+            revisions[entry["id"]].append(
+                {
+                    "date": entry["history_date"].isoformat(),
+                    "type": entry["history_type"],
+                    "user": entry["history_user__username"],
+                    "message": entry["history_change_reason"],
+                    "title": entry["title"],
+                    "slug": entry["slug"],
+                    "body": entry["body"],
+                    "read": permission_name(entry["read"]),
+                    "write": permission_name(entry["write"]),
+                }
+            )
+    return revisions
+
+
+def permission_name(value: int) -> str:
+    return PermissionLevel(value).name.replace("_", " ").title()
+
+
+def to_ndjson(records: Iterator[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record) + "\n"
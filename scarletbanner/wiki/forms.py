@@ -1,9 +1,28 @@
 from django import forms
 from django.forms import modelform_factory
+from django.urls import reverse
 
 from scarletbanner.wiki.models import Page
 
 
+class PageAutocompleteSelect(forms.Select):
+    class Media:
+        js = ["js/page-autocomplete.js"]
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs["data-autocomplete-url"] = reverse("api:page-autocomplete")
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [pk for pk in value if str(pk).isdigit()]
+        field = self.choices.field
+        options = [self.create_option(name, "", field.empty_label or "", not selected, 0)]
+        for page in field.queryset.non_polymorphic().filter(pk__in=selected):
+            options.append(self.create_option(name, page.pk, field.label_from_instance(page), True, len(options)))
+        return [(None, options, 0)]
+
+
 class PageForm(forms.ModelForm):
     type = forms.ChoiceField(
         choices=[
@@ -17,6 +36,7 @@ class PageForm(forms.ModelForm):
     class Meta:
         model = Page
         fields = ["title", "slug", "body", "parent", "read", "write"]
+        widgets = {"parent": PageAutocompleteSelect}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
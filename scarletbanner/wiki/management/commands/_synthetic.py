@@ -0,0 +1,16 @@
+from scarletbanner.wiki.models import Page
+
+
+def build_tree(root: Page, pages: int, branching: int, batch_size: int = 1000) -> int:
+    level, count = [root], 1
+    while count < pages:
+        children = []
+        for parent in level:
+            for _ in range(min(branching, pages - count - len(children))):
+                slug = f"{parent.slug}/page-{count + len(children)}"
+                child = Page(title=slug, slug=slug, body="", parent=parent, read=root.read, write=root.write)
+                child.pre_save_polymorphic()
+                children.append(child)
+        level = Page.objects.bulk_create(children, batch_size=batch_size)
+        count += len(children)
+    return count
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from scarletbanner.wiki.models import Page, PageEditor
+
+
+class Command(BaseCommand):
+    help = "Rebuild the page editor index from the page history tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        page_ids = set(Page.objects.values_list("pk", flat=True))
+        edits = {}
+
+        for model in Page.get_concrete_models():
+            rows = (
+                model.history.exclude(history_user=None)
+                .order_by()
+                .values("id", "history_user")
+                .annotate(first_edit=Min("history_date"), last_edit=Max("history_date"), edit_count=Count("pk"))
+            )
+            for row in rows:
+                if row["id"] not in page_ids:
+                    continue
+                edits[(row["id"], row["history_user"])] = PageEditor(
+                    page_id=row["id"],
+                    user_id=row["history_user"],
+                    first_edit=row["first_edit"],
+                    last_edit=row["last_edit"],
+                    edit_count=row["edit_count"],
+                )
+
+        with transaction.atomic():
+            PageEditor.objects.bulk_create(
+                edits.values(),
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["page", "user"],
+                update_fields=["first_edit", "last_edit", "edit_count"],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(edits)} page editors."))
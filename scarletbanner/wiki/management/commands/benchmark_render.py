@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from scarletbanner.wiki.models import Character, Secret, Template
+from scarletbanner.wiki.renderers import (
+    RenderPipeline,
+    render_links,
+    render_markdown,
+    render_secrets,
+    render_template_pages,
+    render_templates,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare the chained renderers with the single-pass render pipeline on a synthetic page."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sections", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            body, character = self.setup(options["sections"])
+            legacy = self.benchmark_legacy(body, character, options["repeat"])
+            pipeline = self.benchmark_pipeline(body, character, options["repeat"])
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Page size: {len(body) / 1024:.1f} kB, {options['repeat']} runs")
+        self.stdout.write(f"{'stage':<14}{'chained (ms)':>14}{'pipeline (ms)':>15}")
+        for stage in sorted(set(legacy) | set(pipeline), key=lambda stage: -legacy.get(stage, 0.0)):
+            self.stdout.write(
+                f"{stage:<14}{legacy.get(stage, 0.0) * 1000:>14.1f}{pipeline.get(stage, 0.0) * 1000:>15.1f}"
+            )
+        total_legacy = sum(legacy.values()) * 1000
+        total_pipeline = sum(pipeline.values()) * 1000
+        self.stdout.write(self.style.SUCCESS(f"{'total':<14}{total_legacy:>14.1f}{total_pipeline:>15.1f}"))
+
+    @staticmethod
+    def setup(sections: int) -> tuple[str, Character]:
+        Template.create(None, "Benchmark Infobox", "<div>{{ body }}</div>")
+        character = Character.create(None, "Benchmark Character", "")
+        secret = Secret.objects.create(key="Benchmark Secret")
+        secret.known_to.add(character)
+        section = (
+            "## Section {i}\n\n"
+            '<template name="Benchmark Infobox">Fact {i}</template>\n\n'
+            'Lorem ipsum dolor sit amet. <secret show="[Benchmark Secret]">Hidden {i}.</secret> '
+            "See [[Benchmark Character]] and [[Missing Page {i}]].\n\n"
+        )
+        return "".join(section.format(i=i) for i in range(sections)), character
+
+    @staticmethod
+    def benchmark_legacy(body: str, character: Character, repeat: int) -> dict[str, float]:
+        stages = [
+            ("template_page", render_template_pages),
+            ("templates", render_templates),
+            ("secrets", lambda html: render_secrets(html, character)),
+            ("links", render_links),
+            ("markdown", render_markdown),
+        ]
+        timings = {}
+        for _ in range(repeat):
+            html = body
+            for stage, fn in stages:
+                start = time.perf_counter()
+                html = fn(html)
+                timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+        return timings
+
+    @staticmethod
+    def benchmark_pipeline(body: str, character: Character, repeat: int) -> dict[str, float]:
+        timings = {}
+        for _ in range(repeat):
+            pipeline = RenderPipeline(character, template_page=True)
+            pipeline.render(body)
+            for stage, elapsed in pipeline.timings.items():
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+        return timings
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from scarletbanner.wiki.management.commands._synthetic import build_tree
+from scarletbanner.wiki.models import Page
+
+
+class Command(BaseCommand):
+    help = "Compare recursive and bulk reparenting of a synthetic subtree."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=2000)
+        parser.add_argument("--branching", type=int, default=10)
+
+    def handle(self, *args, **options):
+        results = {}
+        with transaction.atomic():
+            root, target, count = self.setup(options["pages"], options["branching"])
+            for method, fn in [("recursive", self.reparent_recursive), ("bulk", Page.reparent)]:
+                savepoint = transaction.savepoint()
+                page = Page.objects.get(pk=root.pk)
+                queries = []
+
+                def count_queries(execute, sql, params, many, context):
+                    queries.append(sql)
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(count_queries):
+                    start = time.perf_counter()
+                    fn(page, None, target)
+                    elapsed = time.perf_counter() - start
+                results[method] = (len(queries), elapsed)
+                transaction.savepoint_rollback(savepoint)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Subtree: {count} pages")
+        self.stdout.write(f"{'method':<12}{'queries':>10}{'time (ms)':>12}")
+        for method, (queries, elapsed) in results.items():
+            self.stdout.write(f"{method:<12}{queries:>10}{elapsed * 1000:>12.1f}")
+
+    @staticmethod
+    def setup(pages: int, branching: int) -> tuple[Page, Page, int]:
+        target = Page.create(None, "Benchmark Target", "")
+        root = Page.create(None, "Benchmark Root", "")
+        return root, target, build_tree(root, pages, branching)
+
+    @staticmethod
+    def reparent_recursive(page: Page, editor, new_parent: Page or None) -> None:
+        page.parent = None
+        page.update(editor=editor, message=f"Reparenting to {new_parent.slug}", parent=new_parent)
+        for child in page.children.all():
+            Command.reparent_recursive(child, editor, page)
@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from scarletbanner.wiki.management.commands._synthetic import build_tree
+from scarletbanner.wiki.models import Page
+
+
+class Command(BaseCommand):
+    help = "Compare subtree counts and listings by parent walk, recursive CTE and slug prefix."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=100000)
+        parser.add_argument("--branching", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, plans = [], []
+        with transaction.atomic():
+            root = Page.create(None, "Benchmark Wiki", "")
+            count = build_tree(root, options["pages"], options["branching"])
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Page._meta.db_table}")
+
+            section, depth = root, 0
+            while section is not None:
+                methods = {
+                    "parent walk": (self.count_walk, self.list_walk),
+                    "cte": (lambda page: page.descendants().count(), lambda page: list(page.descendants())),
+                    "prefix": (
+                        lambda page: Page.objects.under(page.slug).count(),
+                        lambda page: list(Page.objects.under(page.slug)),
+                    ),
+                }
+                for method, (count_fn, list_fn) in methods.items():
+                    total, count_queries, count_time = self.measure(count_fn, section, options["repeat"])
+                    _, list_queries, list_time = self.measure(list_fn, section, options["repeat"])
+                    rows.append((depth, total, method, count_queries, count_time, list_queries, list_time))
+                plans.append((depth, Page.objects.under(section.slug).explain().splitlines()[0].strip()))
+                section, depth = Page.objects.filter(parent=section).order_by("pk").first(), depth + 1
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Wiki: {count} pages")
+        self.stdout.write(
+            f"{'depth':>5}{'pages':>8}  {'method':<12}{'queries':>8}{'count (ms)':>12}{'queries':>8}{'list (ms)':>12}"
+        )
+        for depth, total, method, count_queries, count_time, list_queries, list_time in rows:
+            self.stdout.write(
+                f"{depth:>5}{total:>8}  {method:<12}{count_queries:>8}{count_time * 1000:>12.1f}"
+                f"{list_queries:>8}{list_time * 1000:>12.1f}"
+            )
+        for depth, plan in plans:
+            self.stdout.write(f"Prefix plan at depth {depth}: {plan}")
+
+    @staticmethod
+    def measure(fn, page: Page, repeat: int) -> tuple[int, int, float]:
+        queries, best = [], None
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        for _ in range(repeat):
+            queries.clear()
+            with connection.execute_wrapper(count_queries):
+                start = time.perf_counter()
+                result = fn(page)
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        total = result if isinstance(result, int) else len(result)
+        return total, len(queries), best
+
+    @staticmethod
+    def list_walk(page: Page) -> list[Page]:
+        pages, level = [], [page.pk]
+        while level:
+            children = list(Page.objects.filter(parent_id__in=level))
+            pages.extend(children)
+            level = [child.pk for child in children]
+        return pages
+
+    @staticmethod
+    def count_walk(page: Page) -> int:
+        total, level = 0, [page.pk]
+        while level:
+            level = list(Page.objects.filter(parent_id__in=level).values_list("pk", flat=True))
+            total += len(level)
+        return total
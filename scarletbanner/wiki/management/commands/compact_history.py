@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, Length
+
+from scarletbanner.wiki.models import Page
+from scarletbanner.wiki.revisions import compact_revisions
+
+
+class Command(BaseCommand):
+    help = "Store page revision bodies as periodic snapshots plus line deltas, and report history table sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--vacuum", action="store_true")
+
+    def handle(self, *args, **options):
+        interval = options["interval"] or settings.WIKI_HISTORY_SNAPSHOT_INTERVAL
+        batch_size = options["batch_size"]
+        history_models = [model.history.model for model in Page.get_concrete_models()]
+        before = {model: self.measure(model) for model in history_models}
+
+        rewritten = 0
+        for model in history_models:
+            page_ids = list(model.objects.order_by("id").values_list("id", flat=True).distinct())
+            for start in range(0, len(page_ids), batch_size):
+                with transaction.atomic():
+                    changed = compact_revisions(model, page_ids[start : start + batch_size], interval)
+                    model.objects.bulk_update(changed, ["body", "body_delta", "delta_base"], batch_size=1000)
+                rewritten += len(changed)
+
+        if options["vacuum"]:
+            with connection.cursor() as cursor:
+                for model in history_models:
+                    cursor.execute(f"VACUUM FULL {connection.ops.quote_name(model._meta.db_table)}")
+
+        self.stdout.write(f"{'table':<28}{'chars before':>14}{'chars after':>14}{'disk before':>14}{'disk after':>14}")
+        for model in history_models:
+            (text_before, disk_before), (text_after, disk_after) = before[model], self.measure(model)
+            self.stdout.write(
+                f"{model._meta.db_table:<28}{text_before:>14}{text_after:>14}{disk_before:>14}{disk_after:>14}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Rewrote {rewritten} revisions."))
+
+    @staticmethod
+    def measure(model) -> tuple[int, int]:
+        text = model.objects.aggregate(size=Coalesce(Sum(Length("body")), 0) + Coalesce(Sum(Length("body_delta")), 0))[
+            "size"
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_total_relation_size(%s)", [model._meta.db_table])
+            disk = cursor.fetchone()[0]
+        return text, disk
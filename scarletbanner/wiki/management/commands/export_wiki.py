@@ -0,0 +1,40 @@
+import time
+from contextlib import nullcontext
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError, OutputWrapper
+
+from scarletbanner.wiki.export import export_pages, to_ndjson
+from scarletbanner.wiki.models import Page
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Stream every page as newline-delimited JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output")
+        parser.add_argument("--history", action="store_true")
+        parser.add_argument("--chunk-size", type=int)
+        parser.add_argument("--user")
+
+    def handle(self, *args, **options):
+        queryset = Page.objects.all()
+        if options["user"] is not None:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named '{options['user']}'.")
+            queryset = queryset.readable_by(user)
+
+        started, count = time.perf_counter(), 0
+        with open(options["output"], "w") if options["output"] else nullcontext() as file:
+            output = self.stdout if file is None else OutputWrapper(file)
+            for line in to_ndjson(export_pages(queryset, options["history"], options["chunk_size"])):
+                output.write(line, ending="")
+                count += 1
+
+        elapsed = time.perf_counter() - started
+        report = self.stdout if options["output"] is not None else self.stderr
+        report.write(self.style.SUCCESS(f"Exported {count} pages in {elapsed:.1f}s."))
@@ -0,0 +1,227 @@
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterator
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from slugify import slugify
+
+from scarletbanner.wiki.caches import invalidate_page_paths
+from scarletbanner.wiki.enums import PermissionLevel
+from scarletbanner.wiki.models import Page, PageEditor
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import pages from a JSONL file or a directory of Markdown files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--checkpoint")
+        parser.add_argument("--user")
+        parser.add_argument("--message", default="Imported")
+
+    def handle(self, *args, **options):
+        source = Path(options["source"]).resolve()
+        if not source.exists():
+            raise CommandError(f"{source} does not exist.")
+        self.user = self.get_user(options["user"])
+        self.message = options["message"]
+        self.batch_size = options["batch_size"]
+        self.checkpoint = options["checkpoint"]
+        self.source = str(source)
+
+        self.known, self.pending, self.ready = {}, defaultdict(list), []
+        self.imported = self.skipped = self.failed = 0
+        self.position = self.read_checkpoint()
+        self.started = time.perf_counter()
+
+        records = read_markdown(source) if source.is_dir() else read_jsonl(source)
+        for position, record in records:
+            if position < self.position:
+                continue
+            self.consumed = position + 1
+            if isinstance(record, str):
+                self.fail(position, record)
+                continue
+            self.ready.append(record)
+            if len(self.ready) >= self.batch_size:
+                self.flush()
+
+        self.consumed = getattr(self, "consumed", self.position)
+        while self.ready:
+            self.flush()
+        for parent, orphans in self.pending.items():
+            for record in orphans:
+                self.fail(record["position"], f"parent '{parent}' not found")
+        self.pending.clear()
+        self.write_checkpoint()
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {self.progress()}"))
+
+    def flush(self):
+        batch, self.ready = self.ready[: self.batch_size], self.ready[self.batch_size :]
+        missing = {record["parent"] for record in batch if record["parent"] and record["parent"] not in self.known}
+        self.known.update(Page.objects.filter(slug__in=missing).values_list("slug", "pk"))
+
+        insertable = {}
+        for record in batch:
+            if record["parent"] and record["parent"] not in self.known:
+                self.pending[record["parent"]].append(record)
+            elif record["slug"] in insertable:
+                self.fail(record["position"], f"duplicate slug '{record['slug']}'")
+            else:
+                insertable[record["slug"]] = record
+
+        existing = dict(Page.objects.filter(slug__in=insertable).values_list("slug", "pk"))
+        self.skipped += len(existing)
+        self.known.update(existing)
+        pages = []
+        for slug, record in insertable.items():
+            if slug in existing:
+                continue
+            page = Page(
+                title=record["title"],
+                slug=slug,
+                body=record["body"],
+                parent_id=self.known.get(record["parent"]),
+                read=record["read"],
+                write=record["write"],
+            )
+            page.pre_save_polymorphic()
+            pages.append(page)
+
+        with transaction.atomic():
+            Page.objects.bulk_create(pages)
+            timestamp = timezone.now()
+            Page.history.bulk_history_create(
+                pages, default_user=self.user, default_change_reason=self.message, default_date=timestamp
+            )
+            PageEditor.record_many(pages, self.user, timestamp)
+
+        for page in pages:
+            self.known[page.slug] = page.pk
+        self.imported += len(pages)
+        for slug in insertable:
+            self.ready += self.pending.pop(slug, [])
+        invalidate_page_paths((page.title, page.slug) for page in pages)
+
+        self.write_checkpoint()
+        self.stdout.write(self.progress())
+
+    def fail(self, position: int, reason: str):
+        self.failed += 1
+        self.stderr.write(f"Record {position + 1}: {reason}")
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.imported / elapsed if elapsed else 0
+        return (
+            f"{self.imported} imported, {self.skipped} skipped, {self.failed} failed "
+            f"in {elapsed:.1f}s ({rate:.0f} pages/s)"
+        )
+
+    def read_checkpoint(self) -> int:
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as file:
+            checkpoint = json.load(file)
+        if checkpoint["source"] != self.source:
+            raise CommandError(f"Checkpoint {self.checkpoint} belongs to {checkpoint['source']}.")
+        return checkpoint["position"]
+
+    def write_checkpoint(self):
+        if self.checkpoint is None:
+            return
+        waiting = [record["position"] for record in self.ready]
+        waiting += [record["position"] for records in self.pending.values() for record in records]
+        position = min(waiting, default=getattr(self, "consumed", self.position))
+        temporary = f"{self.checkpoint}.tmp"
+        with open(temporary, "w") as file:
+            json.dump({"source": self.source, "position": position}, file)
+        os.replace(temporary, self.checkpoint)
+
+    @staticmethod
+    def get_user(username: str | None) -> User | None:
+        if username is None:
+            return None
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{username}'.")
+
+
+def make_record(position: int, title: str, body: str, path: str, read=None, write=None) -> dict | str:
+    if not title:
+        return "missing title"
+    parts = [slugify(part) for part in path.split("/") if slugify(part)]
+    if not parts:
+        return "empty slug"
+    try:
+        read, write = parse_permission(read), parse_permission(write)
+    except (KeyError, ValueError) as error:
+        return f"invalid permission {error}"
+    return {
+        "position": position,
+        "title": title,
+        "body": body,
+        "slug": "/".join(parts),
+        "parent": "/".join(parts[:-1]) or None,
+        "read": read,
+        "write": write,
+    }
+
+
+def parse_permission(value) -> int:
+    if value is None:
+        return PermissionLevel.PUBLIC.value
+    if isinstance(value, int):
+        return PermissionLevel(value).value
+    return PermissionLevel[value.strip().upper().replace(" ", "_")].value
+
+
+def read_jsonl(path: Path) -> Iterator[tuple[int, dict | str]]:
+    with open(path) as file:
+        for position, line in enumerate(file):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield position, f"invalid JSON ({error.msg})"
+                continue
+            if not isinstance(data, dict):
+                yield position, "expected an object"
+                continue
+            title = data.get("title", "")
+            path = data.get("slug") or slugify(title)
+            if data.get("parent") and "/" not in path:
+                path = f"{data['parent']}/{path}"
+            yield position, make_record(
+                position, title, data.get("body", ""), path, data.get("read"), data.get("write")
+            )
+
+
+def read_markdown(root: Path) -> Iterator[tuple[int, dict | str]]:
+    position = 0
+    for directory, directories, files in os.walk(root):
+        directories.sort()
+        for name in sorted(files):
+            if not name.endswith(".md"):
+                continue
+            path = Path(directory, name)
+            text = path.read_text()
+            first, _, rest = text.partition("\n")
+            if first.startswith("# "):
+                title, body = first[2:].strip(), rest.lstrip("\n")
+            else:
+                title, body = path.stem.replace("-", " ").replace("_", " ").title(), text
+            yield position, make_record(position, title, body, path.relative_to(root).with_suffix("").as_posix())
+            position += 1
@@ -0,0 +1,22 @@
+import logging
+
+from django.conf import settings
+
+from scarletbanner.wiki.caches import permission_cache
+
+logger = logging.getLogger(__name__)
+
+
+class PermissionCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with permission_cache() as cache:
+            request.permission_cache = cache
+            response = self.get_response(request)
+
+        logger.debug("Permission cache for %s: %s", request.path, cache.stats)
+        if settings.DEBUG:
+            response["X-Permission-Cache"] = f"hits={cache.hits}; misses={cache.misses}"
+        return response
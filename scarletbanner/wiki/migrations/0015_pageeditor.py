@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wiki", "0014_image_historicalimage"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageEditor",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("first_edit", models.DateTimeField()),
+                ("last_edit", models.DateTimeField()),
+                ("edit_count", models.PositiveIntegerField(default=1)),
+                (
+                    "page",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="page_editors", to="wiki.page"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="page_edits",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["user", "page"], name="page_editor_user_page")],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="pageeditor",
+            constraint=models.UniqueConstraint(fields=("page", "user"), name="unique_page_editor"),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wiki", "0015_pageeditor"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="DROP INDEX IF EXISTS unique_slug",
+            reverse_sql="CREATE UNIQUE INDEX unique_slug ON wiki_page (slug)",
+        ),
+    ]
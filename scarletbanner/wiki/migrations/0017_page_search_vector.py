@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-17 03:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("wiki", "0016_drop_duplicate_slug_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.CombinedSearchVector(
+                        django.contrib.postgres.search.SearchVector("title", config="simple", weight="A"),
+                        "||",
+                        django.contrib.postgres.search.SearchVector(
+                            django.db.models.functions.text.Replace("slug", models.Value("/"), models.Value(" ")),
+                            config="simple",
+                            weight="A",
+                        ),
+                        django.contrib.postgres.search.SearchConfig("simple"),
+                    ),
+                    "||",
+                    django.contrib.postgres.search.SearchVector("body", config="english", weight="B"),
+                    django.contrib.postgres.search.SearchConfig("simple"),
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="page",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="page_search_vector"),
+        ),
+    ]
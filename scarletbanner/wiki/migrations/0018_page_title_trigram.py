@@ -0,0 +1,37 @@
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute("CREATE INDEX IF NOT EXISTS page_title_trigram ON wiki_page USING gin (title gin_trgm_ops)")
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS page_title_trigram")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("wiki", "0017_page_search_vector"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_trigram_index, drop_trigram_index)],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="page",
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=["title"], name="page_title_trigram", opclasses=["gin_trgm_ops"]
+                    ),
+                ),
+            ],
+        ),
+    ]
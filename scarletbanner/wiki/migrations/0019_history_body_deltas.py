@@ -0,0 +1,73 @@
+# Generated by Django 5.0.6 on 2026-10-17 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wiki", "0018_page_title_trigram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalcharacter",
+            name="body_delta",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalcharacter",
+            name="delta_base",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalfile",
+            name="body_delta",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalfile",
+            name="delta_base",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalimage",
+            name="body_delta",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalimage",
+            name="delta_base",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalownedpage",
+            name="body_delta",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalownedpage",
+            name="delta_base",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalpage",
+            name="body_delta",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicalpage",
+            name="delta_base",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicaltemplate",
+            name="body_delta",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="historicaltemplate",
+            name="delta_base",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,59 +1,227 @@
 import ast
 import mimetypes
 import re
-from typing import Any
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchRank, SearchVector, SearchVectorField, TrigramWordSimilarity
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import UploadedFile
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Func, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat, Length, Replace, Substr
+from django.utils import timezone
+from polymorphic.managers import PolymorphicManager
 from polymorphic.models import PolymorphicModel
+from polymorphic.query import PolymorphicQuerySet
 from simple_history.models import HistoricalRecords
-from simple_history.utils import update_change_reason
 from slugify import slugify
+from tree_queries.fields import TreeNodeForeignKey
 from tree_queries.models import TreeNode
+from tree_queries.query import TreeQuerySet
 
+from scarletbanner.wiki.caches import KnowledgeCache, get_permission_cache, invalidate_page_paths
 from scarletbanner.wiki.enums import PermissionLevel
+from scarletbanner.wiki.revisions import DeltaRevision, RevisionManager, RevisionQuerySet
+from scarletbanner.wiki.search import headline, parse_query, trigram_available
 
 User = get_user_model()
 
 
-class Page(PolymorphicModel):
+class PageQuerySet(PolymorphicQuerySet, TreeQuerySet):
+    def readable_by(self, user: User = None) -> "PageQuerySet":
+        if user is not None and user.is_staff:
+            return self
+
+        public = Q(read=PermissionLevel.PUBLIC.value)
+        if user is None or user.is_anonymous:
+            return self.filter(public)
+
+        members = Q(read=PermissionLevel.MEMBERS_ONLY.value)
+        owner = Q(ownedpage__owner=user)
+        editor = Q(pk__in=PageEditor.objects.filter(user=user).values("page"))
+
+        editors_only = Q(read=PermissionLevel.EDITORS_ONLY.value) & (editor | owner)
+        owner_only = Q(read=PermissionLevel.OWNER_ONLY.value) & owner
+        return self.filter(public | members | editors_only | owner_only)
+
+    def search(self, text: str) -> "PageQuerySet":
+        query = parse_query(text)
+        if query is None:
+            return self.none()
+        return (
+            self.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query, cover_density=True), headline=headline(query))
+            .order_by("-rank", "-pk")
+        )
+
+    def autocomplete(self, text: str) -> "PageQuerySet":
+        text = text.strip()
+        if not text:
+            return self.none()
+        if trigram_available():
+            return (
+                self.filter(title__trigram_word_similar=text)
+                .annotate(similarity=TrigramWordSimilarity(text, "title"))
+                .order_by("-similarity", "title")
+            )
+        prefix = Case(When(title__istartswith=text, then=Value(0)), default=Value(1))
+        return self.filter(title__icontains=text).order_by(prefix, Length("title"), "title")
+
+    def under(self, path: str, include_self: bool = False) -> "PageQuerySet":
+        path = path.strip("/")
+        below = Q(slug__startswith=f"{path}/")
+        return self.filter(below | Q(slug=path) if include_self else below)
+
+    def above(self, path: str, include_self: bool = False) -> "PageQuerySet":
+        parts = path.strip("/").split("/")
+        prefixes = ["/".join(parts[:end]) for end in range(1, len(parts) + include_self)]
+        return self.filter(slug__in=prefixes).order_by(Length("slug"))
+
+    def ancestors(self, of: "Page", include_self: bool = False) -> "PageQuerySet":
+        table = Page._meta.db_table
+        ancestors = RawSQL(
+            f"WITH RECURSIVE ancestors(id, parent_id) AS ("
+            f"SELECT id, parent_id FROM {table} WHERE id = %s "
+            f"UNION SELECT page.id, page.parent_id FROM {table} page JOIN ancestors ON page.id = ancestors.parent_id"
+            f") SELECT id FROM ancestors",
+            (of.pk,),
+        )
+        return self.tree_subset(ancestors, of, include_self).order_by("tree_depth")
+
+    def descendants(self, of: "Page", include_self: bool = False) -> "PageQuerySet":
+        table = Page._meta.db_table
+        descendants = RawSQL(
+            f"WITH RECURSIVE descendants(id) AS ("
+            f"SELECT id FROM {table} WHERE id = %s "
+            f"UNION SELECT page.id FROM {table} page JOIN descendants ON page.parent_id = descendants.id"
+            f") SELECT id FROM descendants",
+            (of.pk,),
+        )
+        return self.tree_subset(descendants, of, include_self).order_by(
+            Func(F("slug"), Value("/"), function="string_to_array")
+        )
+
+    def tree_subset(self, ids: RawSQL, of: "Page", include_self: bool) -> "PageQuerySet":
+        queryset = self.filter(pk__in=ids) if include_self else self.filter(pk__in=ids).exclude(pk=of.pk)
+        return queryset.annotate(tree_depth=Length("slug") - Length(Replace("slug", Value("/"), Value(""))))
+
+
+class PageManager(PolymorphicManager.from_queryset(PageQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().defer("search_vector")
+
+
+class Page(PolymorphicModel, TreeNode):
     title = models.CharField(max_length=255)
     slug = models.SlugField(max_length=1024, unique=True)
     body = models.TextField()
-    parent = models.ForeignKey("Page", related_name="children", on_delete=models.SET_NULL, null=True, blank=True)
+    parent = TreeNodeForeignKey("Page", related_name="children", on_delete=models.SET_NULL, null=True, blank=True)
     read = models.IntegerField(default=PermissionLevel.PUBLIC, choices=PermissionLevel.get_choices())
     write = models.IntegerField(default=PermissionLevel.PUBLIC, choices=PermissionLevel.get_choices())
-    history = HistoricalRecords(inherit=True)
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", config="simple", weight="A")
+        + SearchVector(Replace("slug", Value("/"), Value(" ")), config="simple", weight="A")
+        + SearchVector("body", config="english", weight="B"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    history = HistoricalRecords(
+        inherit=True,
+        excluded_fields=["search_vector"],
+        bases=[DeltaRevision],
+        history_manager=RevisionManager,
+        historical_queryset=RevisionQuerySet,
+    )
+
+    objects = PageManager()
+
+    class Meta(PolymorphicModel.Meta):
+        indexes = [
+            GinIndex(fields=["search_vector"], name="page_search_vector"),
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="page_title_trigram"),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "title" in instance.__dict__ and "slug" in instance.__dict__:
+            instance.loaded_paths = (instance.title, instance.slug)
+        if "parent_id" in instance.__dict__:
+            instance.loaded_parent_id = instance.parent_id
+        return instance
+
     @property
     def editors(self):
-        ids = self.history.exclude(history_user=None).values_list("history_user", flat=True).distinct()
-        return User.objects.filter(id__in=ids)
+        return User.objects.filter(page_edits__page=self).order_by("page_edits__first_edit")
 
     @property
     def unique_slug_element(self) -> str:
         parts = [part for part in self.slug.split("/")]
         return parts[-1]
 
+    @property
+    def depth(self) -> int:
+        return self.slug.count("/")
+
+    def ancestors(self, include_self: bool = False) -> PageQuerySet:
+        return Page.objects.ancestors(self, include_self=include_self)
+
+    def descendants(self, include_self: bool = False) -> PageQuerySet:
+        return Page.objects.descendants(self, include_self=include_self)
+
     def set_slug(self, slug: str or None = None):
         slug = slugify(self.title) if slug is None else slugify(self.unique_slug_element)
         if self.parent is not None:
+            moved = self.pk is not None and self.parent_id != getattr(self, "loaded_parent_id", self.parent_id)
+            if moved and self.pk in self.parent_path():
+                raise ValueError("Cannot move a page beneath itself.")
             slug = f"{self.parent.slug}/{slug}"
 
         self.slug = slug
 
+    def parent_path(self) -> list[int]:
+        return list(
+            Page.objects.non_polymorphic().above(self.parent.slug, include_self=True).values_list("pk", flat=True)
+        )
+
     def save(self, *args, **kwargs):
         self.set_slug(self.slug)
         if Page.objects.filter(slug=self.slug).exclude(pk=self.pk).exists():
             raise ValueError("Slug must be unique.")
         super().save(*args, **kwargs)
+        if self.parent_id != getattr(self, "loaded_parent_id", self.parent_id):
+            self.clear_tree_fields()
+        self.loaded_parent_id = self.parent_id
+
+    def clear_tree_fields(self) -> None:
+        for field in ("tree_depth", "tree_path", "tree_ordering"):
+            self.__dict__.pop(field, None)
+
+    @property
+    def permission_state(self) -> tuple:
+        return ()
 
     def evaluate_permission(self, permission: PermissionLevel, user: User = None) -> bool:
+        cache = get_permission_cache()
+        if cache is None or self.pk is None:
+            return self.check_permission(permission, user)
+
+        key = (self.pk, self.permission_state, getattr(user, "pk", None), PermissionLevel(permission).value)
+        decision = cache.get(key)
+        if decision is None:
+            decision = cache.set(key, self.check_permission(permission, user))
+        return decision
+
+    def check_permission(self, permission: PermissionLevel, user: User = None) -> bool:
         if user is not None and user.is_staff:
             return True
 
@@ -63,10 +231,17 @@ class Page(PolymorphicModel):
             case PermissionLevel.MEMBERS_ONLY:
                 return user is not None and not user.is_anonymous
             case PermissionLevel.EDITORS_ONLY:
-                return user in self.editors
+                return self.is_editor(user)
             case _:
                 return False
 
+    def is_editor(self, user: User = None) -> bool:
+        if user is None or user.pk is None:
+            return False
+        if "page_editors" in getattr(self, "_prefetched_objects_cache", {}):
+            return any(edit.user_id == user.pk for edit in self.page_editors.all())
+        return PageEditor.objects.filter(page=self, user=user).exists()
+
     def can_read(self, user: User = None) -> bool:
         return self.evaluate_permission(PermissionLevel(self.read), user)
 
@@ -90,12 +265,25 @@ class Page(PolymorphicModel):
         read: PermissionLevel = None,
         write: PermissionLevel = None,
     ):
+        if self.apply_changes(editor, title, body, slug, parent, read, write):
+            self.stamp_revision(editor, message)
+
+    def apply_changes(
+        self,
+        editor: User,
+        title: str = None,
+        body: str = None,
+        slug: str = None,
+        parent: "Page" = None,
+        read: PermissionLevel = None,
+        write: PermissionLevel = None,
+    ) -> bool:
         read = PermissionLevel(self.write) if read is None else read
         write = PermissionLevel(self.write) if write is None else write
         will_read = self.evaluate_permission(read, editor) or read == PermissionLevel.EDITORS_ONLY
 
         if not self.can_write(write, editor) or not will_read:
-            return
+            return False
 
         self.title = self.title if title is None else title
         self.body = self.body if body is None else body
@@ -103,36 +291,124 @@ class Page(PolymorphicModel):
         self.parent = self.parent if parent is None else parent
         self.read = read.value
         self.write = write.value
-        self.stamp_revision(editor, message)
+        return True
 
     def reparent(self, editor: User, new_parent: "Page" or None = None) -> None:
-        message = f"Reparenting to {'root' if new_parent is None else new_parent.slug}"
-
-        self.parent = None
-        self.update(
-            editor=editor,
-            message=message,
-            parent=new_parent,
-        )
+        pages = {page.pk: page for page in self.descendants(include_self=True).prefetch_related("page_editors")}
+        if new_parent is not None and new_parent.pk in pages:
+            raise ValueError("Cannot move a page beneath itself.")
+
+        pages[self.pk] = self
+
+        moved, messages, paths = [], [], set()
+        for page in pages.values():
+            parent = new_parent if page is self else pages[page.parent_id]
+            before = (page.title, page.slug)
+            page.parent = None
+            if page.apply_changes(editor, parent=parent):
+                page.set_slug(page.slug)
+                moved.append(page)
+                messages.append(f"Reparenting to {'root' if parent is None else parent.slug}")
+                paths |= {before, (page.title, page.slug)}
+
+        slugs = [page.slug for page in pages.values()]
+        if len(set(slugs)) < len(slugs) or Page.objects.filter(slug__in=slugs).exclude(pk__in=pages.keys()).exists():
+            raise ValueError("Slug must be unique.")
 
-        for child in self.children.all():
-            child.reparent(editor, new_parent=self)
+        with transaction.atomic():
+            Page.objects.bulk_update(moved, ["slug", "parent", "read", "write"], batch_size=500)
+            Page.stamp_revisions(moved, editor, messages)
+        invalidate_page_paths(paths)
 
-    def destroy(self, editor: User) -> None:
-        children = list(self.children.all())
+    def destroy(self, editor: User, progress: Callable[[int, int], None] = None) -> int:
         new_parent = self.parent
+        old_prefix = f"{self.slug}/"
+        new_prefix = "" if new_parent is None else f"{new_parent.slug}/"
+        descendants = {page.pk: page for page in self.descendants()}
+
+        changed, paths = [], {(self.title, self.slug)}
+        for page in descendants.values():
+            before = (page.title, page.slug)
+            if page.slug.startswith(old_prefix):
+                page.slug = new_prefix + page.slug[len(old_prefix) :]
+            promoted = page.parent_id == self.pk
+            if promoted:
+                page.parent = new_parent
+            if promoted or page.slug != before[1]:
+                changed.append(page)
+                paths |= {before, (page.title, page.slug)}
+
+        slugs = [page.slug for page in descendants.values()]
+        others = Page.objects.filter(slug__in=slugs).exclude(pk__in=[self.pk, *descendants])
+        if len(set(slugs)) < len(slugs) or others.exists():
+            raise ValueError("Slug must be unique.")
 
-        super().delete()
-
-        for child in children:
-            child.reparent(editor, new_parent=new_parent)
+        # A rewritten slug can equal a deeper page's old slug, so shallower pages are rewritten first
+        changed.sort(key=lambda page: page.slug.count("/"))
+        messages = []
+        for page in changed:
+            parent = descendants.get(page.parent_id, new_parent)
+            messages.append(f"Reparenting to {'root' if parent is None else parent.slug}")
+
+        pk = self.pk
+        batch_size = settings.WIKI_DESTROY_BATCH_SIZE
+        with transaction.atomic():
+            Page.objects.filter(parent_id=pk).update(parent=new_parent)
+            super().delete()
+            for start in range(0, len(changed), batch_size):
+                batch = changed[start : start + batch_size]
+                by_depth = defaultdict(list)
+                for page in batch:
+                    by_depth[page.slug.count("/")].append(page.pk)
+                for depth in sorted(by_depth):
+                    Page.objects.filter(pk__in=by_depth[depth], slug__startswith=old_prefix).update(
+                        slug=Concat(Value(new_prefix), Substr("slug", len(old_prefix) + 1))
+                    )
+                Page.stamp_revisions(batch, editor, messages[start : start + batch_size])
+                if progress is not None:
+                    progress(start + len(batch), len(changed))
+
+        self.invalidate_permissions(pk)
+        invalidate_page_paths(paths)
+        return len(changed)
 
     def stamp_revision(self, editor: User, message: str):
-        self.save()
-        latest = self.history.first()
-        latest.history_user = editor
-        latest.save()
-        update_change_reason(self, message)
+        self._history_user = editor
+        self._history_date = timezone.now()
+        self._change_reason = message
+        try:
+            with transaction.atomic(savepoint=False):
+                self.save()
+                PageEditor.record(self, editor, self._history_date)
+        finally:
+            del self._history_user, self._history_date, self._change_reason
+        self.invalidate_permissions(self.pk)
+
+    @staticmethod
+    def stamp_revisions(pages: list["Page"], editor: User, messages: list[str]) -> None:
+        timestamp = timezone.now()
+        by_model = defaultdict(list)
+        for page, message in zip(pages, messages):
+            page._change_reason = message
+            page._history_user = editor
+            by_model[type(page)].append(page)
+
+        for model, instances in by_model.items():
+            model.history.bulk_history_create(instances, update=True, default_date=timestamp)
+        PageEditor.record_many(pages, editor, timestamp)
+
+        for page in pages:
+            del page._change_reason, page._history_user
+            page.loaded_paths = (page.title, page.slug)
+            page.loaded_parent_id = page.parent_id
+            page.clear_tree_fields()
+        Page.invalidate_permissions(*(page.pk for page in pages))
+
+    @staticmethod
+    def invalidate_permissions(*pks: int) -> None:
+        cache = get_permission_cache()
+        if cache is not None:
+            cache.invalidate_many(pks)
 
     @classmethod
     def create(
@@ -148,16 +424,60 @@ class Page(PolymorphicModel):
     ):
         slug = slugify(title) if slug is None else slug
         page = cls(title=title, body=body, slug=slug, parent=parent, read=read.value, write=write.value)
-        page.save()
         page.stamp_revision(editor, message)
         return page
 
+    @classmethod
+    def get_concrete_models(cls) -> list:
+        models = [cls]
+        for subclass in cls.__subclasses__():
+            models += subclass.get_concrete_models()
+        return models
+
+
+class PageEditor(models.Model):
+    page = models.ForeignKey(Page, related_name="page_editors", on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name="page_edits", on_delete=models.CASCADE)
+    first_edit = models.DateTimeField()
+    last_edit = models.DateTimeField()
+    edit_count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["page", "user"], name="unique_page_editor")]
+        indexes = [models.Index(fields=["user", "page"], name="page_editor_user_page")]
+
+    def __str__(self):
+        return f"{self.user} on {self.page}"
+
+    @classmethod
+    def record(cls, page: Page, user: User, timestamp) -> None:
+        cls.record_many([page], user, timestamp)
+
+    @classmethod
+    def record_many(cls, pages: list[Page], user: User, timestamp) -> None:
+        if user is None or user.pk is None or not pages:
+            return
+
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (page_id, user_id, first_edit, last_edit, edit_count) "
+                f"SELECT page_id, %s, %s, %s, 1 FROM unnest(%s::bigint[]) AS page_id "
+                f"ON CONFLICT (page_id, user_id) DO UPDATE "
+                f"SET last_edit = EXCLUDED.last_edit, edit_count = {table}.edit_count + 1",
+                [user.pk, timestamp, timestamp, sorted({page.pk for page in pages})],
+            )
+
 
 class OwnedPage(Page):
     owner = models.ForeignKey(User, related_name="pages", on_delete=models.SET_NULL, null=True, blank=True)
 
-    def evaluate_permission(self, permission: PermissionLevel, user: User = None) -> bool:
-        is_owner = self.owner == user
+    @property
+    def permission_state(self) -> tuple:
+        return (self.owner_id,)
+
+    def check_permission(self, permission: PermissionLevel, user: User = None) -> bool:
+        is_owner = user is not None and self.owner_id is not None and self.owner_id == user.pk
         is_admin = user is not None and user.is_staff
 
         if permission == PermissionLevel.OWNER_ONLY:
@@ -165,7 +485,7 @@ class OwnedPage(Page):
         elif permission == PermissionLevel.EDITORS_ONLY and is_owner:
             return True
         else:
-            return super().evaluate_permission(permission, user)
+            return super().check_permission(permission, user)
 
     @classmethod
     def create(
@@ -182,7 +502,6 @@ class OwnedPage(Page):
     ):
         slug = slugify(title) if slug is None else slug
         page = cls(title=title, body=body, slug=slug, parent=parent, owner=owner, read=read.value, write=write.value)
-        page.save()
         page.stamp_revision(editor, message)
         return page
 
@@ -192,6 +511,10 @@ class Character(OwnedPage):
     def player(self):
         return self.owner
 
+    def shared_secrets(self, *others: "Character") -> models.QuerySet:
+        shared = KnowledgeCache().shared([self.pk, *(other.pk for other in others)])
+        return Secret.objects.filter(pk__in=shared)
+
 
 class Template(Page):
     pass
@@ -228,7 +551,6 @@ class File(Page):
         page = cls(
             title=title, body=body, slug=slug, parent=parent, attachment=attachment, read=read.value, write=write.value
         )
-        page.save()
         page.stamp_revision(editor, message)
         return page
 
@@ -292,7 +614,7 @@ class Secret(models.Model):
         return self.key
 
     def knows(self, character: Character) -> bool:
-        return self.known_to.filter(pk=character.pk).exists()
+        return self.pk in KnowledgeCache().get(character.pk)
 
     @staticmethod
     def evaluate(expression: str, character: Character, secrets: Any = None) -> bool:
@@ -300,40 +622,65 @@ class Secret(models.Model):
         return SecretEvaluator(character, secrets).eval(expression)
 
 
-class SecretEvaluator(ast.NodeVisitor):
+class SecretEvaluator:
     def __init__(self, character: Character, secrets: Any = None):
         secrets = Secret.objects.all() if secrets is None else secrets
         self.character = character
-        self.secrets = {
-            SecretEvaluator.variablize(secret.key): (secret.key, secret.knows(character)) for secret in secrets
-        }
+        known = frozenset() if character is None else KnowledgeCache().get(character.pk)
+        self.knowledge = {secret.key: secret.pk in known for secret in secrets}
+        self.variables = {SecretEvaluator.variablize(key): key for key in self.knowledge}
 
     def eval(self, expression: str) -> bool:
-        for variable, (key, _) in self.secrets.items():
-            expression = expression.replace(f"[{key}]", variable)
-        tree = ast.parse(expression, mode="eval")
-        return self.visit(tree.body)
-
-    def visit_BoolOp(self, node):
-        fn = all if isinstance(node.op, ast.And) else any
-        return fn(self.visit(value) for value in node.values)
+        return SecretEvaluator.compile(expression)(self.lookup)
 
-    def visit_UnaryOp(self, node):
-        if isinstance(node.op, ast.Not):
-            return not self.visit(node.operand)
+    def lookup(self, key: str) -> bool:
+        key = key if key in self.knowledge else self.variables.get(key, key)
+        if key not in self.knowledge:
+            raise Secret.DoesNotExist(f"Unknown secret key: {key}")
+        return self.knowledge[key]
 
-    def visit_Name(self, node):
-        variable = node.id
-        if variable in self.secrets:
-            return self.secrets[variable][1]
-        raise ValueError(f"Unknown secret key: {self.secrets[variable][0]}")
+    @staticmethod
+    @lru_cache(maxsize=settings.WIKI_SECRET_EXPRESSION_CACHE_SIZE)
+    def compile(expression: str) -> Callable[[Callable[[str], bool]], bool]:
+        keys = {}
 
-    def visit_Expr(self, node):
-        return self.visit(node.value)
+        def placeholder(match) -> str:
+            variable = f"_secret_{len(keys)}"
+            keys[variable] = match.group(1)
+            return variable
 
-    def visit_Module(self, node):
-        return all(self.visit(body) for body in node.body)
+        try:
+            tree = ast.parse(re.sub(r"\[([^\[\]]+)\]", placeholder, expression), mode="eval")
+        except SyntaxError as error:
+            raise ValueError(f"Invalid secret expression: {expression}") from error
+        return SecretExpressionCompiler(keys).visit(tree)
 
     @staticmethod
     def variablize(key: str) -> str:
         return re.sub(r"\W|^(?=\d)", "_", key)
+
+
+class SecretExpressionCompiler(ast.NodeVisitor):
+    def __init__(self, keys: dict[str, str]):
+        self.keys = keys
+
+    def visit_Expression(self, node):
+        return self.visit(node.body)
+
+    def visit_BoolOp(self, node):
+        fn = all if isinstance(node.op, ast.And) else any
+        operands = tuple(self.visit(value) for value in node.values)
+        return lambda lookup: fn(operand(lookup) for operand in operands)
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, ast.Not):
+            return self.generic_visit(node)
+        operand = self.visit(node.operand)
+        return lambda lookup: not operand(lookup)
+
+    def visit_Name(self, node):
+        key = self.keys.get(node.id, node.id)
+        return lambda lookup: lookup(key)
+
+    def generic_visit(self, node):
+        raise ValueError(f"Unsupported secret expression: {ast.unparse(node)}")
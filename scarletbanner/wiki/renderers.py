@@ -1,46 +1,226 @@
+import html
+import logging
 import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Iterable
 from urllib.parse import quote_plus, urlencode
 
 import bleach
 import markdown
+from bleach import html5lib_shim
 from bleach.css_sanitizer import CSSSanitizer
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString
+from django.conf import settings
 from django.db.models import Q
 from django.urls import reverse
 
-from scarletbanner.wiki.models import Character, Page, Secret, Template
+from scarletbanner.wiki.caches import KnowledgeCache, RenderCache, link_cache
+from scarletbanner.wiki.models import Character, Page, Secret, SecretEvaluator, Template
+
+LINK_PATTERN = re.compile(r"\[\[(.*?)\]\]")
+PLACEHOLDER_PATTERN = re.compile(r"{{\s*([^{}\s]+)\s*}}")
+TEMPLATE_REFERENCE_PATTERN = re.compile(r"<template\b[^>]*?\bname\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledTemplate:
+    def __init__(self, body: str):
+        self.parts = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(body):
+            self.parts.append((body[position : match.start()], None))
+            self.parts.append((match.group(0), match.group(1)))
+            position = match.end()
+        self.parts.append((body[position:], None))
+        self.placeholders = frozenset(name for _, name in self.parts if name is not None)
+        self.references = frozenset(TEMPLATE_REFERENCE_PATTERN.findall(body))
+
+    def render(self, params: dict[str, str]) -> str:
+        return "".join(text if name is None else params.get(name, text) for text, name in self.parts).strip()
+
+    @staticmethod
+    @lru_cache(maxsize=settings.WIKI_TEMPLATE_CACHE_SIZE)
+    def compile(body: str) -> "CompiledTemplate":
+        return CompiledTemplate(body)
+
+
+class RenderPipeline:
+    def __init__(self, character: Character = None, editable: bool = False, template_page: bool = False):
+        self.character = character
+        self.editable = editable
+        self.template_page = template_page
+        self.dependencies = {}
+        self.timings = {}
+        self.sid = 0
+        self.evaluator = None
+        self.templates = {}
+        self.template_output = 0
+
+    def render(self, original: str) -> str:
+        soup = self.run("parse", BeautifulSoup, original, "html.parser")
+        if self.template_page:
+            self.run("template_page", self.render_template_page, soup)
+        self.run("templates", self.expand_templates, soup)
+        self.run("secrets", self.filter_secrets, soup)
+        self.run("links", self.resolve_links, soup)
+        html = self.run("serialize", self.serialize, soup)
+        return self.run("markdown", render_markdown, html)
+
+    def run(self, stage: str, fn: Callable, *args) -> Any:
+        start = time.perf_counter()
+        result = fn(*args)
+        self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def serialize(soup: BeautifulSoup) -> str:
+        return str(soup).strip()
 
+    @staticmethod
+    def render_template_page(soup: BeautifulSoup) -> None:
+        for include_only in soup.find_all("includeonly"):
+            include_only.decompose()
 
-def render_secrets(original: str, character: Character, editable: bool = False) -> str:
-    soup = BeautifulSoup(original, "html.parser")
-    all_secrets = Secret.objects.all()
-    sid = 0
+        for no_include in soup.find_all("noinclude"):
+            no_include.unwrap()
+
+    def depend(self, dependencies: Iterable[str]) -> None:
+        # Versions are read before the queries they guard, so a change committed mid-render invalidates the entry
+        missing = set(dependencies) - self.dependencies.keys()
+        if missing:
+            self.dependencies.update(RenderCache().versions(missing))
+
+    def load_templates(self, names: set[str]) -> None:
+        names = names - self.templates.keys()
+        for _ in range(settings.WIKI_TEMPLATE_MAX_DEPTH):
+            if not names:
+                break
+
+            self.depend(RenderCache.dependency("title", name) for name in names)
+            bodies = {}
+            for title, body in Template.objects.filter(title__in=names).values_list("title", "body"):
+                bodies.setdefault(title, body)
+
+            references = set()
+            for name in names:
+                template = CompiledTemplate.compile(bodies[name]) if name in bodies else None
+                self.templates[name] = template
+                if template is not None:
+                    references |= template.references
+            names = references - self.templates.keys()
+
+    def expand_templates(self, soup: BeautifulSoup, stack: tuple[str, ...] = ()) -> None:
+        for include_only in soup.find_all("includeonly"):
+            include_only.unwrap()
+
+        for no_include in soup.find_all("noinclude"):
+            no_include.decompose()
+
+        instances = [
+            instance
+            for instance in soup.find_all("template", attrs={"name": True})
+            if instance.find_parent("template", attrs={"name": True}) is None
+        ]
+        self.load_templates({instance["name"] for instance in instances})
+        for instance in instances:
+            name = instance["name"]
+            if name not in self.templates:
+                self.load_templates({name})
+            template = self.templates[name]
+
+            if template is None:
+                instance.decompose()
+                continue
+
+            if name in stack:
+                logger.warning("Template loop detected: %s", " -> ".join(stack + (name,)))
+                instance.decompose()
+                continue
+
+            if len(stack) >= settings.WIKI_TEMPLATE_MAX_DEPTH:
+                logger.warning("Template depth limit reached: %s", " -> ".join(stack + (name,)))
+                instance.decompose()
+                continue
+
+            params = {attr: instance.get(attr) for attr in instance.attrs if attr != "name"}
+            params["body"] = "".join(str(child) for child in instance.contents).strip()
+            body = template.render(params)
+
+            self.template_output += len(body)
+            if self.template_output > settings.WIKI_TEMPLATE_MAX_OUTPUT:
+                logger.warning("Template output limit reached while expanding %s", name)
+                instance.decompose()
+                continue
+
+            fragment = BeautifulSoup(body, "html.parser")
+            self.expand_templates(fragment, stack + (name,))
+            contents = list(fragment.contents)
+            if contents:
+                instance.replace_with(*contents)
+            else:
+                instance.decompose()
+
+    def filter_secrets(self, soup: BeautifulSoup) -> None:
+        if self.evaluator is None:
+            self.evaluator = SecretEvaluator(self.character)
+        self.process_secrets(soup, soup)
+
+    def process_secrets(self, soup: BeautifulSoup, parent) -> None:
+        for tag in parent.find_all(recursive=False):
+            if tag.name != "secret":
+                self.process_secrets(soup, tag)
+                continue
 
-    def process_secrets(parent):
-        nonlocal sid, all_secrets
-        secrets = parent.find_all("secret", recursive=False)
-        for tag in secrets:
             expression = tag.get("show")
-            sid += 1
-            if expression:
-                try:
-                    if Secret.evaluate(expression, character, all_secrets):
-                        process_secrets(tag)
-                        if editable:
-                            tag["sid"] = sid
-                        else:
-                            tag.unwrap()
-                    else:
-                        if editable:
-                            new_tag = soup.new_tag("secret", sid=str(sid))
-                            tag.replace_with(new_tag)
-                        else:
-                            tag.decompose()
-                except Secret.DoesNotExist:
-                    tag.decompose()
-
-    process_secrets(soup)
-    return re.sub(r" {2,}", " ", str(soup).strip())
+            self.sid += 1
+            if not expression:
+                continue
+
+            try:
+                known = self.evaluator.eval(expression)
+            except (Secret.DoesNotExist, ValueError):
+                tag.decompose()
+                continue
+
+            if known:
+                self.process_secrets(soup, tag)
+                if self.editable:
+                    tag["sid"] = self.sid
+                else:
+                    tag.unwrap()
+            elif self.editable:
+                tag.replace_with(soup.new_tag("secret", sid=str(self.sid)))
+            else:
+                tag.decompose()
+
+    def resolve_links(self, soup: BeautifulSoup) -> None:
+        strings = [string for string in soup.find_all(string=LINK_PATTERN) if type(string) is NavigableString]
+        contents = [content for string in strings for content in LINK_PATTERN.findall(string)]
+        self.depend(dependency for key, _, _ in map(parse_link, contents) for dependency in link_dependencies(key))
+        links = resolve_links(contents)
+
+        for string in strings:
+            pieces = []
+            position = 0
+            for match in LINK_PATTERN.finditer(string):
+                pieces.append(NavigableString(string[position : match.start()]))
+                url, text, exists = links[match.group(1)]
+                attrs = {"href": url} if exists else {"href": url, "class": "new"}
+                link = soup.new_tag("a", attrs=attrs)
+                link.string = text
+                pieces.append(link)
+                position = match.end()
+            pieces.append(NavigableString(string[position:]))
+            string.replace_with(*[piece for piece in pieces if piece != ""])
+
+
+def render_secrets(original: str, character: Character, editable: bool = False) -> str:
+    soup = BeautifulSoup(original, "html.parser")
+    RenderPipeline(character, editable=editable).filter_secrets(soup)
+    return re.sub(r" {2,}", " ", RenderPipeline.serialize(soup))
 
 
 def reconcile_secrets(original: str, edited: str) -> str:
@@ -67,127 +247,216 @@ def reconcile_secrets(original: str, edited: str) -> str:
     return str(edited_soup).strip()
 
 
-def render_templates(original: str) -> str:
-    def process_templates(content: str) -> str:
-        soup = BeautifulSoup(content, "html.parser")
-
-        for include_only in soup.find_all("includeonly"):
-            include_only.unwrap()
-
-        for no_include in soup.find_all("noinclude"):
-            no_include.replace_with("")
-
-        for instance in soup.find_all("template"):
-            name = instance.get("name")
-            if name:
-                params = {attr: instance.get(attr) for attr in instance.attrs if attr != "name"}
-                params["body"] = "".join(str(child) for child in instance.contents).strip()
-                try:
-                    page = Template.objects.get(title=name)
-                    body = page.body
-
-                    for key, value in params.items():
-                        placeholder = re.compile(rf"{{{{\s*{key}\s*}}}}")
-                        body = placeholder.sub(value, body)
-
-                    body = process_templates(body)
-                    instance.replace_with(body)
-                except Template.DoesNotExist:
-                    instance.replace_with("")
-
-        return str(soup).strip()
-
-    return process_templates(original)
+def render_templates(original: str, dependencies: set[str] | None = None) -> str:
+    soup = BeautifulSoup(original, "html.parser")
+    pipeline = RenderPipeline()
+    pipeline.expand_templates(soup)
+    if dependencies is not None:
+        dependencies.update(pipeline.dependencies)
+    return RenderPipeline.serialize(soup)
 
 
 def render_template_pages(original: str) -> str:
     soup = BeautifulSoup(original, "html.parser")
-
-    for include_only in soup.find_all("includeonly"):
-        include_only.replace_with("")
-
-    for no_include in soup.find_all("noinclude"):
-        no_include.unwrap()
-
-    return str(soup).strip()
-
-
-def render_links(original: str) -> str:
-    def replace_link(match) -> str:
-        content = match.group(1).strip()
-
-        if "|" in content:
-            key, text = map(str.strip, content.split("|", 1))
+    RenderPipeline.render_template_page(soup)
+    return RenderPipeline.serialize(soup)
+
+
+def parse_link(content: str) -> tuple[str, str, str]:
+    content = content.strip()
+
+    if "|" in content:
+        key, text = map(str.strip, content.split("|", 1))
+    else:
+        key = text = content
+
+    slug_prefix = "/wiki/"
+    slug = key[len(slug_prefix) :].rstrip("/") if key.startswith(slug_prefix) else key
+    return key, text, slug
+
+
+def link_dependencies(key: str) -> set[str]:
+    _, _, slug = parse_link(key)
+    return {RenderCache.dependency("title", key), RenderCache.dependency("slug", slug)}
+
+
+def resolve_links(contents: list[str]) -> dict[str, tuple[str, str, bool]]:
+    links = {content: parse_link(content) for content in contents}
+    targets = {("title", key) for key, _, _ in links.values()} | {("slug", slug) for _, _, slug in links.values()}
+
+    generation = link_cache.sync()
+    urls = link_cache.get_many(targets)
+    missing = targets - urls.keys()
+    if missing:
+        titles = [value for kind, value in missing if kind == "title"]
+        slugs = [value for kind, value in missing if kind == "slug"]
+        resolved = dict.fromkeys(missing)
+        pages = Page.objects.filter(Q(title__in=titles) | Q(slug__in=slugs)).order_by("pk")
+        for title, slug in pages.values_list("title", "slug"):
+            url = reverse("wiki:page", kwargs={"slug": slug})
+            for target in (("title", title), ("slug", slug)):
+                if target in missing and resolved[target] is None:
+                    resolved[target] = url
+        link_cache.set_many(resolved, generation)
+        urls.update(resolved)
+
+    resolved = {}
+    for content, (key, text, slug) in links.items():
+        url = urls[("title", key)] or urls[("slug", slug)]
+        if url is None:
+            querystring = urlencode({"title": key}, quote_via=quote_plus)
+            resolved[content] = (reverse("wiki:create") + "?" + querystring, text, False)
         else:
-            key = text = content.strip()
+            resolved[content] = (url, text, True)
+    return resolved
 
-        slug_prefix = "/wiki/"
-        slug = key[len(slug_prefix) :].rstrip("/") if key.startswith(slug_prefix) else key
-        page = Page.objects.filter(Q(title=key) | Q(slug=slug)).first()
 
-        if page:
-            url = reverse("wiki:page", kwargs={"slug": page.slug})
-            return f'<a href="{url}">{text}</a>'
-        else:
-            payload = {"title": key}
-            querystring = urlencode(payload, quote_via=quote_plus)
-            url = reverse("wiki:create") + "?" + querystring
-            return f'<a href="{url}" class="new">{text}</a>'
+def render_links(original: str, dependencies: set[str] | None = None) -> str:
+    links = resolve_links(LINK_PATTERN.findall(original))
+    if dependencies is not None:
+        for key, _, _ in map(parse_link, links):
+            dependencies |= link_dependencies(key)
 
-    regex = re.compile(r"\[\[(.*?)\]\]")
-    return regex.sub(replace_link, original)
+    def replace_link(match) -> str:
+        url, text, exists = links[match.group(1)]
+        return f'<a href="{url}">{text}</a>' if exists else f'<a href="{url}" class="new">{text}</a>'
+
+    return LINK_PATTERN.sub(replace_link, original)
+
+
+class EmptyElementFilter(html5lib_shim.Filter):
+    preserve_whitespace_tags = frozenset(["pre", "textarea"])
+
+    def __iter__(self):
+        root = []
+        stack = [(root, False)]
+        text = []
+        preserve_whitespace = 0
+
+        for token in [*super().__iter__(), None]:
+            kind = None if token is None else token["type"]
+            if kind in ("Characters", "SpaceCharacters"):
+                text.append(token["data"])
+                continue
+            if kind == "Entity":
+                text.append(html.unescape(f"&{token['name']};"))
+                continue
+
+            if text:
+                data = "".join(text)
+                text = []
+                if not preserve_whitespace and not data.strip(" \t\n\r\f"):
+                    data = "\n" if "\n" in data else " "
+                stack[-1][0].append({"type": "Characters", "data": data})
+                if data.strip():
+                    stack[-1] = (stack[-1][0], True)
+
+            if kind == "StartTag":
+                stack.append(([token], False))
+                preserve_whitespace += token["name"] in self.preserve_whitespace_tags
+            elif kind == "EndTag" and len(stack) > 1:
+                preserve_whitespace -= token["name"] in self.preserve_whitespace_tags
+                buffered, has_text = stack.pop()
+                if has_text:
+                    buffered.append(token)
+                    stack[-1][0].append(buffered)
+                    stack[-1] = (stack[-1][0], True)
+            elif kind not in ("EmptyTag", None):
+                stack[-1][0].append(token)
+
+            if len(stack) == 1:
+                yield from self.flatten(root)
+                root.clear()
+
+    @staticmethod
+    def flatten(tokens: list):
+        pending = [iter(tokens)]
+        while pending:
+            for token in pending[-1]:
+                if isinstance(token, list):
+                    pending.append(iter(token))
+                    break
+                yield token
+            else:
+                pending.pop()
+
+
+class MarkdownRenderer:
+    extensions = ["extra", "tables", "fenced_code", "sane_lists"]
+    content_tags = frozenset(
+        [
+            "p",
+            "div",
+            "span",
+            "h1",
+            "h2",
+            "h3",
+            "h4",
+            "h5",
+            "h6",
+            "table",
+            "thead",
+            "tbody",
+            "tfoot",
+            "th",
+            "td",
+            "tr",
+            "article",
+            "aside",
+            "section",
+            "figure",
+            "figcaption",
+            "header",
+            "footer",
+            "details",
+            "summary",
+            "nav",
+        ]
+    )
+    local = threading.local()
+
+    def __init__(self):
+        attributes = bleach.sanitizer.ALLOWED_ATTRIBUTES.copy()
+        attributes.update(
+            {
+                "*": ["class", "style", "id"],
+                "a": ["href"],
+                "img": ["src", "alt"],
+            }
+        )
+        self.markdown = markdown.Markdown(extensions=self.extensions)
+        self.cleaner = bleach.Cleaner(
+            tags=bleach.sanitizer.ALLOWED_TAGS | self.content_tags | {"img"},
+            attributes=attributes,
+            css_sanitizer=CSSSanitizer(bleach.css_sanitizer.ALLOWED_CSS_PROPERTIES),
+            strip=True,
+            filters=[EmptyElementFilter],
+        )
+
+    def render(self, original: str) -> str:
+        html = self.markdown.reset().convert(original)
+        return self.cleaner.clean(html).strip()
+
+    @classmethod
+    def get(cls) -> "MarkdownRenderer":
+        renderer = getattr(cls.local, "renderer", None)
+        if renderer is None:
+            renderer = cls.local.renderer = cls()
+        return renderer
 
 
 def render_markdown(original: str) -> str:
-    allowed_content_tags = [
-        "p",
-        "div",
-        "span",
-        "h1",
-        "h2",
-        "h3",
-        "h4",
-        "h5",
-        "h6",
-        "table",
-        "thead",
-        "tbody",
-        "tfoot",
-        "th",
-        "td",
-        "tr",
-        "article",
-        "aside",
-        "section",
-        "figure",
-        "figcaption",
-        "header",
-        "footer",
-        "details",
-        "summary",
-        "nav",
-    ]
-    allowed_tags = set(bleach.sanitizer.ALLOWED_TAGS.union(allowed_content_tags, {"img"}))
-    allowed_attributes = bleach.sanitizer.ALLOWED_ATTRIBUTES.copy()
-    allowed_css = CSSSanitizer(bleach.css_sanitizer.ALLOWED_CSS_PROPERTIES)
-    allowed_attributes.update(
-        {
-            "*": ["class", "style", "id"],
-            "a": ["href"],
-            "img": ["src", "alt"],
-        }
-    )
+    return MarkdownRenderer.get().render(original)
 
-    html = markdown.markdown(original, extensions=["extra", "tables", "fenced_code", "sane_lists"])
-    clean_html = bleach.clean(
-        html, tags=allowed_tags, attributes=allowed_attributes, css_sanitizer=allowed_css, strip=True
-    )
-    soup = BeautifulSoup(clean_html, "html.parser")
 
-    for tag in soup.find_all():
-        if tag.name in allowed_content_tags and not tag.get_text(strip=True):
-            tag.decompose()
-        elif not tag.get_text(strip=True):
-            tag.extract()
+def render_page(page: Page, character: Character = None) -> str:
+    cache = RenderCache()
+    known = None if character is None else KnowledgeCache().get(character.pk)
+    key = cache.key(page, cache.fingerprint(known))
+    html = cache.get(key)
+    if html is not None:
+        return html
 
-    return str(soup).strip()
+    pipeline = RenderPipeline(character, template_page=isinstance(page, Template))
+    html = pipeline.render(page.body)
+    return cache.set(key, html, pipeline.dependencies)
@@ -0,0 +1,225 @@
+import json
+from collections import defaultdict
+from typing import Iterable
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber, Trunc
+from simple_history.manager import HistoricalQuerySet, HistoryManager
+
+from scarletbanner.wiki.diff import DiffTooCostly, opcodes
+
+
+class DeltaRevision(models.Model):
+    body_delta = models.TextField(null=True, blank=True)
+    delta_base = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class RevisionQuerySet(HistoricalQuerySet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._bodies_expanded = False
+
+    def _instanceize(self):
+        if not self._bodies_expanded and self._result_cache and isinstance(self._result_cache[0], self.model):
+            if not {"body", "body_delta", "delta_base"} & self._result_cache[0].get_deferred_fields():
+                expand_bodies(self.model, self._result_cache)
+            self._bodies_expanded = True
+        super()._instanceize()
+
+
+class RevisionManager(HistoryManager):
+    def most_recent(self):
+        if self.instance is None:
+            return super().most_recent()
+        revision = self.get_queryset().first()
+        if revision is None:
+            raise self.instance.DoesNotExist(f"{self.instance._meta.object_name} has no historical record.")
+        return revision.instance
+
+
+def make_delta(base: str, text: str) -> str:
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    operations = []
+    for tag, i1, i2, j1, j2 in opcodes(base_lines, lines, strict=True):
+        if tag == "equal":
+            operations.append([i1, i2 - i1])
+        elif j2 > j1:
+            operations.append("".join(lines[j1:j2]))
+    return json.dumps(operations, separators=(",", ":"))
+
+
+def apply_delta(base: str, delta: str) -> str:
+    base_lines = base.splitlines(keepends=True)
+    return "".join(
+        "".join(base_lines[operation[0] : operation[0] + operation[1]]) if isinstance(operation, list) else operation
+        for operation in json.loads(delta)
+    )
+
+
+def encode_revision(snapshot: str | None, text: str, depth: int, interval: int) -> str | None:
+    if snapshot is None or interval <= 1 or depth >= interval - 1:
+        return None
+    try:
+        delta = make_delta(snapshot, text)
+    except DiffTooCostly:
+        return None
+    return delta if len(delta) * 2 < len(text) else None
+
+
+def expand_bodies(model, revisions: list) -> None:
+    pending = [revision for revision in revisions if revision.body_delta is not None]
+    if not pending:
+        return
+    loaded = {revision.history_id: revision.body for revision in revisions if revision.body_delta is None}
+    missing = {revision.delta_base for revision in pending} - loaded.keys()
+    if missing:
+        loaded.update(model.objects.filter(history_id__in=missing).values_list("history_id", "body"))
+    for revision in pending:
+        revision.body = apply_delta(loaded[revision.delta_base], revision.body_delta)
+
+
+def expand_values(model, rows: list[dict]) -> None:
+    snapshots = {row["history_id"]: row["body"] for row in rows if row["body_delta"] is None}
+    missing = {row["delta_base"] for row in rows if row["body_delta"] is not None} - snapshots.keys()
+    if missing:
+        snapshots.update(model.objects.filter(history_id__in=missing).values_list("history_id", "body"))
+    for row in rows:
+        if row["body_delta"] is not None:
+            row["body"] = apply_delta(snapshots[row["delta_base"]], row["body_delta"])
+
+
+def lock_pages(model, page_ids: Iterable[int]) -> None:
+    pages = model.instance_type._base_manager.select_for_update().filter(pk__in=page_ids).order_by("pk")
+    list(pages.values_list("pk", flat=True))
+
+
+def compress_revision(history_instance) -> None:
+    interval = settings.WIKI_HISTORY_SNAPSHOT_INTERVAL
+    # Outside a transaction the page row is not locked against pruning, so the body is stored in full
+    if interval <= 1 or history_instance.history_type == "+" or not transaction.get_connection().in_atomic_block:
+        return
+    model = type(history_instance)
+    latest = model.objects.filter(id=history_instance.id).order_by("-history_date", "-history_id")
+    depth = (
+        model.objects.filter(id=history_instance.id, delta_base=OuterRef("history_id"))
+        .order_by()
+        .values("delta_base")
+        .annotate(depth=Count("pk"))
+        .values("depth")
+    )
+    snapshot = (
+        model.objects.select_for_update(of=("self",))
+        .filter(
+            history_id=Subquery(
+                latest.values(base=Coalesce("delta_base", "history_id", output_field=models.BigIntegerField()))[:1]
+            )
+        )
+        .annotate(depth=Coalesce(Subquery(depth), 0))
+        .values_list("history_id", "body", "depth")
+        .first()
+    )
+    if snapshot is None:
+        return
+    base, snapshot, depth = snapshot
+    delta = encode_revision(snapshot, history_instance.body, depth, interval)
+    if delta is not None:
+        history_instance.body, history_instance.body_delta, history_instance.delta_base = "", delta, base
+
+
+def load_chains(model, page_ids: list[int]) -> dict[int, list]:
+    revisions = list(model.objects.filter(id__in=page_ids).order_by("id", "history_date", "history_id"))
+    expand_bodies(model, revisions)
+    chains = defaultdict(list)
+    for revision in revisions:
+        chains[revision.id].append(revision)
+    return chains
+
+
+def encode_chains(chains: Iterable[list], interval: int) -> list:
+    changed = []
+    for chain in chains:
+        snapshot, base, depth = None, None, 0
+        for revision in chain:
+            delta = encode_revision(snapshot, revision.body, depth, interval)
+            if delta is None:
+                stored = (revision.body, None, None)
+                snapshot, base, depth = revision.body, revision.history_id, 0
+            else:
+                stored = ("", delta, base)
+                depth += 1
+            if stored != (
+                revision.body if revision.body_delta is None else "",
+                revision.body_delta,
+                revision.delta_base,
+            ):
+                revision.body, revision.body_delta, revision.delta_base = stored
+                changed.append(revision)
+    return changed
+
+
+def lock_unchanged(model, chains: dict[int, list]) -> set[int]:
+    lock_pages(model, chains)
+    heads = {
+        page_id: (count, latest)
+        for page_id, count, latest in model.objects.filter(id__in=chains)
+        .values("id")
+        .annotate(count=Count("history_id"), latest=Max("history_id"))
+        .values_list("id", "count", "latest")
+    }
+    return {
+        page_id
+        for page_id, chain in chains.items()
+        if heads.get(page_id) == (len(chain), max(revision.history_id for revision in chain))
+    }
+
+
+def compact_revisions(model, page_ids: list[int], interval: int) -> list:
+    chains = load_chains(model, page_ids)
+    changed = encode_chains(chains.values(), interval)
+    unchanged = lock_unchanged(model, chains)
+    return [revision for revision in changed if revision.id in unchanged]
+
+
+def prunable_revisions(model, page_ids: list[int], cutoff, period: str):
+    oldest_first = [F("history_date").asc(), F("history_id").asc()]
+    return (
+        model.objects.filter(id__in=page_ids, history_date__lt=cutoff)
+        .annotate(
+            period_rank=Window(
+                RowNumber(),
+                partition_by=[F("id"), Trunc("history_date", period)],
+                order_by=[F("history_date").desc(), F("history_id").desc()],
+            ),
+            page_rank=Window(RowNumber(), partition_by=[F("id")], order_by=oldest_first),
+            editor_rank=Window(RowNumber(), partition_by=[F("id"), F("history_user")], order_by=oldest_first),
+        )
+        .filter(period_rank__gt=1, page_rank__gt=1, editor_rank__gt=1)
+        .values_list("history_id", flat=True)
+    )
+
+
+def prune_revisions(model, page_ids: list[int], cutoff, period: str, interval: int) -> int:
+    doomed = set(prunable_revisions(model, page_ids, cutoff, period))
+    if not doomed:
+        return 0
+    chains = load_chains(model, page_ids)
+    survivors = [[revision for revision in chain if revision.history_id not in doomed] for chain in chains.values()]
+    changed = encode_chains(survivors, interval)
+    # Chains are re-encoded before locking; pages edited meanwhile are left for the next run
+    unchanged = lock_unchanged(model, chains)
+    doomed = [
+        revision.history_id for page_id in unchanged for revision in chains[page_id] if revision.history_id in doomed
+    ]
+    model.objects.filter(history_id__in=doomed).delete()
+    model.objects.bulk_update(
+        [revision for revision in changed if revision.id in unchanged],
+        ["body", "body_delta", "delta_base"],
+        batch_size=1000,
+    )
+    return len(doomed)
@@ -0,0 +1,48 @@
+import html
+import re
+from functools import lru_cache, reduce
+from operator import and_
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery
+from django.db import connection
+
+SEARCH_TERM_PATTERN = re.compile(r"[^\W_]+")
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_STOP = "\x03"
+
+
+def parse_query(text: str) -> SearchQuery | None:
+    terms = SEARCH_TERM_PATTERN.findall(text.lower())
+    if not terms:
+        return None
+    return reduce(
+        and_,
+        [
+            SearchQuery(f"{term}:*A", search_type="raw", config="simple")
+            | SearchQuery(f"{term}:B", search_type="raw", config="english")
+            for term in terms
+        ],
+    )
+
+
+def headline(query: SearchQuery) -> SearchHeadline:
+    return SearchHeadline(
+        "body",
+        query,
+        config="english",
+        start_sel=HIGHLIGHT_START,
+        stop_sel=HIGHLIGHT_STOP,
+        min_words=15,
+        max_words=35,
+    )
+
+
+def highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+
+@lru_cache(maxsize=None)
+def trigram_available() -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
@@ -1,10 +1,61 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from simple_history.signals import pre_create_historical_record
 
-from scarletbanner.wiki.models import Page
+from scarletbanner.wiki.caches import KnowledgeCache, RenderCache, invalidate_page_paths
+from scarletbanner.wiki.models import Character, Page, Secret
+from scarletbanner.wiki.revisions import compress_revision
 
 
-@receiver(pre_save, sender=Page)
-def validate_unique_slug(sender, instance, **kwargs):
-    if Page.objects.filter(slug=instance.slug).exclude(pk=instance.pk).exists():
-        raise ValueError("Slug must be unique.")
+def invalidate_page_dependents(sender, instance, **kwargs):
+    current = (instance.title, instance.slug)
+    invalidate_page_paths({current, getattr(instance, "loaded_paths", current)})
+    instance.loaded_paths = current
+
+
+def store_revision_delta(sender, history_instance, **kwargs):
+    compress_revision(history_instance)
+
+
+@receiver(post_save, sender=Secret)
+@receiver(post_delete, sender=Secret)
+def invalidate_secret_dependents(sender, instance, **kwargs):
+    transaction.on_commit(lambda: RenderCache().invalidate([RenderCache.dependency("secrets", "all")]))
+
+
+def refresh_knowledge(character_ids):
+    character_ids = list(character_ids)
+    transaction.on_commit(lambda: KnowledgeCache().refresh(character_ids))
+
+
+@receiver(m2m_changed, sender=Secret.known_to.through)
+def refresh_character_knowledge(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and not reverse:
+        instance.known_by = list(instance.known_to.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove") and pk_set:
+        refresh_knowledge([instance.pk] if reverse else pk_set)
+    elif action == "post_clear":
+        refresh_knowledge([instance.pk] if reverse else instance.known_by)
+
+
+@receiver(pre_delete, sender=Secret)
+def load_secret_knowers(sender, instance, **kwargs):
+    instance.known_by = list(instance.known_to.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Secret)
+def refresh_secret_knowers(sender, instance, **kwargs):
+    refresh_knowledge(instance.known_by)
+
+
+@receiver(post_delete, sender=Character)
+def invalidate_character_knowledge(sender, instance, **kwargs):
+    character_ids = [instance.pk]
+    transaction.on_commit(lambda: KnowledgeCache().invalidate(character_ids))
+
+
+for model in Page.get_concrete_models():
+    post_save.connect(invalidate_page_dependents, sender=model)
+    post_delete.connect(invalidate_page_dependents, sender=model)
+    pre_create_historical_record.connect(store_revision_delta, sender=model.history.model)
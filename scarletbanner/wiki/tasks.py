@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from config import celery_app
+from scarletbanner.wiki.models import Page
+from scarletbanner.wiki.revisions import prune_revisions
+
+User = get_user_model()
+
+
+@celery_app.task(bind=True, soft_time_limit=30 * 60, time_limit=35 * 60)
+def destroy_page(self, page_id: int, editor_id: int = None) -> int:
+    page = Page.objects.get(pk=page_id)
+    editor = None if editor_id is None else User.objects.get(pk=editor_id)
+
+    def report(done: int, total: int) -> None:
+        self.update_state(state="PROGRESS", meta={"done": done, "total": total})
+
+    return page.destroy(editor, progress=report)
+
+
+@celery_app.task(soft_time_limit=30 * 60, time_limit=35 * 60)
+def prune_history() -> int:
+    cutoff = timezone.now() - timedelta(days=settings.WIKI_HISTORY_KEEP_ALL_DAYS)
+    batch_size = settings.WIKI_HISTORY_PRUNE_BATCH_SIZE
+    total = 0
+
+    for model in [model.history.model for model in Page.get_concrete_models()]:
+        page_ids = list(
+            model.objects.filter(history_date__lt=cutoff).order_by("id").values_list("id", flat=True).distinct()
+        )
+        pruned = 0
+        for start in range(0, len(page_ids), batch_size):
+            with transaction.atomic():
+                pruned += prune_revisions(
+                    model,
+                    page_ids[start : start + batch_size],
+                    cutoff,
+                    settings.WIKI_HISTORY_KEEP_ONE_PER,
+                    settings.WIKI_HISTORY_SNAPSHOT_INTERVAL,
+                )
+        if pruned and not connection.in_atomic_block:
+            with connection.cursor() as cursor:
+                cursor.execute(f"VACUUM (ANALYZE) {connection.ops.quote_name(model._meta.db_table)}")
+        total += pruned
+    return total
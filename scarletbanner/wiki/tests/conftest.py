@@ -1,5 +1,7 @@
 import pytest
+from django.core.cache import cache
 
+from scarletbanner.wiki.caches import link_cache
 from scarletbanner.wiki.enums import PermissionLevel
 from scarletbanner.wiki.tests.factories import (
     SecretCategoryFactory,
@@ -13,6 +15,15 @@ from scarletbanner.wiki.tests.factories import (
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    link_cache.clear()
+    yield
+    cache.clear()
+    link_cache.clear()
+
+
 @pytest.fixture
 def page(user):
     return make_page(user=user)
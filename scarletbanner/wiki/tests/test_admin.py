@@ -0,0 +1,30 @@
+import pytest
+from django.urls import reverse
+
+from scarletbanner.wiki.tests.factories import make_character, make_page
+
+
+@pytest.mark.django_db
+class TestPageAdmin:
+    def test_parent_autocomplete(self, admin_client, admin_user):
+        page = make_page(user=admin_user, title="Dragons", slug="dragons")
+        make_page(user=admin_user, title="Griffin", slug="griffin")
+        response = admin_client.get(
+            reverse("admin:autocomplete"),
+            data={"app_label": "wiki", "model_name": "character", "field_name": "parent", "term": "drag"},
+        )
+        assert response.status_code == 200
+        assert response.json()["results"] == [{"id": str(page.pk), "text": "Dragons"}]
+
+    def test_change_form_does_not_list_pages(self, admin_client, admin_user):
+        character = make_character(user=admin_user, title="Aldric", slug="aldric")
+        make_page(user=admin_user, title="Griffin", slug="griffin")
+        response = admin_client.get(reverse("admin:wiki_character_change", args=[character.pk]))
+        assert response.status_code == 200
+        assert "Griffin" not in response.content.decode()
+
+    def test_changelist_search(self, admin_client, admin_user):
+        make_page(user=admin_user, title="Dragons", slug="dragons")
+        response = admin_client.get(reverse("admin:wiki_page_changelist"), data={"q": "drag"})
+        assert response.status_code == 200
+        assert "Dragons" in response.content.decode()
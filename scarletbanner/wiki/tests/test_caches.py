@@ -0,0 +1,218 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from scarletbanner.wiki.caches import (
+    KnowledgeCache,
+    LinkCache,
+    PermissionCache,
+    get_permission_cache,
+    permission_cache,
+)
+from scarletbanner.wiki.enums import PermissionLevel
+from scarletbanner.wiki.middleware import PermissionCacheMiddleware
+from scarletbanner.wiki.models import Page
+from scarletbanner.wiki.tests.factories import SecretFactory, make_character, make_owned_page, make_page
+
+
+class TestPermissionCache:
+    def test_get_set(self):
+        cache = PermissionCache()
+        assert cache.get((1, (), 2, 100)) is None
+        cache.set((1, (), 2, 100), True)
+        assert cache.get((1, (), 2, 100)) is True
+        assert cache.stats == {"hits": 1, "misses": 1, "size": 1}
+
+    def test_invalidate(self):
+        cache = PermissionCache()
+        cache.set((1, (), 2, 100), True)
+        cache.set((2, (), 2, 100), False)
+        cache.set((3, (), 2, 100), True)
+        cache.invalidate(1)
+        assert cache.get((1, (), 2, 100)) is None
+        assert cache.get((2, (), 2, 100)) is False
+        cache.invalidate_many([2, 3, 4])
+        assert cache.stats["size"] == 0
+
+    def test_context(self):
+        assert get_permission_cache() is None
+        with permission_cache() as cache:
+            assert get_permission_cache() is cache
+        assert get_permission_cache() is None
+
+
+@pytest.mark.django_db
+class TestPagePermissionCache:
+    def test_can_write_cached(self, user, django_assert_num_queries):
+        page = make_page(user=user, read=PermissionLevel.EDITORS_ONLY, write=PermissionLevel.EDITORS_ONLY)
+        with permission_cache() as cache:
+            with django_assert_num_queries(1):
+                assert page.can_write(PermissionLevel.EDITORS_ONLY, user)
+                assert page.can_write(PermissionLevel.EDITORS_ONLY, user)
+                assert page.can_read(user)
+        assert cache.misses == 1
+        assert cache.hits == 6
+
+    def test_shared_between_instances(self, user):
+        page = make_page(user=user, read=PermissionLevel.EDITORS_ONLY)
+        with permission_cache() as cache:
+            assert page.can_read(user)
+            assert Page.objects.get(pk=page.pk).can_read(user)
+        assert cache.stats == {"hits": 1, "misses": 1, "size": 1}
+
+    def test_invalidated_by_update(self, user, other):
+        page = make_page(user=user, read=PermissionLevel.MEMBERS_ONLY, write=PermissionLevel.MEMBERS_ONLY)
+        with permission_cache():
+            assert not page.evaluate_permission(PermissionLevel.EDITORS_ONLY, other)
+            page.update(editor=other, title="Updated Page", message="Test")
+            assert page.evaluate_permission(PermissionLevel.EDITORS_ONLY, other)
+
+    def test_owner_change(self, user, other):
+        page = make_owned_page(user=user, owner=user, read=PermissionLevel.OWNER_ONLY)
+        with permission_cache():
+            assert not page.can_read(other)
+            page.owner = other
+            assert page.can_read(other)
+
+    def test_anonymous(self, user):
+        page = make_page(user=user, read=PermissionLevel.MEMBERS_ONLY)
+        with permission_cache():
+            assert not page.can_read(AnonymousUser())
+            assert not page.can_read(None)
+
+
+class TestLinkCache:
+    def test_bounded(self):
+        cache = LinkCache(size=2)
+        cache.set_many({("title", "A"): "/a/", ("title", "B"): None})
+        assert cache.get_many([("title", "A")]) == {("title", "A"): "/a/"}
+        cache.set_many({("title", "C"): "/c/"})
+        assert list(cache.urls) == [("title", "A"), ("title", "C")]
+
+    def test_stale_generation_not_stored(self):
+        cache = LinkCache()
+        generation = cache.sync()
+        cache.invalidate_paths([("A", "a")])
+        cache.set_many({("title", "A"): None}, generation)
+        assert cache.get_many([("title", "A")]) == {}
+
+
+class TestKnowledgeCache:
+    def test_encode_decode(self):
+        data = KnowledgeCache.encode([70, 3])
+        assert KnowledgeCache.decode(data) == {3, 70}
+        assert len(data) == 16
+        assert KnowledgeCache.encode([]) == b""
+
+    @pytest.mark.django_db
+    def test_single_get(self, django_assert_num_queries, django_capture_on_commit_callbacks):
+        character = make_character()
+        with django_capture_on_commit_callbacks(execute=True):
+            secrets = [SecretFactory(known_to=[character]) for _ in range(3)]
+        with django_assert_num_queries(0):
+            assert KnowledgeCache().get(character.pk) == {secret.pk for secret in secrets}
+
+    @pytest.mark.django_db
+    def test_rebuilt_on_miss(self, django_assert_num_queries):
+        alice, bob = make_character(), make_character()
+        secret = SecretFactory(known_to=[alice])
+        KnowledgeCache().invalidate([alice.pk, bob.pk])
+        with django_assert_num_queries(1):
+            assert KnowledgeCache().get_many([alice.pk, bob.pk]) == {alice.pk: {secret.pk}, bob.pk: set()}
+        with django_assert_num_queries(0):
+            assert KnowledgeCache().get_many([alice.pk, bob.pk]) == {alice.pk: {secret.pk}, bob.pk: set()}
+
+    @pytest.mark.django_db
+    def test_large_secret_pk(self, django_capture_on_commit_callbacks):
+        character = make_character()
+        with django_capture_on_commit_callbacks(execute=True):
+            secret = SecretFactory(pk=10**9, known_to=[character])
+        assert len(KnowledgeCache().cache.get(KnowledgeCache().key(character.pk))[1]) == 8
+        assert KnowledgeCache().get(character.pk) == {secret.pk}
+        assert secret.knows(character)
+
+    @pytest.mark.django_db
+    def test_refreshed_by_m2m_changes(self, django_capture_on_commit_callbacks):
+        alice, bob = make_character(), make_character()
+        first, second = SecretFactory(), SecretFactory()
+        cache = KnowledgeCache()
+        with django_capture_on_commit_callbacks(execute=True):
+            first.known_to.add(alice, bob)
+            bob.secrets_known.add(second)
+        assert cache.shared([alice.pk, bob.pk]) == {first.pk}
+        assert cache.get(bob.pk) == {first.pk, second.pk}
+        with django_capture_on_commit_callbacks(execute=True):
+            first.known_to.remove(alice)
+        assert cache.get(alice.pk) == set()
+        with django_capture_on_commit_callbacks(execute=True):
+            bob.secrets_known.clear()
+        assert cache.get(bob.pk) == set()
+        with django_capture_on_commit_callbacks(execute=True):
+            second.known_to.set([alice, bob])
+            second.known_to.clear()
+        assert cache.get_many([alice.pk, bob.pk]) == {alice.pk: set(), bob.pk: set()}
+
+    @pytest.mark.django_db
+    def test_refreshed_by_deletes(self, django_capture_on_commit_callbacks):
+        alice = make_character()
+        with django_capture_on_commit_callbacks(execute=True):
+            first, second = SecretFactory(known_to=[alice]), SecretFactory(known_to=[alice])
+            first.delete()
+        assert KnowledgeCache().get(alice.pk) == {second.pk}
+        key = KnowledgeCache().key(alice.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            alice.delete()
+        assert KnowledgeCache().cache.get(key) is None
+
+    @pytest.mark.django_db
+    def test_refreshed_on_commit(self, django_capture_on_commit_callbacks):
+        alice = make_character()
+        assert KnowledgeCache().get(alice.pk) == set()
+        with django_capture_on_commit_callbacks() as callbacks:
+            secret = SecretFactory(known_to=[alice])
+        assert KnowledgeCache().get(alice.pk) == set()
+        for callback in callbacks:
+            callback()
+        assert KnowledgeCache().get(alice.pk) == {secret.pk}
+
+
+class TestPermissionCacheMiddleware:
+    def test_request_scope(self, settings):
+        settings.DEBUG = True
+        seen = []
+
+        def get_response(request):
+            seen.append(get_permission_cache())
+            request.permission_cache.get((1, (), None, 100))
+            return HttpResponse()
+
+        middleware = PermissionCacheMiddleware(get_response)
+        response = middleware(RequestFactory().get("/"))
+        assert isinstance(seen[0], PermissionCache)
+        assert get_permission_cache() is None
+        assert response["X-Permission-Cache"] == "hits=0; misses=1"
+
+    def test_no_header_in_production(self, settings):
+        settings.DEBUG = False
+        middleware = PermissionCacheMiddleware(lambda request: HttpResponse())
+        response = middleware(RequestFactory().get("/"))
+        assert "X-Permission-Cache" not in response
+
+    @pytest.mark.django_db
+    def test_stale_load_not_served(self, monkeypatch, django_capture_on_commit_callbacks):
+        alice = make_character()
+        cache = KnowledgeCache()
+        secrets = []
+        set_many = cache.cache.set_many
+
+        def commit_change_then_set(*args, **kwargs):
+            if not secrets:
+                with django_capture_on_commit_callbacks(execute=True):
+                    secrets.append(SecretFactory(known_to=[alice]))
+            return set_many(*args, **kwargs)
+
+        monkeypatch.setattr(cache.cache, "set_many", commit_change_then_set)
+        assert cache.get(alice.pk) == set()
+        monkeypatch.undo()
+        assert KnowledgeCache().get(alice.pk) == {secrets[0].pk}
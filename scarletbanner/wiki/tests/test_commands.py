@@ -0,0 +1,257 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from scarletbanner.wiki.enums import PermissionLevel
+from scarletbanner.wiki.models import Page, PageEditor
+from scarletbanner.wiki.tests.factories import make_character, make_page, make_template
+
+
+@pytest.mark.django_db
+class TestBackfillPageEditors:
+    def test_backfill(self, user, other):
+        page = make_page(user=user)
+        page.update(editor=other, title="Updated Page", message="Test")
+        page.update(editor=user, title="Updated Again", message="Test")
+        character = make_character(user=other)
+        expected = list(PageEditor.objects.order_by("pk").values_list("page", "user", "edit_count"))
+        PageEditor.objects.all().delete()
+
+        out = StringIO()
+        call_command("backfill_page_editors", stdout=out)
+        actual = list(PageEditor.objects.order_by("pk").values_list("page", "user", "edit_count"))
+        assert sorted(actual) == sorted(expected)
+        assert "Indexed 3 page editors." in out.getvalue()
+        assert character.is_editor(other)
+
+    def test_backfill_idempotent(self, user):
+        page = make_page(user=user)
+        call_command("backfill_page_editors", stdout=StringIO())
+        call_command("backfill_page_editors", stdout=StringIO())
+        assert PageEditor.objects.get(page=page, user=user).edit_count == 1
+
+
+@pytest.mark.django_db
+class TestBenchmarkReparent:
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark_reparent", pages=20, branching=3, stdout=out)
+        assert "Subtree: 20 pages" in out.getvalue()
+        assert "recursive" in out.getvalue()
+        assert "bulk" in out.getvalue()
+        assert not Page.objects.filter(title__startswith="Benchmark").exists()
+
+
+@pytest.mark.django_db
+class TestBenchmarkSubtree:
+    def test_benchmark(self):
+        out = StringIO()
+        call_command("benchmark_subtree", pages=30, branching=3, repeat=1, stdout=out)
+        assert "Wiki: 30 pages" in out.getvalue()
+        for method in ["parent walk", "cte", "prefix"]:
+            assert method in out.getvalue()
+        assert not Page.objects.filter(title__startswith="Benchmark").exists()
+
+
+def write_jsonl(path, records):
+    path.write_text("\n".join(json.dumps(record) for record in records) + "\n")
+    return path
+
+
+@pytest.mark.django_db
+class TestImportWiki:
+    def test_import_jsonl(self, tmp_path, user):
+        source = write_jsonl(
+            tmp_path / "pages.jsonl",
+            [
+                {"title": "City", "parent": "region", "body": "A city."},
+                {"title": "Region", "body": "A region.", "read": "members only"},
+                {"title": "Street", "slug": "region/city/street"},
+            ],
+        )
+        out = StringIO()
+        call_command("import_wiki", str(source), user=user.username, batch_size=2, stdout=out)
+        region, city, street = (
+            Page.objects.get(slug=slug) for slug in ["region", "region/city", "region/city/street"]
+        )
+        assert city.parent == region
+        assert street.parent == city
+        assert region.read == PermissionLevel.MEMBERS_ONLY.value
+        assert city.body == "A city."
+        assert "3 imported, 0 skipped, 0 failed" in out.getvalue()
+        assert "pages/s" in out.getvalue()
+
+    def test_import_history(self, tmp_path, user):
+        source = write_jsonl(tmp_path / "pages.jsonl", [{"title": "Imported Page"}])
+        call_command("import_wiki", str(source), user=user.username, message="Migrated", stdout=StringIO())
+        page = Page.objects.get(slug="imported-page")
+        revision = page.history.get()
+        assert revision.history_type == "+"
+        assert revision.history_user == user
+        assert revision.history_change_reason == "Migrated"
+        assert page.is_editor(user)
+
+    def test_import_markdown(self, tmp_path):
+        (tmp_path / "region").mkdir()
+        (tmp_path / "region.md").write_text("# The Region\n\nA region.")
+        (tmp_path / "region" / "old_town.md").write_text("No heading here.")
+        call_command("import_wiki", str(tmp_path), stdout=StringIO())
+        region = Page.objects.get(slug="region")
+        town = Page.objects.get(slug="region/old-town")
+        assert region.title == "The Region"
+        assert region.body == "A region."
+        assert town.title == "Old Town"
+        assert town.body == "No heading here."
+        assert town.parent == region
+
+    def test_import_under_existing(self, tmp_path):
+        region = make_page(title="Region")
+        source = write_jsonl(tmp_path / "pages.jsonl", [{"title": "City", "parent": "region"}])
+        call_command("import_wiki", str(source), stdout=StringIO())
+        assert Page.objects.get(slug="region/city").parent == region
+
+    def test_import_skips_existing(self, tmp_path):
+        make_page(title="Region")
+        source = write_jsonl(tmp_path / "pages.jsonl", [{"title": "Region"}, {"title": "City"}])
+        out = StringIO()
+        call_command("import_wiki", str(source), stdout=out)
+        call_command("import_wiki", str(source), stdout=out)
+        assert Page.objects.filter(slug="region").count() == 1
+        assert "0 imported, 2 skipped" in out.getvalue()
+
+    def test_import_failures(self, tmp_path):
+        source = tmp_path / "pages.jsonl"
+        source.write_text(
+            "\n".join(
+                [
+                    "not json",
+                    json.dumps({"body": "No title"}),
+                    json.dumps({"title": "Lost", "parent": "nowhere"}),
+                    json.dumps({"title": "Secret", "read": "classified"}),
+                    json.dumps({"title": "Found"}),
+                ]
+            )
+        )
+        out, err = StringIO(), StringIO()
+        call_command("import_wiki", str(source), stdout=out, stderr=err)
+        assert "1 imported, 0 skipped, 4 failed" in out.getvalue()
+        assert "Record 1: invalid JSON" in err.getvalue()
+        assert "Record 3: parent 'nowhere' not found" in err.getvalue()
+        assert not Page.objects.filter(title="Lost").exists()
+
+    def test_import_checkpoint(self, tmp_path):
+        source = write_jsonl(tmp_path / "pages.jsonl", [{"title": f"Page {n}"} for n in range(5)])
+        checkpoint = tmp_path / "checkpoint.json"
+        checkpoint.write_text(json.dumps({"source": str(source), "position": 3}))
+        call_command("import_wiki", str(source), checkpoint=str(checkpoint), stdout=StringIO())
+        assert sorted(Page.objects.values_list("title", flat=True)) == ["Page 3", "Page 4"]
+        assert json.loads(checkpoint.read_text()) == {"source": str(source), "position": 5}
+
+    def test_import_checkpoint_waits_for_parent(self, tmp_path):
+        source = write_jsonl(
+            tmp_path / "pages.jsonl",
+            [{"title": "City", "parent": "region"}, {"title": "Other"}, {"title": "Region"}],
+        )
+        checkpoint = tmp_path / "checkpoint.json"
+        out = StringIO()
+        call_command("import_wiki", str(source), checkpoint=str(checkpoint), batch_size=1, stdout=out)
+        assert Page.objects.get(slug="region/city").parent.slug == "region"
+        assert json.loads(checkpoint.read_text())["position"] == 3
+
+    def test_import_checkpoint_mismatch(self, tmp_path):
+        source = write_jsonl(tmp_path / "pages.jsonl", [{"title": "Page"}])
+        checkpoint = tmp_path / "checkpoint.json"
+        checkpoint.write_text(json.dumps({"source": "/elsewhere.jsonl", "position": 0}))
+        with pytest.raises(CommandError):
+            call_command("import_wiki", str(source), checkpoint=str(checkpoint), stdout=StringIO())
+
+    def test_import_batch_queries(self, tmp_path, user, django_assert_max_num_queries):
+        source = write_jsonl(
+            tmp_path / "pages.jsonl",
+            [{"title": f"Page {n}", "parent": "region"} for n in range(50)] + [{"title": "Region"}],
+        )
+        with django_assert_max_num_queries(25):
+            call_command("import_wiki", str(source), user=user.username, batch_size=100, stdout=StringIO())
+        assert Page.objects.filter(parent__slug="region").count() == 50
+
+
+@pytest.mark.django_db
+class TestExportWiki:
+    def test_export(self, user):
+        region = make_page(user=user, title="Region", slug="region")
+        make_page(user=user, title="City", slug="city", parent=region)
+        out, err = StringIO(), StringIO()
+        call_command("export_wiki", stdout=out, stderr=err)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [record["slug"] for record in records] == ["region", "region/city"]
+        assert "Exported 2 pages" in err.getvalue()
+
+    def test_export_file(self, tmp_path, user):
+        make_page(user=user, title="Region", slug="region")
+        output = tmp_path / "wiki.ndjson"
+        out = StringIO()
+        call_command("export_wiki", output=str(output), stdout=out)
+        assert json.loads(output.read_text())["slug"] == "region"
+        assert "Exported 1 pages" in out.getvalue()
+
+    def test_export_as_user(self, user, other):
+        make_page(user=user, title="Lair", slug="lair", read=PermissionLevel.EDITORS_ONLY)
+        make_page(user=user, title="Hoard", slug="hoard")
+        out = StringIO()
+        call_command("export_wiki", user=other.username, stdout=out, stderr=StringIO())
+        assert [json.loads(line)["slug"] for line in out.getvalue().splitlines()] == ["hoard"]
+
+    def test_export_history_queries(self, user, django_assert_num_queries):
+        for n in range(4):
+            make_page(user=user, title=f"Page {n}")
+            make_template(user=user, title=f"Template {n}")
+        out = StringIO()
+        with django_assert_num_queries(5):
+            call_command("export_wiki", history=True, chunk_size=4, stdout=out, stderr=StringIO())
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert len(records) == 8
+        assert all(len(record["history"]) == 1 for record in records)
+
+    def test_export_import_round_trip(self, tmp_path, user):
+        region = make_page(user=user, title="Region", slug="region", read=PermissionLevel.MEMBERS_ONLY)
+        make_page(user=user, title="City", slug="city", parent=region, body="A city.")
+        output = tmp_path / "wiki.ndjson"
+        call_command("export_wiki", output=str(output), stdout=StringIO())
+        Page.objects.all().delete()
+        call_command("import_wiki", str(output), stdout=StringIO())
+        city = Page.objects.get(slug="region/city")
+        assert city.body == "A city."
+        assert city.parent.read == PermissionLevel.MEMBERS_ONLY.value
+
+
+@pytest.mark.django_db
+class TestCompactHistory:
+    def test_compact(self, user, settings):
+        settings.WIKI_HISTORY_SNAPSHOT_INTERVAL = 1
+        body = "".join(f"Line {n}\n" for n in range(50))
+        page = make_page(user=user, body=body)
+        bodies = [body]
+        for n in range(6):
+            bodies.append(bodies[-1].replace(f"Line {n}\n", f"Edited {n}\n"))
+            page.update(editor=user, body=bodies[-1], message="Edit")
+        history = Page.history.model.objects.filter(id=page.id)
+        assert not history.exclude(body_delta=None).exists()
+
+        out = StringIO()
+        call_command("compact_history", interval=4, stdout=out)
+        deltas = history.order_by("history_date", "history_id").values_list("body_delta", flat=True)
+        assert [delta is None for delta in deltas] == [True, False, False, False, True, False, False]
+        assert history.exclude(body_delta=None).count() == 5
+        assert [revision.body for revision in page.history.order_by("history_date", "history_id")] == bodies
+        assert "wiki_historicalpage" in out.getvalue()
+        assert "Rewrote 5 revisions." in out.getvalue()
+
+        out = StringIO()
+        call_command("compact_history", interval=4, stdout=out)
+        assert "Rewrote 0 revisions." in out.getvalue()
+
+        call_command("compact_history", interval=1, stdout=StringIO())
+        assert not history.exclude(body_delta=None).exists()
+        assert [revision.body for revision in page.history.order_by("history_date", "history_id")] == bodies
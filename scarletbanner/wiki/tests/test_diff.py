@@ -0,0 +1,95 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from scarletbanner.wiki.diff import DiffTooCostly, diff_text, matching_blocks, opcodes
+
+
+def longest_common_subsequence(a, b) -> int:
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+class TestMatchingBlocks:
+    @pytest.mark.parametrize("seed", range(20))
+    def test_optimal(self, seed):
+        rng = random.Random(seed)
+        a = rng.choices("abcd", k=rng.randint(0, 40))
+        b = rng.choices("abcd", k=rng.randint(0, 40))
+        blocks = matching_blocks(a, b)
+        assert all(a[i : i + size] == b[j : j + size] for i, j, size in blocks)
+        assert sum(size for _, _, size in blocks) == longest_common_subsequence(a, b)
+
+    def test_opcodes_rebuild_target(self):
+        a, b = list("the quick brown fox"), list("a quick brown cat jumps")
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in opcodes(a, b):
+            rebuilt += a[i1:i2] if tag == "equal" else b[j1:j2]
+        assert rebuilt == b
+
+    def test_agrees_with_difflib_on_unique_lines(self):
+        a = [f"line {n}" for n in range(100)]
+        b = a[:10] + ["inserted"] + a[10:50] + a[60:]
+        expected = SequenceMatcher(None, a, b).get_matching_blocks()[:-1]
+        assert matching_blocks(a, b) == [tuple(block) for block in expected]
+
+    def test_cost_capped(self):
+        a = [f"row {n}" for n in range(4000)]
+        b = a[::-1]
+        with pytest.raises(DiffTooCostly):
+            matching_blocks(a, b, strict=True)
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in opcodes(a, b):
+            rebuilt += a[i1:i2] if tag == "equal" else b[j1:j2]
+        assert rebuilt == b
+
+
+class TestDiffText:
+    def test_hunks(self):
+        before = "".join(f"Line {n}\n" for n in range(20))
+        after = before.replace("Line 10\n", "Line ten\n")
+        assert diff_text(before, after) == {
+            "added": 1,
+            "removed": 1,
+            "hunks": [
+                {
+                    "from_start": 8,
+                    "from_count": 7,
+                    "to_start": 8,
+                    "to_count": 7,
+                    "lines": [
+                        " Line 7",
+                        " Line 8",
+                        " Line 9",
+                        "-Line 10",
+                        "+Line ten",
+                        " Line 11",
+                        " Line 12",
+                        " Line 13",
+                    ],
+                }
+            ],
+        }
+
+    def test_identical(self):
+        assert diff_text("Same\n", "Same\n") == {"added": 0, "removed": 0, "hunks": []}
+
+    def test_from_empty(self):
+        diff = diff_text("", "New\nPage")
+        assert diff["added"] == 2
+        assert diff["hunks"][0]["lines"] == ["+New", "+Page"]
+
+    def test_reordered_large_body(self):
+        rows = [f"| row {n} | {(n * 7919 + 1) % 4000} |" for n in range(4000)]
+        before = "\n".join(["Title", *rows, "Footer"])
+        after = "\n".join(["Title", *sorted(rows, key=lambda row: int(row.split("|")[2])), "Footer"])
+        diff = diff_text(before, after)
+        assert diff["added"] == diff["removed"] == 4000
+        assert diff["hunks"][0]["lines"][0] == " Title"
+        assert diff["hunks"][-1]["lines"][-1] == " Footer"
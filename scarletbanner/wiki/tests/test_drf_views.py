@@ -1,10 +1,18 @@
+import json
 from urllib.parse import quote
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
 from rest_framework.test import APIRequestFactory
 
-from scarletbanner.wiki.api.views import PageViewSet
+from scarletbanner.wiki.api.serializers import PageSerializer
+from scarletbanner.wiki.api.views import PageViewSet, WikiPagination
+from scarletbanner.wiki.enums import PermissionLevel
 from scarletbanner.wiki.models import Page
 from scarletbanner.wiki.tests.factories import make_page
 
@@ -71,6 +79,67 @@ class TestPageViewSet:
         assert response.data["total"] == 5
         assert response.data["pages"][0]["title"] == pages[0].title
 
+    def test_list_cursor_pagination(self, api_rf: APIRequestFactory):
+        view = PageViewSet.as_view({"get": "list"})
+        pages = [make_page(title=f"Page {i}") for i in range(5)]
+
+        request = api_rf.get("/api/v1/wiki/?cursor=&limit=2")
+        response = view(request)
+        assert [page["id"] for page in response.data["pages"]] == [pages[4].id, pages[3].id]
+        assert "total" not in response.data
+        assert "estimated_total" not in response.data
+        next_cursor = response.data["next"]
+        assert response.headers["Link"] == (
+            f'<http://testserver/api/v1/wiki/?cursor={next_cursor}&limit=2>; rel="next", '
+            '<http://testserver/api/v1/wiki/?cursor=&limit=2>; rel="first"'
+        )
+
+        response = view(api_rf.get(f"/api/v1/wiki/?cursor={next_cursor}&limit=2"))
+        assert [page["id"] for page in response.data["pages"]] == [pages[2].id, pages[1].id]
+
+        response = view(api_rf.get(f"/api/v1/wiki/?cursor={response.data['next']}&limit=2"))
+        assert [page["id"] for page in response.data["pages"]] == [pages[0].id]
+        assert response.data["next"] is None
+        assert 'rel="next"' not in response.headers["Link"]
+
+    def test_list_cursor_keeps_filters(self, api_rf: APIRequestFactory, grandchild_page: Page):
+        make_page(title="Elsewhere", slug="elsewhere")
+        view = PageViewSet.as_view({"get": "list"})
+        response = view(api_rf.get("/api/v1/wiki/?under=parent&cursor=&limit=1"))
+        assert [page["id"] for page in response.data["pages"]] == [grandchild_page.id]
+        assert "under=parent" in response.headers["Link"]
+        response = view(api_rf.get(f"/api/v1/wiki/?under=parent&cursor={response.data['next']}&limit=1"))
+        assert [page["id"] for page in response.data["pages"]] == [grandchild_page.parent.id]
+        assert response.data["next"] is None
+
+    def test_list_cursor_estimate(self, api_rf: APIRequestFactory, page: Page):
+        view = PageViewSet.as_view({"get": "list"})
+        response = view(api_rf.get("/api/v1/wiki/?cursor=&estimate=true"))
+        assert isinstance(response.data["estimated_total"], int)
+
+    def test_list_cursor_invalid(self, api_rf: APIRequestFactory, page: Page):
+        view = PageViewSet.as_view({"get": "list"})
+        response = view(api_rf.get("/api/v1/wiki/?cursor=not-a-cursor"))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_cursor_search(self, api_rf: APIRequestFactory, page: Page):
+        view = PageViewSet.as_view({"get": "list"})
+        response = view(api_rf.get("/api/v1/wiki/?query=lorem&cursor="))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_list_cursor_queries(self, api_rf: APIRequestFactory, user):
+        view = PageViewSet.as_view({"get": "list"})
+        pages = [make_page(title=f"Page {i}", user=user) for i in range(5)]
+        cursor = WikiPagination.encode_cursor(pages[3].pk)
+        request = api_rf.get(f"/api/v1/wiki/?cursor={cursor}&limit=2")
+        with CaptureQueriesContext(connection) as context:
+            response = view(request)
+        assert [page["id"] for page in response.data["pages"]] == [pages[2].id, pages[1].id]
+        sql = [query["sql"] for query in context.captured_queries]
+        assert len(sql) == 1
+        assert "OFFSET" not in sql[0]
+        assert "COUNT" not in sql[0]
+
     def test_list_title_query(self, api_rf: APIRequestFactory, page: Page):
         view = PageViewSet.as_view({"get": "list"})
         request = api_rf.get(f"/api/v1/wiki/?query={quote(page.title[:5])}")
@@ -85,6 +154,41 @@ class TestPageViewSet:
         assert response.data["total"] == 1
         assert response.data["pages"][0]["id"] == page.id
 
+    def test_list_body_query(self, api_rf: APIRequestFactory, user):
+        page = make_page(user=user, title="Harbour", slug="harbour", body="Salt & dragon fire.")
+        view = PageViewSet.as_view({"get": "list"})
+        request = api_rf.get("/api/v1/wiki/?query=dragon")
+        response = view(request)
+        assert response.data["total"] == 1
+        assert response.data["pages"][0]["id"] == page.id
+        assert response.data["pages"][0]["headline"] == "Salt &amp; <mark>dragon</mark> fire."
+
+    def test_list_without_query_has_no_headline(self, api_rf: APIRequestFactory, page: Page):
+        view = PageViewSet.as_view({"get": "list"})
+        response = view(api_rf.get("/api/v1/wiki/"))
+        assert "headline" not in response.data["pages"][0]
+
+    def test_list_query_permissions(self, api_rf: APIRequestFactory, user, other):
+        make_page(user=user, title="Hidden Dragon", slug="hidden", read=PermissionLevel.EDITORS_ONLY)
+        visible = make_page(user=user, title="Visible Dragon", slug="visible")
+        view = PageViewSet.as_view({"get": "list"})
+        request = api_rf.get("/api/v1/wiki/?query=dragon")
+        request.user = other
+        response = view(request)
+        assert [page["id"] for page in response.data["pages"]] == [visible.id]
+
+        request = api_rf.get("/api/v1/wiki/?query=dragon")
+        request.user = user
+        assert view(request).data["total"] == 2
+
+    def test_list_under(self, api_rf: APIRequestFactory, grandchild_page: Page):
+        view = PageViewSet.as_view({"get": "list"})
+        request = api_rf.get("/api/v1/wiki/?under=parent")
+        response = view(request)
+        assert response.data["total"] == 2
+        titles = [page["title"] for page in response.data["pages"]]
+        assert titles == [grandchild_page.title, grandchild_page.parent.title]
+
     def test_list_no_results_query(self, api_rf: APIRequestFactory, page: Page):
         view = PageViewSet.as_view({"get": "list"})
         request = api_rf.get("/api/v1/wiki/?query=nope")
@@ -111,6 +215,24 @@ class TestPageViewSet:
         assert response.data["total"] == count
         assert actual == expected
 
+    def test_list_query_count_constant(self, api_rf: APIRequestFactory, user):
+        view = PageViewSet.as_view({"get": "list"})
+
+        def count_queries():
+            request = api_rf.get("/api/v1/wiki/")
+            request.user = user
+            with CaptureQueriesContext(connection) as context:
+                response = view(request)
+            assert response.status_code == status.HTTP_200_OK
+            return len(context.captured_queries)
+
+        for i in range(3):
+            make_page(title=f"Editors Only {i}", read=PermissionLevel.EDITORS_ONLY, user=user)
+        before = count_queries()
+        for i in range(3, 10):
+            make_page(title=f"Editors Only {i}", read=PermissionLevel.EDITORS_ONLY, user=user)
+        assert count_queries() == before
+
     def test_retrieve_page(self, api_rf: APIRequestFactory, page: Page):
         view = PageViewSet.as_view({"get": "retrieve"})
         request = api_rf.get(f"/api/v1/wiki/{page.slug}")
@@ -127,6 +249,71 @@ class TestPageViewSet:
         assert response.data["title"] == grandchild_page.title
         assert "parent" in response.data
 
+    def test_retrieve_validators(self, api_rf: APIRequestFactory, page: Page):
+        view = PageViewSet.as_view({"get": "retrieve"})
+        response = view(api_rf.get(f"/api/v1/wiki/{page.slug}"), slug=page.slug)
+        history = page.history.first()
+        assert response["ETag"] == f'"{page.pk}.{history.history_id}"'
+        assert response["Last-Modified"] == http_date(history.history_date.timestamp())
+        assert "Cache-Control" not in response
+
+    def test_retrieve_not_modified(self, api_rf: APIRequestFactory, page: Page, monkeypatch):
+        view = PageViewSet.as_view({"get": "retrieve"})
+        etag = view(api_rf.get(f"/api/v1/wiki/{page.slug}"), slug=page.slug)["ETag"]
+
+        def fail(*args, **kwargs):
+            raise AssertionError("serialized a 304")
+
+        monkeypatch.setattr(PageSerializer, "to_representation", fail)
+        request = api_rf.get(f"/api/v1/wiki/{page.slug}", HTTP_IF_NONE_MATCH=etag)
+        with CaptureQueriesContext(connection) as context:
+            response = view(request, slug=page.slug)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+        assert response.content == b""
+        assert len(context.captured_queries) == 2
+
+    def test_retrieve_if_modified_since(self, api_rf: APIRequestFactory, page: Page):
+        view = PageViewSet.as_view({"get": "retrieve"})
+        last_modified = view(api_rf.get(f"/api/v1/wiki/{page.slug}"), slug=page.slug)["Last-Modified"]
+        request = api_rf.get(f"/api/v1/wiki/{page.slug}", HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert view(request, slug=page.slug).status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_retrieve_modified_after_update(self, api_rf: APIRequestFactory, user, page: Page):
+        view = PageViewSet.as_view({"get": "retrieve"})
+        etag = view(api_rf.get(f"/api/v1/wiki/{page.slug}"), slug=page.slug)["ETag"]
+        page.update(editor=user, message="Edit", body="New body")
+        request = api_rf.get(f"/api/v1/wiki/{page.slug}", HTTP_IF_NONE_MATCH=etag)
+        response = view(request, slug=page.slug)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["body"] == "New body"
+        assert response["ETag"] != etag
+
+    def test_retrieve_private_etag(self, api_rf: APIRequestFactory, user, other, admin):
+        page = make_page(user=user, read=PermissionLevel.MEMBERS_ONLY)
+        view = PageViewSet.as_view({"get": "retrieve"})
+        etags = []
+        for reader in [user, other, admin]:
+            request = api_rf.get(f"/api/v1/wiki/{page.slug}")
+            request.user = reader
+            response = view(request, slug=page.slug)
+            assert response["Cache-Control"] == "private"
+            etags.append(response["ETag"])
+        assert len(set(etags)) == 3
+
+        request = api_rf.get(f"/api/v1/wiki/{page.slug}", HTTP_IF_NONE_MATCH=etags[0])
+        request.user = other
+        assert view(request, slug=page.slug).status_code == status.HTTP_200_OK
+
+    def test_retrieve_not_modified_requires_permission(self, api_rf: APIRequestFactory, user):
+        page = make_page(user=user, read=PermissionLevel.MEMBERS_ONLY)
+        view = PageViewSet.as_view({"get": "retrieve"})
+        request = api_rf.get(f"/api/v1/wiki/{page.slug}")
+        request.user = user
+        etag = view(request, slug=page.slug)["ETag"]
+        response = view(api_rf.get(f"/api/v1/wiki/{page.slug}", HTTP_IF_NONE_MATCH=etag), slug=page.slug)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
     def test_retrieve_404(self, api_rf: APIRequestFactory):
         view = PageViewSet.as_view({"get": "retrieve"})
         request = api_rf.get("/api/v1/wiki/nope")
@@ -174,3 +361,224 @@ class TestPageViewSet:
         else:
             assert isinstance(response.data["detail"], str)
             assert "title" not in response.data
+
+    def test_subtree(self, api_rf: APIRequestFactory, user, grandchild_page: Page):
+        root = grandchild_page.parent.parent
+        view = PageViewSet.as_view({"get": "subtree"})
+        request = api_rf.get(f"/api/v1/wiki/{root.slug}/subtree/")
+        response = view(request, slug=root.slug)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["total"] == 3
+        assert [page["title"] for page in response.data["pages"]] == [
+            root.title,
+            grandchild_page.parent.title,
+            grandchild_page.title,
+        ]
+        assert [page["depth"] for page in response.data["pages"]] == [0, 1, 2]
+
+    def test_nested_page_routes(self, client, grandchild_page: Page):
+        child = grandchild_page.parent
+        assert "/" in child.slug
+        subtree = client.get(f"/api/v1/wiki/{child.slug}/subtree/")
+        assert subtree.status_code == status.HTTP_200_OK
+        assert [page["title"] for page in subtree.json()["pages"]] == [child.title, grandchild_page.title]
+        assert client.get(f"/api/v1/wiki/{child.slug}/history/").json()["total"] == 1
+        assert client.get(f"/api/v1/wiki/{child.slug}/diff/").status_code == status.HTTP_200_OK
+        assert client.get(f"/api/v1/wiki/{grandchild_page.slug}/").json()["title"] == grandchild_page.title
+
+    def test_subtree_permissions(self, api_rf: APIRequestFactory, user, child_page: Page):
+        make_page(user=user, title="Hidden", slug="hidden", parent=child_page, read=PermissionLevel.EDITORS_ONLY)
+        view = PageViewSet.as_view({"get": "subtree"})
+        request = api_rf.get(f"/api/v1/wiki/{child_page.parent.slug}/subtree/")
+        response = view(request, slug=child_page.parent.slug)
+        assert [page["title"] for page in response.data["pages"]] == [child_page.parent.title, child_page.title]
+
+    def test_subtree_cursor(self, api_rf: APIRequestFactory, grandchild_page: Page):
+        root = grandchild_page.parent.parent
+        view = PageViewSet.as_view({"get": "subtree"})
+        response = view(api_rf.get(f"/api/v1/wiki/{root.slug}/subtree/?cursor=&limit=1"), slug=root.slug)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_list_cursor_tree_fields(self, api_rf: APIRequestFactory, page: Page):
+        request = Request(api_rf.get("/api/v1/wiki/?cursor="))
+        with pytest.raises(ParseError):
+            WikiPagination().paginate_queryset(Page.objects.with_tree_fields().order_by("-pk"), request)
+
+    def test_subtree_404(self, api_rf: APIRequestFactory):
+        view = PageViewSet.as_view({"get": "subtree"})
+        request = api_rf.get("/api/v1/wiki/nope/subtree/")
+        response = view(request, slug="nope")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_subtree_unauthorized(self, api_rf: APIRequestFactory, user):
+        root = make_page(user=user, title="Secret", slug="secret", read=PermissionLevel.MEMBERS_ONLY)
+        view = PageViewSet.as_view({"get": "subtree"})
+        request = api_rf.get(f"/api/v1/wiki/{root.slug}/subtree/")
+        response = view(request, slug=root.slug)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_subtree_query_count_constant(self, api_rf: APIRequestFactory, user):
+        root = make_page(user=user, title="Root", slug="root")
+        view = PageViewSet.as_view({"get": "subtree"})
+
+        def count_queries():
+            request = api_rf.get(f"/api/v1/wiki/{root.slug}/subtree/")
+            request.user = user
+            with CaptureQueriesContext(connection) as context:
+                response = view(request, slug=root.slug)
+            assert response.status_code == status.HTTP_200_OK
+            return len(context.captured_queries)
+
+        parent = make_page(user=user, title="Branch", slug="branch", parent=root)
+        before = count_queries()
+        for i in range(5):
+            parent = make_page(user=user, title=f"Level {i}", slug=f"level-{i}", parent=parent)
+        assert count_queries() == before
+
+    def test_autocomplete(self, api_rf: APIRequestFactory, user):
+        page = make_page(user=user, title="Dragons", slug="dragons")
+        make_page(user=user, title="Griffin", slug="griffin")
+        view = PageViewSet.as_view({"get": "autocomplete"})
+        response = view(api_rf.get("/api/v1/wiki/autocomplete/?q=drag"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"query": "drag", "pages": [{"id": page.id, "title": "Dragons", "slug": "dragons"}]}
+
+    def test_autocomplete_permissions(self, api_rf: APIRequestFactory, user, other):
+        make_page(user=user, title="Dragon Lair", slug="lair", read=PermissionLevel.EDITORS_ONLY)
+        visible = make_page(user=user, title="Dragon Hoard", slug="hoard")
+        view = PageViewSet.as_view({"get": "autocomplete"})
+        request = api_rf.get("/api/v1/wiki/autocomplete/?q=dragon")
+        request.user = other
+        assert [page["id"] for page in view(request).data["pages"]] == [visible.id]
+
+    def test_autocomplete_limit(self, api_rf: APIRequestFactory, user, settings):
+        settings.WIKI_AUTOCOMPLETE_LIMIT = 3
+        for i in range(5):
+            make_page(user=user, title=f"Dragon {i}", slug=f"dragon-{i}")
+        view = PageViewSet.as_view({"get": "autocomplete"})
+        response = view(api_rf.get("/api/v1/wiki/autocomplete/?q=dragon"))
+        assert [page["title"] for page in response.data["pages"]] == ["Dragon 0", "Dragon 1", "Dragon 2"]
+
+    def test_autocomplete_empty(self, api_rf: APIRequestFactory, page: Page):
+        view = PageViewSet.as_view({"get": "autocomplete"})
+        assert view(api_rf.get("/api/v1/wiki/autocomplete/")).data["pages"] == []
+
+    def test_export(self, api_rf: APIRequestFactory, user):
+        parent = make_page(user=user, title="Region", slug="region", body="A region.")
+        child = make_page(user=user, title="City", slug="city", parent=parent)
+        view = PageViewSet.as_view({"get": "export"})
+        response = view(api_rf.get("/api/v1/wiki/export/"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response["Content-Type"] == "application/x-ndjson"
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        assert records == [
+            {
+                "id": parent.id,
+                "type": "page",
+                "title": "Region",
+                "slug": "region",
+                "body": "A region.",
+                "read": "Public",
+                "write": "Public",
+            },
+            {
+                "id": child.id,
+                "type": "page",
+                "title": "City",
+                "slug": "region/city",
+                "body": child.body,
+                "read": "Public",
+                "write": "Public",
+                "parent": "region",
+            },
+        ]
+
+    def test_export_permissions(self, api_rf: APIRequestFactory, user, other):
+        make_page(user=user, title="Lair", slug="lair", read=PermissionLevel.EDITORS_ONLY)
+        visible = make_page(user=user, title="Hoard", slug="hoard")
+        view = PageViewSet.as_view({"get": "export"})
+        request = api_rf.get("/api/v1/wiki/export/")
+        request.user = other
+        records = [json.loads(line) for line in b"".join(view(request).streaming_content).splitlines()]
+        assert [record["id"] for record in records] == [visible.id]
+
+    def test_export_history(self, api_rf: APIRequestFactory, user):
+        page = make_page(user=user, title="Original", slug="page")
+        page.update(editor=user, title="Updated", message="Rename")
+        view = PageViewSet.as_view({"get": "export"})
+        response = view(api_rf.get("/api/v1/wiki/export/?history=true"))
+        (record,) = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        assert [(revision["title"], revision["message"]) for revision in record["history"]] == [
+            ("Original", "Initial text"),
+            ("Updated", "Rename"),
+        ]
+        assert record["history"][0]["user"] == user.username
+
+    def test_history(self, api_rf: APIRequestFactory, user, other):
+        page = make_page(user=user, title="Original", slug="page")
+        page.update(editor=other, title="Renamed", message="Rename")
+        view = PageViewSet.as_view({"get": "history"})
+        response = view(api_rf.get("/api/v1/wiki/page/history/"), slug="page")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["total"] == 2
+        assert [
+            (revision["type"], revision["editor"], revision["message"], revision["title"])
+            for revision in response.data["revisions"]
+        ] == [("changed", other.username, "Rename", "Renamed"), ("created", user.username, "Initial text", "Original")]
+
+    def test_history_cursor(self, api_rf: APIRequestFactory, user):
+        page = make_page(user=user, title="Page", slug="page")
+        for n in range(3):
+            page.update(editor=user, title=f"Page {n}", message=f"Edit {n}")
+        view = PageViewSet.as_view({"get": "history"})
+        response = view(api_rf.get("/api/v1/wiki/page/history/?cursor=&limit=2"), slug="page")
+        assert [revision["message"] for revision in response.data["revisions"]] == ["Edit 2", "Edit 1"]
+        response = view(api_rf.get(f"/api/v1/wiki/page/history/?cursor={response.data['next']}&limit=2"), slug="page")
+        assert [revision["message"] for revision in response.data["revisions"]] == ["Edit 0", "Initial text"]
+
+    def test_history_unauthorized(self, api_rf: APIRequestFactory, user):
+        make_page(user=user, title="Secret", slug="secret", read=PermissionLevel.MEMBERS_ONLY)
+        view = PageViewSet.as_view({"get": "history"})
+        response = view(api_rf.get("/api/v1/wiki/secret/history/"), slug="secret")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_diff(self, api_rf: APIRequestFactory, user):
+        page = make_page(user=user, title="Page", slug="page", body="One\nTwo\nThree")
+        page.update(editor=user, body="One\n2\nThree", message="Numbers")
+        first, second = page.history.order_by("pk").values_list("pk", flat=True)
+        view = PageViewSet.as_view({"get": "diff"})
+        response = view(api_rf.get(f"/api/v1/wiki/page/diff/?from={first}&to={second}"), slug="page")
+        assert response.status_code == status.HTTP_200_OK
+        assert (response.data["from"]["id"], response.data["to"]["id"]) == (first, second)
+        assert response.data["to"]["message"] == "Numbers"
+        assert (response.data["added"], response.data["removed"]) == (1, 1)
+        assert response.data["hunks"][0]["lines"] == [" One", "-Two", "+2", " Three"]
+
+        latest = view(api_rf.get("/api/v1/wiki/page/diff/"), slug="page")
+        assert (latest.data["from"]["id"], latest.data["to"]["id"]) == (first, second)
+        created = view(api_rf.get(f"/api/v1/wiki/page/diff/?to={first}"), slug="page")
+        assert created.data["from"] is None
+        assert created.data["added"] == 3
+
+    def test_diff_cached(self, api_rf: APIRequestFactory, user):
+        page = make_page(user=user, title="Page", slug="page", body="One\nTwo")
+        page.update(editor=user, body="One\nTwo\nThree", message="Three")
+        first, second = page.history.order_by("pk").values_list("pk", flat=True)
+        view = PageViewSet.as_view({"get": "diff"})
+        url = f"/api/v1/wiki/page/diff/?from={first}&to={second}"
+        with CaptureQueriesContext(connection) as uncached:
+            expected = view(api_rf.get(url), slug="page").data
+        with CaptureQueriesContext(connection) as cached:
+            assert view(api_rf.get(url), slug="page").data == expected
+        assert len(cached) == len(uncached) - 1
+
+    def test_diff_invalid(self, api_rf: APIRequestFactory, user):
+        make_page(user=user, title="Page", slug="page")
+        other = make_page(user=user, title="Other", slug="other")
+        view = PageViewSet.as_view({"get": "diff"})
+        foreign = other.history.values_list("pk", flat=True).first()
+        response = view(api_rf.get(f"/api/v1/wiki/page/diff/?to={foreign}"), slug="page")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        response = view(api_rf.get("/api/v1/wiki/page/diff/?from=abc"), slug="page")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -1,8 +1,11 @@
 import pytest
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.utils import timezone
 from slugify import slugify
 
 from scarletbanner.wiki.enums import PermissionLevel
@@ -12,11 +15,13 @@ from scarletbanner.wiki.models import (
     Image,
     OwnedPage,
     Page,
+    PageEditor,
     Secret,
     SecretCategory,
     SecretEvaluator,
     Template,
 )
+from scarletbanner.wiki.search import trigram_available
 from scarletbanner.wiki.tests.factories import SecretFactory, make_character, make_owned_page, make_page
 from scarletbanner.wiki.tests.utils import isstring
 
@@ -67,6 +72,23 @@ class TestPage:
         assert page.body == updated_body
         assert page.history.first().history_change_reason == message
 
+    def test_create_query_count(self, user, page, django_assert_num_queries):
+        with django_assert_num_queries(4):
+            created = Page.create(user, "Test Page", "This is a test.", "Test")
+        assert created.history.count() == 1
+        history = created.history.first()
+        assert (history.history_type, history.history_user, history.history_change_reason) == ("+", user, "Test")
+
+    def test_update_query_count(self, user, other, page, django_assert_num_queries):
+        with django_assert_num_queries(5):
+            page.update(editor=other, title="Updated Page", message="Test")
+        with django_assert_num_queries(5):
+            page.update(editor=other, title="Updated Again", message="Again")
+        history = page.history.first()
+        assert (history.history_type, history.history_user, history.history_change_reason) == ("~", other, "Again")
+        assert PageEditor.objects.get(page=page, user=other).edit_count == 2
+        assert not hasattr(page, "_history_user")
+
     def test_patch(self, user, page):
         updated_title = "Updated Page"
         message = "Test patching"
@@ -138,6 +160,222 @@ class TestPage:
         assert grandchild_page.parent == grandparent
         assert grandchild_page.slug == "parent/grandchild"
 
+    def test_destroy_history(self, other, grandchild_page):
+        child = grandchild_page.parent
+        child.parent.destroy(other)
+        assert child.history.first().history_change_reason == "Reparenting to root"
+        assert child.history.first().history_user == other
+        assert grandchild_page.history.first().history_change_reason == "Reparenting to child"
+        assert grandchild_page.history.first().slug == "child/grandchild"
+        assert other in grandchild_page.editors
+
+    def test_destroy_unique_slug(self, user, grandchild_page):
+        make_page(user=user, title="Child", slug="child")
+        grandparent = grandchild_page.parent.parent
+        with pytest.raises(ValueError):
+            grandparent.destroy(user)
+        assert Page.objects.filter(pk=grandparent.pk).exists()
+        grandchild_page.refresh_from_db()
+        assert grandchild_page.slug == "parent/child/grandchild"
+
+    def test_destroy_progress(self, user, settings, grandchild_page):
+        settings.WIKI_DESTROY_BATCH_SIZE = 1
+        make_page(user=user, title="Sibling", slug="sibling", parent=grandchild_page.parent.parent)
+        calls = []
+        assert grandchild_page.parent.parent.destroy(user, progress=lambda *args: calls.append(args)) == 3
+        assert calls == [(1, 3), (2, 3), (3, 3)]
+
+    @pytest.mark.parametrize("batch_size", [1, 1000])
+    def test_destroy_rewrite_order(self, user, settings, batch_size):
+        settings.WIKI_DESTROY_BATCH_SIZE = batch_size
+        root = make_page(user=user, title="A", slug="a")
+        inner = make_page(user=user, title="A", slug="a", parent=root)
+        make_page(user=user, title="X", slug="x", parent=root)
+        make_page(user=user, title="X", slug="x", parent=inner)
+        root.destroy(user)
+        assert sorted(Page.objects.values_list("slug", flat=True)) == ["a", "a/x", "x"]
+        assert Page.objects.get(slug="a/x").parent.slug == "a"
+
+    def test_destroy_query_count(self, user, django_assert_max_num_queries):
+        root = make_page(user=user, title="Root", slug="root")
+        for i in range(5):
+            branch = make_page(user=user, title=f"Branch {i}", slug=f"branch-{i}", parent=root)
+            for j in range(5):
+                make_page(user=user, title=f"Leaf {i} {j}", slug=f"leaf-{i}-{j}", parent=branch)
+        with django_assert_max_num_queries(20):
+            root.destroy(user)
+        assert Page.objects.filter(slug__startswith="branch-").count() == 30
+
+    def test_reparent(self, user, grandchild_page):
+        target = make_page(user=user, title="Target", slug="target")
+        child = grandchild_page.parent
+        child.reparent(user, target)
+        grandchild_page.refresh_from_db()
+        assert child.slug == "target/child"
+        assert Page.objects.get(pk=child.pk).parent == target
+        assert grandchild_page.slug == "target/child/grandchild"
+        assert grandchild_page.parent == child
+
+    def test_reparent_to_root(self, user, grandchild_page):
+        grandchild_page.parent.reparent(user)
+        grandchild_page.refresh_from_db()
+        assert grandchild_page.parent.parent is None
+        assert grandchild_page.parent.slug == "child"
+        assert grandchild_page.slug == "child/grandchild"
+
+    def test_reparent_history(self, user, other, grandchild_page):
+        grandchild_page.parent.reparent(other)
+        history = grandchild_page.history.first()
+        assert history.history_change_reason == "Reparenting to child"
+        assert history.history_user == other
+        assert history.slug == "child/grandchild"
+        assert other in grandchild_page.editors
+
+    def test_reparent_subclass_history(self, user, child_page):
+        character = make_character(user=user, title="Character", slug="character", parent=child_page)
+        child_page.reparent(user)
+        assert character.history.first().slug == "child/character"
+        assert character.history.first().history_change_reason == "Reparenting to child"
+
+    def test_reparent_permission(self, user, other, grandchild_page):
+        child = grandchild_page.parent
+        child.update(editor=user, message="Lock", write=PermissionLevel.EDITORS_ONLY)
+        before = child.history.count()
+        child.parent.reparent(other)
+        child.refresh_from_db()
+        grandchild_page.refresh_from_db()
+        assert child.slug == "parent/child"
+        assert child.history.count() == before
+        assert grandchild_page.slug == "parent/child/grandchild"
+
+    def test_reparent_beneath_itself(self, user, grandchild_page):
+        with pytest.raises(ValueError):
+            grandchild_page.parent.parent.reparent(user, grandchild_page)
+
+    def test_reparent_unique_slug(self, user, grandchild_page):
+        make_page(user=user, title="Child", slug="child")
+        before = grandchild_page.history.count()
+        with pytest.raises(ValueError):
+            grandchild_page.parent.reparent(user)
+        grandchild_page.refresh_from_db()
+        assert grandchild_page.slug == "parent/child/grandchild"
+        assert grandchild_page.history.count() == before
+
+    def test_reparent_query_count(self, user, django_assert_max_num_queries):
+        target = make_page(user=user, title="Target", slug="target")
+        root = make_page(user=user, title="Root", slug="root")
+        for i in range(5):
+            branch = make_page(user=user, title=f"Branch {i}", slug=f"branch-{i}", parent=root)
+            for j in range(5):
+                make_page(user=user, title=f"Leaf {i} {j}", slug=f"leaf-{i}-{j}", parent=branch)
+        with django_assert_max_num_queries(10):
+            root.reparent(user, target)
+        assert Page.objects.filter(slug__startswith="target/root/").count() == 30
+
+    def test_ancestors(self, grandchild_page):
+        child = grandchild_page.parent
+        assert list(grandchild_page.ancestors()) == [child.parent, child]
+        assert list(grandchild_page.ancestors(include_self=True)) == [child.parent, child, grandchild_page]
+        assert list(child.parent.ancestors()) == []
+
+    def test_descendants(self, user, grandchild_page):
+        root = grandchild_page.parent.parent
+        sibling = make_page(user=user, title="Sibling", slug="sibling", parent=root)
+        descendants = list(root.descendants(include_self=True))
+        assert descendants[0] == root
+        assert set(descendants) == {root, grandchild_page.parent, grandchild_page, sibling}
+        assert descendants.index(grandchild_page) == descendants.index(grandchild_page.parent) + 1
+        assert list(grandchild_page.descendants()) == []
+
+    def test_descendants_polymorphic(self, user, child_page):
+        character = make_character(user=user, title="Character", slug="character", parent=child_page)
+        assert isinstance(child_page.parent.descendants().get(pk=character.pk), Character)
+
+    def test_depth(self, grandchild_page):
+        assert grandchild_page.depth == 2
+        assert grandchild_page.parent.parent.depth == 0
+        assert [page.tree_depth for page in grandchild_page.ancestors(include_self=True)] == [0, 1, 2]
+
+    def test_depth_after_move(self, user, grandchild_page):
+        target = make_page(user=user, title="Target", slug="target")
+        assert grandchild_page.depth == 2
+        grandchild_page.update(editor=user, message="Move", parent=target)
+        assert grandchild_page.depth == 1
+
+    def test_under(self, user, grandchild_page):
+        make_page(user=user, title="Parental", slug="parental")
+        child = grandchild_page.parent
+        assert set(Page.objects.under("parent")) == {child, grandchild_page}
+        assert set(Page.objects.under("parent/", include_self=True)) == {child.parent, child, grandchild_page}
+        assert list(Page.objects.under("parent/child")) == [grandchild_page]
+        assert not Page.objects.under("parent/child/grandchild").exists()
+
+    def test_under_escapes_wildcards(self, user):
+        make_page(user=user, title="Section", slug="a_b")
+        make_page(user=user, title="Other", slug="axb/page")
+        assert not Page.objects.under("a_b").exists()
+
+    def test_under_uses_slug_index(self, grandchild_page):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = Page.objects.under("parent").explain()
+        assert "Index" in plan
+        assert "Seq Scan" not in plan
+
+    def test_search(self, user):
+        in_body = make_page(user=user, title="Harbour", slug="harbour", body="The dragon sleeps beneath the harbour.")
+        in_title = make_page(user=user, title="Dragons", slug="dragons", body="Large and scaly.")
+        make_page(user=user, title="Unrelated", slug="unrelated", body="Nothing here.")
+        assert list(Page.objects.search("dragon")) == [in_title, in_body]
+
+    def test_search_stems_body(self, user):
+        page = make_page(user=user, title="Chase", slug="chase", body="The guards were running after him.")
+        assert list(Page.objects.search("runs")) == [page]
+
+    def test_search_matches_path(self, user):
+        parent = make_page(user=user, title="Parent Page", slug="parent", body="Top.")
+        child = make_page(user=user, title="Child Page", slug="child", parent=parent, body="Below.")
+        assert list(Page.objects.search("parent child")) == [child]
+
+    def test_search_empty(self, page):
+        assert not Page.objects.search("?!").exists()
+
+    def test_search_subclass(self, user):
+        character = make_character(user=user, title="Aldric", slug="aldric", body="A knight of the banner.")
+        result = Page.objects.search("knight").get()
+        assert isinstance(result, Character)
+        assert result.pk == character.pk
+        assert "\x02knight\x03" in result.headline
+
+    def test_search_uses_index(self, page):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        assert "page_search_vector" in Page.objects.search("anything").explain()
+
+    def test_search_vector_not_loaded(self, page):
+        assert "search_vector" in Page.objects.get(pk=page.pk).get_deferred_fields()
+
+    def test_autocomplete(self, user):
+        contains = make_page(user=user, title="Red Dragon", slug="red-dragon")
+        starts = make_page(user=user, title="Dragons", slug="dragons")
+        make_page(user=user, title="Griffin", slug="griffin")
+        assert list(Page.objects.autocomplete(" drag ")) == [starts, contains]
+
+    def test_autocomplete_empty(self, page):
+        assert not Page.objects.autocomplete("  ").exists()
+
+    def test_autocomplete_fuzzy(self, user):
+        if not trigram_available():
+            pytest.skip("pg_trgm is not installed")
+        page = make_page(user=user, title="Dragons", slug="dragons")
+        assert list(Page.objects.autocomplete("dargons")) == [page]
+
+    def test_set_slug_cycle(self, grandchild_page):
+        root = grandchild_page.parent.parent
+        root.parent = grandchild_page
+        with pytest.raises(ValueError, match="beneath itself"):
+            root.set_slug()
+
     def test_editors(self, user, other, page):
         page.update(other, "Updated Page", "This is a test.", "Test")
         assert page.editors.count() == 2
@@ -181,6 +419,21 @@ class TestPage:
         )
         assert page.can_read(reader) == expected
 
+    @pytest.mark.parametrize("reader_fixture", [None, "anonymous", "other", "user", "admin"])
+    def test_readable_by(self, request, reader_fixture, user, list_pages):
+        reader = (
+            None
+            if reader_fixture is None
+            else AnonymousUser()
+            if reader_fixture == "anonymous"
+            else user
+            if reader_fixture == "user"
+            else request.getfixturevalue(reader_fixture)
+        )
+        expected = {page.pk for page in list_pages if page.can_read(reader)}
+        actual = set(Page.objects.readable_by(reader).values_list("pk", flat=True))
+        assert actual == expected
+
     @pytest.mark.parametrize(
         "before, after, reader_fixture, expected",
         [
@@ -281,6 +534,42 @@ class TestPage:
         assert page.can_write(after, reader) == expected
 
 
+@pytest.mark.django_db
+class TestPageEditor:
+    def test_create(self, user, page):
+        editor = PageEditor.objects.get(page=page, user=user)
+        assert editor.edit_count == 1
+        assert editor.first_edit == editor.last_edit == page.history.first().history_date
+
+    def test_update(self, user, other, page):
+        page.update(editor=user, title="Updated Page", message="Test")
+        page.update(editor=other, title="Updated Again", message="Test")
+        editor = PageEditor.objects.get(page=page, user=user)
+        assert editor.edit_count == 2
+        assert editor.last_edit > editor.first_edit
+        assert PageEditor.objects.get(page=page, user=other).edit_count == 1
+        assert list(page.editors) == [user, other]
+
+    def test_record_many(self, user, other, page):
+        second = make_page(user=other)
+        timestamp = timezone.now()
+        PageEditor.record_many([page, second, second], user, timestamp)
+        assert PageEditor.objects.get(page=page, user=user).edit_count == 2
+        editor = PageEditor.objects.get(page=second, user=user)
+        assert editor.edit_count == 1
+        assert editor.first_edit == editor.last_edit == timestamp
+
+    def test_is_editor(self, user, other, page):
+        assert page.is_editor(user)
+        assert not page.is_editor(other)
+        assert not page.is_editor(AnonymousUser())
+        assert not page.is_editor(None)
+
+    def test_is_editor_query_count(self, user, page, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            page.is_editor(user)
+
+
 @pytest.mark.django_db
 class TestOwnedPage:
     def test_create(self, owned_page):
@@ -316,6 +605,39 @@ class TestOwnedPage:
         )
         assert page.can_read(reader) == expected
 
+    @pytest.mark.parametrize(
+        "permission, reader_fixture, expected",
+        [
+            (PermissionLevel.EDITORS_ONLY, None, False),
+            (PermissionLevel.EDITORS_ONLY, "anonymous", False),
+            (PermissionLevel.EDITORS_ONLY, "other", False),
+            (PermissionLevel.EDITORS_ONLY, "user", True),
+            (PermissionLevel.EDITORS_ONLY, "owner", True),
+            (PermissionLevel.EDITORS_ONLY, "admin", True),
+            (PermissionLevel.OWNER_ONLY, None, False),
+            (PermissionLevel.OWNER_ONLY, "anonymous", False),
+            (PermissionLevel.OWNER_ONLY, "other", False),
+            (PermissionLevel.OWNER_ONLY, "user", False),
+            (PermissionLevel.OWNER_ONLY, "owner", True),
+            (PermissionLevel.OWNER_ONLY, "admin", True),
+        ],
+    )
+    def test_readable_by(self, request, permission, reader_fixture, expected, user, owner):
+        page = make_owned_page(user=user, owner=owner, read=permission)
+        reader = (
+            None
+            if reader_fixture is None
+            else AnonymousUser()
+            if reader_fixture == "anonymous"
+            else user
+            if reader_fixture == "user"
+            else page.owner
+            if reader_fixture == "owner"
+            else request.getfixturevalue(reader_fixture)
+        )
+        assert Page.objects.readable_by(reader).filter(pk=page.pk).exists() == expected
+        assert page.can_read(reader) == expected
+
     @pytest.mark.parametrize(
         "before, after, reader_fixture, expected",
         [
@@ -475,6 +797,12 @@ class TestSecret:
         assert secret.knows(secret.known_to.first())
         assert not secret.knows(fool)
 
+    def test_shared_secrets(self):
+        _, alice, bob, charlie = TestSecretEvaluator.setup()
+        assert [secret.key for secret in alice.shared_secrets(bob)] == [alice.secrets_known.get().key]
+        assert not bob.shared_secrets(charlie).exists()
+        assert set(bob.shared_secrets()) == set(bob.secrets_known.all())
+
     def test_evaluate(self):
         expression, alice, bob, charlie = TestSecretEvaluator.setup()
         assert not Secret.evaluate(expression, alice)
@@ -490,6 +818,55 @@ class TestSecretEvaluator:
         assert SecretEvaluator(bob).eval(expression)
         assert SecretEvaluator(charlie).eval(expression)
 
+    def test_compile_cached(self):
+        expression, alice, bob, charlie = TestSecretEvaluator.setup()
+        SecretEvaluator.compile.cache_clear()
+        SecretEvaluator(alice).eval(expression)
+        SecretEvaluator(bob).eval(expression)
+        info = SecretEvaluator.compile.cache_info()
+        assert info.misses == 1
+        assert info.hits == 1
+
+    @pytest.mark.parametrize(
+        "expression, expected",
+        [
+            ("[S1]", True),
+            ("[S2]", False),
+            ("not [S2]", True),
+            ("[S1] and not [S2]", True),
+            ("[S1] and [S2]", False),
+            ("[S2] or [S1]", True),
+            ("S1", True),
+            ("[Two Words]", True),
+        ],
+    )
+    def test_operators(self, character, expression, expected):
+        SecretFactory(key="S1").known_to.set([character])
+        SecretFactory(key="S2")
+        SecretFactory(key="Two Words").known_to.set([character])
+        assert SecretEvaluator(character).eval(expression) == expected
+
+    def test_query_count(self, character, django_assert_num_queries, django_capture_on_commit_callbacks):
+        secrets = [SecretFactory() for _ in range(10)]
+        with django_capture_on_commit_callbacks(execute=True):
+            character.secrets_known.set(secrets[::2])
+        with django_assert_num_queries(1):
+            evaluator = SecretEvaluator(character)
+        assert [evaluator.knowledge[secret.key] for secret in secrets] == [True, False] * 5
+        cache.clear()
+        with django_assert_num_queries(2):
+            assert SecretEvaluator(character).knowledge == evaluator.knowledge
+
+    def test_unknown_key(self, character):
+        with pytest.raises(Secret.DoesNotExist):
+            SecretEvaluator(character).eval("[Nope]")
+
+    @pytest.mark.parametrize("expression", ["[S1] +", "[S1] == 1", "__import__('os')"])
+    def test_invalid_expression(self, character, expression):
+        SecretFactory(key="S1")
+        with pytest.raises(ValueError):
+            SecretEvaluator(character).eval(expression)
+
     @staticmethod
     def setup():
         alice = make_character()
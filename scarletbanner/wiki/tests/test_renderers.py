@@ -1,9 +1,23 @@
+import threading
+import timeit
+from io import StringIO
+
 import pytest
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from django.core.management import call_command
 
+from scarletbanner.wiki import renderers
+from scarletbanner.wiki.caches import LinkCache
+from scarletbanner.wiki.models import Page
 from scarletbanner.wiki.renderers import (
+    CompiledTemplate,
+    MarkdownRenderer,
+    RenderPipeline,
     reconcile_secrets,
     render_links,
     render_markdown,
+    render_page,
     render_secrets,
     render_template_pages,
     render_templates,
@@ -28,6 +42,10 @@ class TestRenderSecrets:
         before = 'This comes before. <secret show="[Test Secret]">This is secret!</secret> This comes after.'
         assert render_secrets(before, character) == "This comes before. This is secret! This comes after."
 
+    def test_undefined_secret(self, character):
+        before = 'This comes before. <secret show="[Nope]">This is secret!</secret> This comes after.'
+        assert render_secrets(before, character) == "This comes before. This comes after."
+
     def test_nested_secrets_outer(self, character):
         s1 = SecretFactory(key="S1")
         SecretFactory(key="S2")
@@ -45,6 +63,19 @@ class TestRenderSecrets:
         after = "before inner after"
         assert render_secrets(before, character) == after
 
+    def test_query_count(self, character, django_assert_num_queries, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            for i in range(10):
+                SecretFactory(key=f"S{i}").known_to.set([character] if i % 2 else [])
+        before = " ".join(f'<secret show="[S{i}]">{i}</secret>' for i in range(10))
+        with django_assert_num_queries(1):
+            assert render_secrets(before, character) == "1 3 5 7 9"
+
+    def test_secret_in_element(self, character):
+        SecretFactory(key="S1")
+        before = '<div>Public <secret show="[S1]">not known</secret></div>'
+        assert render_secrets(before, character) == "<div>Public </div>"
+
     def test_editable(self, character):
         s1 = SecretFactory(key="S1")
         s1.known_to.set([character])
@@ -121,6 +152,99 @@ class TestRenderTemplates:
         before = '<template name="Outer Template"></template>'
         assert render_templates(before) == "Hello, world!"
 
+    def test_html_template(self):
+        make_template(title="Test Template", body="<div>{{ body }}</div>")
+        before = '<template name="Test Template"><em>Hello</em></template>'
+        assert render_templates(before) == "<div><em>Hello</em></div>"
+
+    def test_missing_template(self):
+        before = 'Before <template name="Missing"></template>After'
+        assert render_templates(before) == "Before After"
+
+    def test_missing_param(self):
+        make_template(title="Test Template", body="{{ text }} {{ other }}")
+        before = '<template name="Test Template" text="X"></template>'
+        assert render_templates(before) == "X {{ other }}"
+
+    def test_param_not_substituted_twice(self):
+        make_template(title="Test Template", body="{{ a }} {{ b }}")
+        before = '<template name="Test Template" a="{{ b }}" b="X"></template>'
+        assert render_templates(before) == "{{ b }} X"
+
+    def test_template_name_param(self):
+        make_template(title="Inner Template", body="Hello, world!")
+        make_template(title="Outer Template", body='<template name="{{ inner }}"></template>')
+        before = '<template name="Outer Template" inner="Inner Template"></template>'
+        assert render_templates(before) == "Hello, world!"
+
+    def test_duplicate_title(self):
+        first = make_page(title="Lore", slug="lore")
+        make_page(title="Lore", slug="more", parent=first)
+        make_page(title="Lore", slug="lore-2")
+        assert render_links("[[Lore]]") == '<a href="/wiki/lore/">Lore</a>'
+
+    def test_batched(self, django_assert_num_queries):
+        make_template(title="Leaf", body="x")
+        make_template(title="Branch", body='<template name="Leaf"></template><template name="Leaf"></template>')
+        make_template(title="Trunk", body='<template name="Branch"></template><template name="Branch"></template>')
+        before = "".join(f'<template name="{name}"></template>' for name in ("Trunk", "Branch", "Missing"))
+        with django_assert_num_queries(2):
+            assert render_templates(before) == "xxxxxx"
+
+    def test_compiled_once(self):
+        make_template(title="Test Template", body="<b>{{ text }}</b>")
+        CompiledTemplate.compile.cache_clear()
+        render_templates('<template name="Test Template" text="1"></template>')
+        render_templates('<template name="Test Template" text="2"></template>')
+        info = CompiledTemplate.compile.cache_info()
+        assert (info.hits, info.misses) == (1, 1)
+        assert CompiledTemplate.compile("<b>{{ text }}</b>").placeholders == {"text"}
+
+    def test_template_in_body(self):
+        make_template(title="Box", body="<div>{{ body }}</div>")
+        make_template(title="Leaf", body="x")
+        before = '<template name="Box"><template name="Leaf"></template></template><template name="Leaf"></template>'
+        assert render_templates(before) == "<div>x</div>x"
+
+    def test_scanned_once(self, monkeypatch):
+        make_template(title="Leaf", body="<b>x</b>")
+        scans = []
+        find_all = Tag.find_all
+
+        def counting_find_all(self, name=None, *args, **kwargs):
+            if name == "template":
+                scans.append(name)
+            return find_all(self, name, *args, **kwargs)
+
+        monkeypatch.setattr(Tag, "find_all", counting_find_all)
+        assert render_templates('<template name="Leaf"></template>' * 200) == "<b>x</b>" * 200
+        assert len(scans) == 1 + 200
+
+    def test_self_reference(self):
+        make_template(title="Loop", body='Hello <template name="Loop"></template>')
+        before = '<template name="Loop"></template>'
+        assert render_templates(before) == "Hello"
+
+    def test_cycle(self):
+        make_template(title="A", body='A<template name="B"></template>')
+        make_template(title="B", body='B<template name="A"></template>')
+        before = '<template name="A"></template> <template name="B"></template>'
+        assert render_templates(before) == "AB BA"
+
+    def test_depth_limit(self, settings):
+        settings.WIKI_TEMPLATE_MAX_DEPTH = 2
+        for i in range(4):
+            make_template(title=f"T{i}", body=f'{i}<template name="T{i + 1}"></template>')
+        assert render_templates('<template name="T0"></template>') == "01"
+
+    def test_output_limit(self, settings):
+        settings.WIKI_TEMPLATE_MAX_OUTPUT = 1000
+        make_template(title="Leaf", body="x" * 100)
+        make_template(title="Branch", body='<template name="Leaf"></template>' * 10)
+        make_template(title="Trunk", body='<template name="Branch"></template>' * 10)
+        after = render_templates('<template name="Trunk"></template>')
+        assert len(after) <= 1000
+
 
 class TestRenderTemplatePage:
     def test_no_tags(self):
@@ -176,6 +300,59 @@ class TestRenderLinks:
         before = "Before [[Test Page]] After"
         assert render_links(before) == 'Before <a href="/wiki/test/">Test Page</a> After'
 
+    def test_batched(self, django_assert_num_queries):
+        for i in range(5):
+            make_page(title=f"Page {i}", slug=f"page-{i}")
+        before = " ".join(f"[[Page {i}]] [[/wiki/page-{i}]]" for i in range(10))
+        with django_assert_num_queries(1):
+            after = render_links(before)
+        assert after.count('class="new"') == 10
+        assert '<a href="/wiki/page-4/">/wiki/page-4</a>' in after
+
+    def test_cached(self, django_assert_num_queries):
+        make_page(title="Test Page", slug="test")
+        before = "[[Test Page]] [[Missing]]"
+        expected = render_links(before)
+        with django_assert_num_queries(0):
+            assert render_links(before) == expected
+
+    def test_invalidated_by_create(self, user, django_capture_on_commit_callbacks):
+        assert 'class="new"' in render_links("[[Test Page]]")
+        with django_capture_on_commit_callbacks(execute=True):
+            make_page(user=user, title="Test Page", slug="test")
+        assert render_links("[[Test Page]]") == '<a href="/wiki/test/">Test Page</a>'
+
+    def test_invalidated_by_rename(self, user, django_capture_on_commit_callbacks):
+        page = make_page(user=user, title="Test Page", slug="test")
+        assert 'class="new"' not in render_links("[[Test Page]]")
+        page = type(page).objects.get(pk=page.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            page.update(editor=user, title="Renamed", message="Test")
+        assert 'class="new"' in render_links("[[Test Page]]")
+
+    def test_invalidated_by_reparent(self, user, django_capture_on_commit_callbacks):
+        parent = make_page(user=user, title="Parent", slug="parent")
+        make_page(user=user, title="Test Page", slug="test")
+        page = Page.objects.get(slug="test")
+        assert 'class="new"' not in render_links("[[/wiki/test]]")
+        with django_capture_on_commit_callbacks(execute=True):
+            page.reparent(user, parent)
+        assert 'class="new"' in render_links("[[/wiki/test]]")
+
+    def test_invalidated_by_delete(self, user, django_capture_on_commit_callbacks):
+        page = make_page(user=user, title="Test Page", slug="test")
+        assert 'class="new"' not in render_links("[[Test Page]]")
+        with django_capture_on_commit_callbacks(execute=True):
+            page.destroy(user)
+        assert 'class="new"' in render_links("[[Test Page]]")
+
+    def test_invalidated_by_other_process(self, django_assert_num_queries):
+        make_page(title="Test Page", slug="test")
+        render_links("[[Test Page]]")
+        LinkCache().invalidate_paths([("Test Page", "test")])
+        with django_assert_num_queries(1):
+            render_links("[[Test Page]]")
+
 
 class TestRenderMarkdown:
     def test_basic(self):
@@ -189,3 +366,220 @@ class TestRenderMarkdown:
     def test_sanitize(self):
         before = "<script></script>\n\n<body></body>\n\n<head></head>\n\nBefore\n\n<div>Hello, world!</div>\n\nAfter"
         assert render_markdown(before) == "<p>Before</p>\n<div>Hello, world!</div>\n<p>After</p>"
+
+    def test_prune_nested_empty_elements(self):
+        before = "<div><div><span> </span><img src='x.png'></div>Text<b></b></div>"
+        assert render_markdown(before) == "<div>Text</div>"
+
+    def test_entities(self):
+        before = "<p>&nbsp;</p>\n\nA &amp; B &lt; C&nbsp;D"
+        assert render_markdown(before) == "<p>A &amp; B &lt; C\xa0D</p>"
+
+    def test_deeply_nested(self):
+        depth = 2000
+        before = "<div>" * depth + "x" + "<span></span></div>" * depth
+        assert render_markdown(before) == "<div>" * depth + "x" + "</div>" * depth
+
+    def test_renderer_reused(self):
+        renderer = MarkdownRenderer.get()
+        assert MarkdownRenderer.get() is renderer
+        thread = threading.Thread(target=lambda: setattr(self, "other", MarkdownRenderer.get()))
+        thread.start()
+        thread.join()
+        assert self.other is not renderer
+
+    def test_benchmark(self):
+        text = "**bold** _italic_"
+        renderer = MarkdownRenderer.get()
+        reused = min(timeit.repeat(lambda: renderer.render(text), number=50, repeat=5))
+        rebuilt = min(timeit.repeat(lambda: MarkdownRenderer().render(text), number=50, repeat=5))
+        assert reused < rebuilt
+
+    def test_built_once(self, monkeypatch):
+        built = []
+        for module, name in [(renderers.markdown, "Markdown"), (renderers.bleach, "Cleaner")]:
+            original = getattr(module, name)
+
+            def counting(*args, name=name, original=original, **kwargs):
+                built.append(name)
+                return original(*args, **kwargs)
+
+            monkeypatch.setattr(module, name, counting)
+        monkeypatch.delattr(MarkdownRenderer.local, "renderer", raising=False)
+        for i in range(5):
+            assert render_markdown(f"**{i}**") == f"<p><strong>{i}</strong></p>"
+        assert built == ["Markdown", "Cleaner"]
+
+
+@pytest.mark.django_db
+class TestRenderPage:
+    def test_render(self, user):
+        make_page(title="Target", slug="target")
+        page = make_page(user=user, body="**Hello** [[Target]]")
+        assert render_page(page) == '<p><strong>Hello</strong> <a href="/wiki/target/">Target</a></p>'
+
+    def test_cached(self, user, character, django_assert_num_queries):
+        make_template(title="Greeting", body="Hello")
+        page = make_page(user=user, body='<template name="Greeting"></template> [[Missing]]')
+        expected = render_page(page, character)
+        with django_assert_num_queries(0):
+            assert render_page(page, character) == expected
+        render_page(page)
+        with django_assert_num_queries(0):
+            assert render_page(page) == expected
+
+    def test_body_change(self, user):
+        page = make_page(user=user, body="Before")
+        assert render_page(page) == "<p>Before</p>"
+        page.update(editor=user, body="After", message="Test")
+        assert render_page(page) == "<p>After</p>"
+
+    def test_template_change(self, user, django_capture_on_commit_callbacks):
+        template = make_template(user=user, title="Greeting", body="Hello")
+        page = make_page(user=user, body='<template name="Greeting"></template>')
+        assert render_page(page) == "<p>Hello</p>"
+        with django_capture_on_commit_callbacks(execute=True):
+            template.update(editor=user, body="Goodbye", message="Test")
+        assert render_page(page) == "<p>Goodbye</p>"
+
+    def test_nested_template_change(self, user, django_capture_on_commit_callbacks):
+        inner = make_template(user=user, title="Inner", body="Hello")
+        make_template(user=user, title="Outer", body='<template name="Inner"></template>')
+        page = make_page(user=user, body='<template name="Outer"></template>')
+        assert render_page(page) == "<p>Hello</p>"
+        with django_capture_on_commit_callbacks(execute=True):
+            inner.update(editor=user, body="Goodbye", message="Test")
+        assert render_page(page) == "<p>Goodbye</p>"
+
+    def test_link_created(self, user, django_capture_on_commit_callbacks):
+        page = make_page(user=user, body="[[Target]]")
+        assert 'class="new"' in render_page(page)
+        with django_capture_on_commit_callbacks(execute=True):
+            make_page(user=user, title="Target", slug="target")
+        assert render_page(page) == '<p><a href="/wiki/target/">Target</a></p>'
+
+    def test_invalidated_on_commit(self, user, django_capture_on_commit_callbacks):
+        page = make_page(user=user, body="[[Target]]")
+        stale = render_page(page)
+        with django_capture_on_commit_callbacks(execute=True):
+            make_page(user=user, title="Target", slug="target")
+            assert render_page(page) == stale
+        assert render_page(page) == '<p><a href="/wiki/target/">Target</a></p>'
+
+    def test_link_created_mid_render(self, user, monkeypatch, django_capture_on_commit_callbacks):
+        page = make_page(user=user, body="[[Target]]")
+        resolve_links = renderers.resolve_links
+
+        def resolve_then_create(contents):
+            links = resolve_links(contents)
+            monkeypatch.setattr(renderers, "resolve_links", resolve_links)
+            with django_capture_on_commit_callbacks(execute=True):
+                make_page(user=user, title="Target", slug="target")
+            return links
+
+        monkeypatch.setattr(renderers, "resolve_links", resolve_then_create)
+        assert 'class="new"' in render_page(page)
+        assert render_page(page) == '<p><a href="/wiki/target/">Target</a></p>'
+
+    def test_template_changed_mid_render(self, user, monkeypatch, django_capture_on_commit_callbacks):
+        template = make_template(user=user, title="Greeting", body="Hello")
+        page = make_page(user=user, body='<template name="Greeting"></template>')
+        load_templates = RenderPipeline.load_templates
+
+        def load_then_edit(pipeline, names):
+            load_templates(pipeline, names)
+            monkeypatch.setattr(RenderPipeline, "load_templates", load_templates)
+            with django_capture_on_commit_callbacks(execute=True):
+                template.update(editor=user, body="Goodbye", message="Test")
+
+        monkeypatch.setattr(RenderPipeline, "load_templates", load_then_edit)
+        assert render_page(page) == "<p>Hello</p>"
+        assert render_page(page) == "<p>Goodbye</p>"
+
+    def test_link_renamed(self, user, django_capture_on_commit_callbacks):
+        target = make_page(user=user, title="Target", slug="target")
+        page = make_page(user=user, body="[[Target]]")
+        assert render_page(page) == '<p><a href="/wiki/target/">Target</a></p>'
+        target = type(target).objects.get(pk=target.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            target.update(editor=user, title="Renamed", message="Test")
+        assert 'class="new"' in render_page(page)
+
+    def test_link_deleted(self, user, django_capture_on_commit_callbacks):
+        target = make_page(user=user, title="Target", slug="target")
+        page = make_page(user=user, body="[[Target]]")
+        assert 'class="new"' not in render_page(page)
+        with django_capture_on_commit_callbacks(execute=True):
+            target.destroy(user)
+        assert 'class="new"' in render_page(page)
+
+    def test_secret_knowledge(self, user, character, django_capture_on_commit_callbacks):
+        secret = SecretFactory(key="S1")
+        page = make_page(user=user, body='Before <secret show="[S1]">secret</secret>')
+        assert render_page(page, character) == "<p>Before</p>"
+        with django_capture_on_commit_callbacks(execute=True):
+            secret.known_to.add(character)
+        assert render_page(page, character) == "<p>Before secret</p>"
+        assert render_page(page) == "<p>Before</p>"
+
+    def test_secret_defined(self, user, character, django_capture_on_commit_callbacks):
+        page = make_page(user=user, body='<secret show="not [S1]">secret</secret>')
+        assert render_page(page, character) == ""
+        with django_capture_on_commit_callbacks(execute=True):
+            SecretFactory(key="S1")
+        assert render_page(page, character) == "<p>secret</p>"
+
+
+@pytest.mark.django_db
+class TestRenderPipeline:
+    def test_render(self, character):
+        SecretFactory(key="S1").known_to.set([character])
+        SecretFactory(key="S2")
+        make_template(title="Box", body="<div>{{ body }}</div>")
+        make_page(title="Target", slug="target")
+        before = (
+            '<template name="Box">**Boxed**</template>\n\n'
+            'Known: <secret show="[S1]">yes</secret> <secret show="[S2]">no</secret> [[Target]]'
+        )
+        expected = '<div>**Boxed**</div>\n<p>Known: yes  <a href="/wiki/target/">Target</a></p>'
+        assert RenderPipeline(character).render(before) == expected
+
+    def test_parses_once(self, monkeypatch, character):
+        make_template(title="Box", body="<div>{{ body }}</div>")
+        calls = []
+
+        def counting_soup(*args, **kwargs):
+            calls.append(args[0])
+            return BeautifulSoup(*args, **kwargs)
+
+        monkeypatch.setattr(renderers, "BeautifulSoup", counting_soup)
+        RenderPipeline(character).render('<secret show="[S1]">x</secret> [[Target]] <p>Hello</p>')
+        assert len(calls) == 1
+        calls.clear()
+        RenderPipeline(character).render('<template name="Box">x</template>')
+        assert len(calls) == 2
+
+    def test_template_page(self):
+        before = "<includeonly>Hidden</includeonly><noinclude>Shown</noinclude>"
+        assert RenderPipeline(template_page=True).render(before) == "<p>Shown</p>"
+
+    def test_links(self):
+        make_page(title="Target", slug="target")
+        before = "<p>A [[Target]] B [[Missing | gone]] C</p>"
+        expected = (
+            '<p>A <a href="/wiki/target/">Target</a> B '
+            '<a class="new" href="/wiki/create/?title=Missing">gone</a> C</p>'
+        )
+        assert RenderPipeline().render(before) == expected
+
+    def test_timings(self):
+        pipeline = RenderPipeline()
+        pipeline.render("Hello, world!")
+        assert set(pipeline.timings) == {"parse", "templates", "secrets", "links", "serialize", "markdown"}
+        assert all(elapsed >= 0 for elapsed in pipeline.timings.values())
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_render", sections=5, repeat=1, stdout=out)
+        assert "pipeline (ms)" in out.getvalue()
+        assert "total" in out.getvalue()
@@ -0,0 +1,105 @@
+import pytest
+
+from scarletbanner.wiki.diff import DiffTooCostly
+from scarletbanner.wiki.models import Page
+from scarletbanner.wiki.revisions import apply_delta, make_delta
+from scarletbanner.wiki.tests.factories import make_page
+
+LORE = "".join(f"Line {n} of the chronicle.\n" for n in range(40))
+
+
+def edit(text: str, line: int, replacement: str) -> str:
+    lines = text.splitlines(keepends=True)
+    lines[line] = replacement
+    return "".join(lines)
+
+
+def stored(page: Page) -> list[tuple]:
+    return list(
+        Page.history.model.objects.filter(id=page.id)
+        .order_by("history_date", "history_id")
+        .values_list("body", "body_delta", "delta_base")
+    )
+
+
+class TestDelta:
+    @pytest.mark.parametrize(
+        "base, text",
+        [
+            ("", ""),
+            ("", "New page.\n"),
+            ("Old page.\n", ""),
+            (LORE, edit(LORE, 5, "A different line.\n")),
+            (LORE, LORE + "No trailing newline"),
+            ("a\r\nb\r\nc", "a\r\nB\r\nc"),
+        ],
+    )
+    def test_round_trip(self, base, text):
+        assert apply_delta(base, make_delta(base, text)) == text
+
+    def test_compact(self):
+        text = edit(LORE, 20, "The dragon woke.\n")
+        assert len(make_delta(LORE, text)) < 50
+
+    def test_cost_capped(self):
+        rows = [f"| row {n} |\n" for n in range(4000)]
+        with pytest.raises(DiffTooCostly):
+            make_delta("".join(rows), "".join(reversed(rows)))
+
+
+@pytest.mark.django_db
+class TestRevisionStorage:
+    def test_deltas(self, user, settings):
+        settings.WIKI_HISTORY_SNAPSHOT_INTERVAL = 3
+        page = make_page(user=user, body=LORE)
+        bodies = [LORE]
+        for n in range(5):
+            bodies.append(edit(bodies[-1], n, f"Edit {n}.\n"))
+            page.update(editor=user, body=bodies[-1], message=f"Edit {n}")
+
+        rows = stored(page)
+        assert [delta is None for _, delta, _ in rows] == [True, False, False, True, False, False]
+        assert rows[1][0] == "" and rows[1][2] == rows[2][2]
+        assert [revision.body for revision in page.history.order_by("history_date", "history_id")] == bodies
+
+    def test_reconstruction(self, user, settings):
+        settings.WIKI_HISTORY_SNAPSHOT_INTERVAL = 20
+        page = make_page(user=user, body=LORE)
+        updated = edit(LORE, 3, "The chronicle changes.\n")
+        page.update(editor=user, body=updated, message="Edit")
+        latest = page.history.first()
+        assert latest.body_delta is not None
+        assert latest.body == updated
+        assert latest.prev_record.body == LORE
+        assert latest.instance.body == updated
+        assert page.history.most_recent().body == updated
+        assert [instance.body for instance in Page.history.filter(id=page.id).as_instances()] == [updated, LORE]
+
+    def test_large_change_stored_in_full(self, user, settings):
+        settings.WIKI_HISTORY_SNAPSHOT_INTERVAL = 20
+        page = make_page(user=user, body=LORE)
+        page.update(editor=user, body="Rewritten from scratch.\n", message="Rewrite")
+        assert stored(page)[-1] == ("Rewritten from scratch.\n", None, None)
+
+    def test_reordered_stored_in_full(self, user, settings):
+        settings.WIKI_HISTORY_SNAPSHOT_INTERVAL = 20
+        rows = "".join(f"| row {n} |\n" for n in range(4000))
+        page = make_page(user=user, body=rows)
+        reordered = "".join(reversed(rows.splitlines(keepends=True)))
+        page.update(editor=user, body=reordered, message="Reverse")
+        assert stored(page)[-1] == (reordered, None, None)
+
+    def test_disabled(self, user, settings):
+        settings.WIKI_HISTORY_SNAPSHOT_INTERVAL = 1
+        page = make_page(user=user, body=LORE)
+        page.update(editor=user, body=edit(LORE, 3, "Changed.\n"), message="Edit")
+        assert all(delta is None for _, delta, _ in stored(page))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stored_in_full_outside_transaction(user, settings):
+    settings.WIKI_HISTORY_SNAPSHOT_INTERVAL = 20
+    page = make_page(user=user, body=LORE)
+    page.body = edit(LORE, 3, "Saved without a transaction.\n")
+    page.save()
+    assert stored(page)[-1] == (page.body, None, None)
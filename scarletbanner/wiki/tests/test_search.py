@@ -0,0 +1,24 @@
+from scarletbanner.wiki.search import HIGHLIGHT_START, HIGHLIGHT_STOP, highlight, parse_query
+
+
+class TestParseQuery:
+    def test_empty(self):
+        assert parse_query("") is None
+        assert parse_query("?! _") is None
+
+    def test_terms(self):
+        query = parse_query("Dragon's Lair")
+        assert query == parse_query("dragon s lair")
+        assert "dragon:*A" in str(query)
+        assert "lair:B" in str(query)
+
+    def test_operators_are_stripped(self):
+        assert parse_query("a & !b | c:*") == parse_query("a b c")
+
+
+class TestHighlight:
+    def test_marks(self):
+        assert highlight(f"a {HIGHLIGHT_START}dragon{HIGHLIGHT_STOP} sleeps") == "a <mark>dragon</mark> sleeps"
+
+    def test_escapes(self):
+        assert highlight(f"<script>{HIGHLIGHT_START}x{HIGHLIGHT_STOP}") == "&lt;script&gt;<mark>x</mark>"
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from celery.result import EagerResult
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.utils import timezone
+
+from scarletbanner.wiki import revisions
+from scarletbanner.wiki.models import Page, PageEditor
+from scarletbanner.wiki.tasks import destroy_page, prune_history
+from scarletbanner.wiki.tests.factories import make_page
+
+
+@pytest.mark.django_db
+class TestDestroyPage:
+    def test_destroy(self, settings, monkeypatch, grandchild_page):
+        settings.CELERY_TASK_ALWAYS_EAGER = True
+        settings.WIKI_DESTROY_BATCH_SIZE = 1
+        states = []
+        monkeypatch.setattr(destroy_page, "update_state", lambda **kwargs: states.append(kwargs))
+        grandparent = grandchild_page.parent.parent
+        result = destroy_page.delay(grandparent.pk, grandchild_page.editors[0].pk)
+        assert isinstance(result, EagerResult)
+        assert result.result == 2
+        assert not Page.objects.filter(pk=grandparent.pk).exists()
+        assert Page.objects.get(pk=grandchild_page.pk).slug == "child/grandchild"
+        assert [state["meta"] for state in states] == [{"done": 1, "total": 2}, {"done": 2, "total": 2}]
+        assert all(state["state"] == "PROGRESS" for state in states)
+
+
+@pytest.mark.django_db
+class TestPruneHistory:
+    @pytest.fixture
+    def page(self, settings, user, other) -> Page:
+        settings.WIKI_HISTORY_SNAPSHOT_INTERVAL = 2
+        settings.WIKI_HISTORY_KEEP_ALL_DAYS = 30
+        settings.WIKI_HISTORY_KEEP_ONE_PER = "day"
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        page = make_page(user=user, title="Chronicle", body=self.body(0))
+        self.date_latest(page, today - timedelta(days=40, hours=-9))
+        edits = [
+            (other, today - timedelta(days=40, hours=-10)),
+            (other, today - timedelta(days=40, hours=-11)),
+            (user, today - timedelta(days=40, hours=-12)),
+            (user, today - timedelta(days=39, hours=-10)),
+            (user, today - timedelta(days=39, hours=-11)),
+            (user, today - timedelta(days=1)),
+            (user, timezone.now()),
+        ]
+        for n, (editor, date) in enumerate(edits, start=1):
+            page.update(editor=editor, body=self.body(n), message=f"Edit {n}")
+            self.date_latest(page, date)
+        return page
+
+    @staticmethod
+    def body(revision: int) -> str:
+        return "".join(f"Line {n}\n" for n in range(40)).replace("Line 5\n", f"Revision {revision}\n")
+
+    @staticmethod
+    def date_latest(page: Page, date) -> None:
+        latest = page.history.model.objects.filter(id=page.id).order_by("-history_id").first()
+        page.history.model.objects.filter(history_id=latest.history_id).update(history_date=date)
+
+    def test_prune(self, page):
+        assert prune_history() == 2
+        remaining = page.history.order_by("history_date", "history_id")
+        assert [revision.history_change_reason for revision in remaining] == [
+            "Initial text",
+            "Edit 1",
+            "Edit 3",
+            "Edit 5",
+            "Edit 6",
+            "Edit 7",
+        ]
+        assert [revision.body for revision in remaining] == [self.body(n) for n in [0, 1, 3, 5, 6, 7]]
+        stored = page.history.model.objects.filter(id=page.id)
+        assert stored.exclude(body_delta=None).exists()
+        assert set(stored.exclude(delta_base=None).values_list("delta_base", flat=True)) <= set(
+            stored.filter(body_delta=None).values_list("history_id", flat=True)
+        )
+        assert prune_history() == 0
+
+    def test_prune_skips_pages_edited_meanwhile(self, page, user, monkeypatch):
+        encode_chains = revisions.encode_chains
+
+        def encode_then_edit(chains, interval):
+            changed = encode_chains(chains, interval)
+            page.update(editor=user, body=self.body(8), message="Edit 8")
+            return changed
+
+        monkeypatch.setattr(revisions, "encode_chains", encode_then_edit)
+        assert prune_history() == 0
+        assert page.history.count() == 9
+        assert [revision.body for revision in page.history.order_by("history_date", "history_id")][-1] == self.body(8)
+
+    def test_period_validated(self, settings):
+        settings.WIKI_HISTORY_KEEP_ONE_PER = "fortnight"
+        with pytest.raises(ImproperlyConfigured):
+            apps.get_app_config("wiki").ready()
+
+    def test_prune_keeps_editors(self, page, user, other):
+        editors = list(page.editors)
+        prune_history()
+        assert list(page.editors) == editors == [user, other]
+        PageEditor.objects.all().delete()
+        call_command("backfill_page_editors", stdout=StringIO())
+        assert list(page.editors) == [user, other]
+
+    def test_prune_keep_window(self, page, settings):
+        settings.WIKI_HISTORY_KEEP_ALL_DAYS = 60
+        assert prune_history() == 0
+        assert page.history.count() == 8
+
+    def test_prune_scheduled(self, settings):
+        assert settings.CELERY_BEAT_SCHEDULE["prune-page-history"]["task"] == prune_history.name
@@ -0,0 +1,113 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import PermissionDenied
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from scarletbanner.wiki.enums import PermissionLevel
+from scarletbanner.wiki.forms import PageForm
+from scarletbanner.wiki.models import Secret
+from scarletbanner.wiki.tests.factories import make_character, make_page
+from scarletbanner.wiki.views import create, get_character, page
+
+
+@pytest.mark.django_db
+class TestPageView:
+    def test_render(self, rf: RequestFactory, user):
+        wiki_page = make_page(user=user, body="**Hello**")
+        request = rf.get(f"/wiki/{wiki_page.slug}/")
+        request.user = AnonymousUser()
+        response = page(request, slug=wiki_page.slug)
+        assert response.status_code == 200
+        assert "<strong>Hello</strong>" in response.content.decode()
+
+    def test_permission_denied(self, rf: RequestFactory, user):
+        wiki_page = make_page(user=user, read=PermissionLevel.MEMBERS_ONLY)
+        request = rf.get(f"/wiki/{wiki_page.slug}/")
+        request.user = AnonymousUser()
+        with pytest.raises(PermissionDenied):
+            page(request, slug=wiki_page.slug)
+
+    def test_character(self, rf: RequestFactory, user):
+        character = make_character(user=user, owner=user)
+        Secret.objects.create(key="S1").known_to.add(character)
+        wiki_page = make_page(user=user, body='<secret show="[S1]">Hidden</secret>')
+        request = rf.get(f"/wiki/{wiki_page.slug}/?character={character.pk}")
+        request.user = user
+        assert "Hidden" in page(request, slug=wiki_page.slug).content.decode()
+
+    def test_breadcrumbs(self, rf: RequestFactory, grandchild_page):
+        request = rf.get(f"/wiki/{grandchild_page.slug}/")
+        request.user = AnonymousUser()
+        content = page(request, slug=grandchild_page.slug).content.decode()
+        assert 'href="/wiki/parent/"' in content
+        assert 'href="/wiki/parent/child/"' in content
+        assert content.index("Parent Page") < content.index("Child Page") < content.index("<h1>")
+
+    def test_breadcrumbs_hide_unreadable(self, rf: RequestFactory, user, child_page):
+        child_page.parent.update(editor=user, message="Hide", read=PermissionLevel.EDITORS_ONLY)
+        request = rf.get(f"/wiki/{child_page.slug}/")
+        request.user = AnonymousUser()
+        assert "Parent Page" not in page(request, slug=child_page.slug).content.decode()
+
+    def test_breadcrumbs_query_count(self, rf: RequestFactory, user):
+        parent = make_page(user=user, title="Level 0", slug="level-0")
+        for i in range(1, 6):
+            parent = make_page(user=user, title=f"Level {i}", slug=f"level-{i}", parent=parent)
+
+        def count_queries(wiki_page):
+            request = rf.get(f"/wiki/{wiki_page.slug}/")
+            request.user = AnonymousUser()
+            with CaptureQueriesContext(connection) as context:
+                page(request, slug=wiki_page.slug)
+            return len(context.captured_queries)
+
+        assert count_queries(parent) == count_queries(parent.parent.parent)
+
+
+@pytest.mark.django_db
+class TestCreateView:
+    def test_parent_picker(self, rf: RequestFactory, user):
+        make_page(user=user, title="Griffin", slug="griffin")
+        request = rf.get("/wiki/create/")
+        request.user = user
+        content = create(request).content.decode()
+        assert 'data-autocomplete-url="/api/v1/wiki/autocomplete/"' in content
+        assert content.index("data-autocomplete-url") < content.index("js/page-autocomplete.js")
+        assert "Griffin" not in content
+
+    def test_selected_parent(self, user):
+        parent = make_page(user=user, title="Griffin", slug="griffin")
+        make_page(user=user, title="Dragon", slug="dragon")
+        form = PageForm(data={"parent": parent.pk})
+        html = str(form["parent"])
+        assert "Griffin" in html
+        assert "Dragon" not in html
+        assert form.fields["parent"].clean(parent.pk) == parent
+
+
+@pytest.mark.django_db
+class TestGetCharacter:
+    def test_owner(self, rf: RequestFactory, user):
+        character = make_character(user=user, owner=user)
+        request = rf.get(f"/?character={character.pk}")
+        request.user = user
+        assert get_character(request) == character
+
+    def test_not_owner(self, rf: RequestFactory, user, other):
+        character = make_character(user=user, owner=user)
+        request = rf.get(f"/?character={character.pk}")
+        request.user = other
+        assert get_character(request) is None
+
+    def test_admin(self, rf: RequestFactory, user, admin):
+        character = make_character(user=user, owner=user)
+        request = rf.get(f"/?character={character.pk}")
+        request.user = admin
+        assert get_character(request) == character
+
+    def test_invalid(self, rf: RequestFactory, user):
+        request = rf.get("/?character=nope")
+        request.user = user
+        assert get_character(request) is None
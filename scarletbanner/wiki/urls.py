@@ -6,5 +6,5 @@ app_name = "wiki"
 
 urlpatterns = [
     path("create/", views.create, name="create"),
-    path("<slug:slug>/", views.page, name="page"),
+    path("<path:slug>/", views.page, name="page"),
 ]
@@ -1,7 +1,9 @@
+from django.core.exceptions import PermissionDenied
 from django.shortcuts import get_object_or_404, redirect, render
 
 from scarletbanner.wiki.forms import PageForm
-from scarletbanner.wiki.models import Page
+from scarletbanner.wiki.models import Character, Page
+from scarletbanner.wiki.renderers import render_page
 
 
 def create(request):
@@ -18,4 +20,16 @@ def create(request):
 
 def page(request, slug):
     page = get_object_or_404(Page, slug=slug)
-    return render(request, "page.html", {"page": page})
+    if not page.can_read(request.user):
+        raise PermissionDenied
+    body = render_page(page, get_character(request))
+    breadcrumbs = Page.objects.above(page.slug).readable_by(request.user)
+    return render(request, "page.html", {"page": page, "body": body, "breadcrumbs": breadcrumbs})
+
+
+def get_character(request) -> Character | None:
+    pk = request.GET.get("character", "")
+    if not pk.isdigit() or not request.user.is_authenticated:
+        return None
+    characters = Character.objects.all() if request.user.is_staff else Character.objects.filter(owner=request.user)
+    return characters.filter(pk=pk).first()